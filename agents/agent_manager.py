@@ -13,6 +13,10 @@ from typing import Dict, List, Any, Optional, Callable
 from dataclasses import dataclass
 from enum import Enum
 
+from modules.db_migrations import migrate_database
+from modules.tracing import span, traced
+from modules.openmetrics import Histogram
+
 class AgentStatus(Enum):
     IDLE = "idle"
     BUSY = "busy"
@@ -449,41 +453,17 @@ class AgentManager:
         self.agents: Dict[str, BaseAgent] = {}
         self.task_queue = []
         self.running = False
+        
+        # Contadores em memória por agente (expostos no endpoint /metrics)
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
         self._init_db()
         self._register_default_agents()
     
     def _init_db(self):
         """Inicializa banco de dados de agentes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS agent_tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id TEXT NOT NULL,
-                task_type TEXT NOT NULL,
-                task_data TEXT NOT NULL,
-                status TEXT NOT NULL,
-                result TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                completed_at DATETIME
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS agent_performance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id TEXT NOT NULL,
-                task_type TEXT NOT NULL,
-                execution_time REAL,
-                success_rate REAL,
-                confidence_score REAL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+        migrate_database(self.db_path, "agents")
     
     def _register_default_agents(self):
         """Registra agentes padrão"""
@@ -513,13 +493,15 @@ class AgentManager:
         
         return best_agent if best_confidence > 0.5 else None
     
+    @traced("agent_manager.execute_task")
     def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         """Executa uma tarefa usando o melhor agente disponível"""
         task_type = task.get("type", "")
         input_data = task.get("data", {})
         
         # Encontra o melhor agente
-        agent = self.find_best_agent(task_type, input_data)
+        with span("agent_manager.find_agent", task_type=task_type):
+            agent = self.find_best_agent(task_type, input_data)
         
         if not agent:
             return {
@@ -529,22 +511,28 @@ class AgentManager:
             }
         
         # Registra tarefa no banco
-        task_id = self._log_task_start(agent.profile.id, task_type, task)
+        with span("agent_manager.db_write", operation="task_start"):
+            task_id = self._log_task_start(agent.profile.id, task_type, task)
         
+        with self._stats_lock:
+            self._in_flight += 1
+        start_time = datetime.now()
         try:
             # Executa tarefa
-            start_time = datetime.now()
-            result = agent.execute_task(task)
+            with span("agent.execute", agent_id=agent.profile.id, task_type=task_type):
+                result = agent.execute_task(task)
             end_time = datetime.now()
             
             execution_time = (end_time - start_time).total_seconds()
+            self._count_task(agent.profile.id, execution_time, result.get("success", False))
             
-            # Registra resultado
-            self._log_task_completion(task_id, result, execution_time)
-            
-            # Atualiza métricas de performance
-            self._update_agent_performance(agent.profile.id, task_type, execution_time, 
-                                         result.get("success", False))
+            with span("agent_manager.db_write", operation="task_completion"):
+                # Registra resultado
+                self._log_task_completion(task_id, result, execution_time)
+                
+                # Atualiza métricas de performance
+                self._update_agent_performance(agent.profile.id, task_type, execution_time, 
+                                             result.get("success", False))
             
             result["agent_used"] = agent.profile.name
             result["execution_time"] = execution_time
@@ -552,9 +540,32 @@ class AgentManager:
             return result
             
         except Exception as e:
+            self._count_task(agent.profile.id, (datetime.now() - start_time).total_seconds(), False)
             error_result = {"success": False, "error": str(e)}
             self._log_task_completion(task_id, error_result, 0)
             return error_result
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+    
+    def _count_task(self, agent_id: str, execution_time: float, success: bool):
+        """Atualiza os contadores em memória do agente"""
+        with self._stats_lock:
+            stats = self._stats.get(agent_id)
+            if stats is None:
+                stats = self._stats[agent_id] = {"success": 0, "failure": 0, "duration": Histogram()}
+            stats["success" if success else "failure"] += 1
+        stats["duration"].observe(execution_time)
+    
+    def task_stats(self) -> List[tuple]:
+        """(agente, contadores) de cada agente que já executou tarefas"""
+        with self._stats_lock:
+            return [(agent_id, dict(stats)) for agent_id, stats in self._stats.items()]
+    
+    @property
+    def queue_depth(self) -> int:
+        """Tarefas aguardando ou em execução"""
+        return len(self.task_queue) + self._in_flight
     
     def _log_task_start(self, agent_id: str, task_type: str, task: Dict[str, Any]) -> int:
         """Registra início de tarefa"""
@@ -7,6 +7,7 @@ Integra todos os módulos avançados e funcionalidades expandidas
 import sys
 import os
 import json
+import time
 import requests
 import speech_recognition as sr
 import pyttsx3
@@ -21,16 +22,33 @@ from PyQt6.QtWidgets import (
     QGroupBox, QGridLayout, QSlider, QListWidget, QTreeWidget, QTreeWidgetItem
 )
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
-from PyQt6.QtGui import QPalette, QColor, QFont, QPixmap
+from PyQt6.QtGui import QPalette, QColor, QFont, QPixmap, QImage
 
 # Importa módulos personalizados
 from modules.auto_optimizer import PerformanceMonitor, AutoOptimizer
 from modules.workflow_generator import AdvancedWorkflowGenerator
 from modules.media_processor import MediaOrchestrator
+from modules.memory_consolidator import MemoryConsolidator
+from modules.conversation_summarizer import ConversationSummarizer
+from modules.retrieval_planner import RetrievalPlanner
+from modules.embeddings import create_embedder
+from modules.doc_index import DocumentIndex
+from modules.db_migrations import migrate_all, DEFAULT_DATABASES
+from modules.tracing import span, traced, get_tracer
+from modules.ollama_metrics import OllamaTimingRecorder
+from modules.runtime_switches import RuntimeSwitches, ResponseCache
+from modules.resource_sampler import ResourceSampler
+from modules.profiler import ProfilingController
+from modules.slo import SLOEvaluator, load_slos
+from modules.dashboard import DashboardFeed, DashboardRenderer
+from modules.openmetrics import (MetricsExporter, collect_monitor, collect_agents, collect_cache,
+                                 collect_media, collect_runtime)
 from agents.agent_manager import AgentManager
 
 # Configurações
 OLLAMA_URL = "http://localhost:11434/api/generate"
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs")
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
 N8N_URL = "http://localhost:5678/api/v1/workflows"
 
 class EnhancedWorkerThread(QThread):
@@ -69,19 +87,80 @@ class EnhancedWorkerThread(QThread):
         except Exception as e:
             self.error.emit(str(e))
 
+class DashboardThread(QThread):
+    """Lê os rollups e desenha o painel de performance fora da thread da interface"""
+    frame_ready = pyqtSignal(bytes, int, int)
+
+    def __init__(self, db_path, interval=5.0, window_seconds=3600):
+        super().__init__()
+        self.interval = interval
+        self.feed = DashboardFeed(db_path, window_seconds=window_seconds)
+        self.renderer = DashboardRenderer(window_seconds=window_seconds)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        first = True
+        while not self._stop_event.is_set():
+            try:
+                # Só acrescenta os baldes novos; redesenha apenas se algo mudou
+                if self.renderer.update(self.feed.poll()) or first:
+                    self.frame_ready.emit(*self.renderer.render())
+                    first = False
+            except Exception as e:
+                print(f"Erro ao atualizar painel: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        """Para o laço e aguarda a thread"""
+        self._stop_event.set()
+        self.wait()
+
 class EnhancedAIAgent:
     """Agente de IA aprimorado com todas as funcionalidades"""
     
-    def __init__(self, db_path='queen_memory.db'):
+    def __init__(self, db_path='queen_memory.db', config_path='config.json'):
         self.db_path = db_path
+        self.config = self._load_config(config_path)
         self._init_db()
         
         # Inicializa componentes
-        self.performance_monitor = PerformanceMonitor()
-        self.auto_optimizer = AutoOptimizer(self.performance_monitor)
+        self.performance_monitor = PerformanceMonitor(DEFAULT_DATABASES["performance"])
+        self.switches = RuntimeSwitches()
+        self.response_cache = ResponseCache()
+        self.switches.on_change(self._on_switch_change)
+        self.profiler = ProfilingController(PROFILES_DIR)
+        self.slo_evaluator = SLOEvaluator(self.performance_monitor, load_slos(self.config))
+        optimizer_settings = self.config.get("optimizer", {})
+        self.auto_optimizer = AutoOptimizer(self.performance_monitor, switches=self.switches,
+                                            evaluation_window=optimizer_settings.get("evaluation_window", 600),
+                                            significance=optimizer_settings.get("significance", 0.05),
+                                            profiler=self.profiler, slo_evaluator=self.slo_evaluator)
         self.workflow_generator = AdvancedWorkflowGenerator()
-        self.media_orchestrator = MediaOrchestrator()
-        self.agent_manager = AgentManager()
+        self.media_orchestrator = MediaOrchestrator(switches=self.switches)
+        self.agent_manager = AgentManager(DEFAULT_DATABASES["agents"])
+        self.memory_consolidator = MemoryConsolidator(self.db_path)
+        embedder = create_embedder(self.config.get("ollama", {}).get("embedding_model"))
+        self.doc_index = DocumentIndex(self.db_path, DOCS_DIR, embedder=embedder)
+        self.retrieval_planner = RetrievalPlanner(
+            self.db_path,
+            embedder=embedder,
+            doc_index=self.doc_index
+        )
+        # Vetores de memórias consolidadas saem da matriz semântica
+        self.memory_consolidator.on_delete(self.retrieval_planner.forget)
+        self.ollama_metrics = OllamaTimingRecorder(self.performance_monitor)
+        self.summarizer = ConversationSummarizer(
+            self.db_path,
+            ollama_url=OLLAMA_URL,
+            model=self.config.get("ollama", {}).get("summary_model", "phi-3:mini"),
+            timing_recorder=self.ollama_metrics
+        )
+        
+        # Sob pressão de memória, o otimizador esvazia os caches da aplicação
+        self.auto_optimizer.register_memory_action("clear_cache", self.response_cache.clear)
+        self.auto_optimizer.register_memory_action("clear_cache", self.doc_index.clear_cache)
+        self.resource_sampler = ResourceSampler(self.performance_monitor, self.auto_optimizer)
+        self.resource_sampler.register_gauge("agent_queue_depth", lambda: self.agent_manager.queue_depth)
         
         # Configurações TTS
         self.engine = pyttsx3.init()
@@ -90,53 +169,73 @@ class EnhancedAIAgent:
         
         # Inicia monitoramento automático
         self.auto_optimizer.start_monitoring()
-    
-    def _init_db(self):
-        """Inicializa banco de dados aprimorado"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         
-        # Tabela de memória principal
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS memory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prompt TEXT,
-                response TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                session_id TEXT,
-                context TEXT,
-                confidence REAL DEFAULT 0.8
-            )
-        """)
+        # Amostra memória, CPU e recursos do processo
+        self.resource_sampler.start()
         
-        # Tabela de conversas
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT,
-                user_input TEXT,
-                ai_response TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                response_time REAL,
-                satisfaction_score INTEGER
-            )
-        """)
+        # Inicia consolidação periódica da memória
+        self.memory_consolidator.start()
         
-        # Tabela de preferências do usuário
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                preference_key TEXT UNIQUE,
-                preference_value TEXT,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # Endpoint /metrics servido dos contadores em memória
+        self.metrics_exporter = self._start_metrics_exporter()
         
-        conn.commit()
-        conn.close()
+        # Indexa a documentação local em segundo plano (apenas arquivos alterados)
+        threading.Thread(target=self._index_docs, daemon=True).start()
+    
+    def _load_config(self, config_path):
+        """Carrega config.json, se existir"""
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _start_metrics_exporter(self):
+        """Sobe o endpoint /metrics conforme a seção "metrics" do config"""
+        settings = self.config.get("metrics", {})
+        if not settings.get("enabled", True):
+            return None
+        
+        exporter = MetricsExporter(settings.get("host", "127.0.0.1"), settings.get("port", 9464))
+        exporter.register(lambda: collect_monitor(self.performance_monitor))
+        exporter.register(lambda: collect_agents(self.agent_manager))
+        exporter.register(lambda: collect_cache(self.response_cache, "response"))
+        exporter.register(lambda: collect_media(self.media_orchestrator))
+        exporter.register(lambda: collect_runtime(self.switches, self.auto_optimizer,
+                                                  get_tracer(), self.summarizer))
+        return exporter if exporter.start() else None
+    
+    def _on_switch_change(self, name, enabled):
+        """Reage às chaves alteradas pelo auto-otimizador"""
+        if name == "cache_responses" and not enabled:
+            self.response_cache.clear()
+    
+    def _index_docs(self):
+        """Atualiza o índice da documentação local"""
+        try:
+            stats = self.doc_index.index_directory()
+            if stats["indexed"] or stats["removed"]:
+                print(f"Documentação indexada: {stats['indexed']} arquivos, {stats['chunks']} trechos")
+        except Exception as e:
+            print(f"Erro ao indexar documentação: {e}")
     
+    def _init_db(self):
+        """Leva os três bancos ao esquema mais recente (migrações versionadas)"""
+        migrate_all({
+            "memory": self.db_path,
+            "performance": DEFAULT_DATABASES["performance"],
+            "agents": DEFAULT_DATABASES["agents"]
+        })
+    
+    @traced("agent.process_prompt")
     def process_prompt(self, prompt, session_id=None, progress_callback=None, status_callback=None):
         """Processa prompt com funcionalidades aprimoradas"""
+        # Perfilado apenas quando o profiler está armado
+        with self.profiler.profile("process_prompt"):
+            return self._process_prompt(prompt, session_id, progress_callback, status_callback)
+    
+    def _process_prompt(self, prompt, session_id, progress_callback, status_callback):
+        """Pipeline de uma requisição: contexto, roteamento, geração e gravação"""
         start_time = datetime.now()
         
         if status_callback:
@@ -149,10 +248,16 @@ class EnhancedAIAgent:
         if status_callback:
             status_callback("Buscando contexto...")
         
-        context = self._get_contextual_memory(prompt, session_id)
+        with span("agent.context_retrieval"):
+            context = self._get_contextual_memory(prompt, session_id)
         
         # Determina se precisa de processamento especial
-        if self._needs_agent_processing(prompt):
+        with span("agent.routing") as routing:
+            needs_agent = self._needs_agent_processing(prompt)
+            if routing is not None:
+                routing.set_attribute("needs_agent", needs_agent)
+        
+        if needs_agent:
             if status_callback:
                 status_callback("Delegando para agente especializado...")
             return self._process_with_agents(prompt, context, progress_callback, status_callback)
@@ -161,7 +266,8 @@ class EnhancedAIAgent:
         if status_callback:
             status_callback("Processando com IA...")
         
-        enhanced_prompt = self._enhance_prompt_with_context(prompt, context)
+        with span("agent.enhance_prompt"):
+            enhanced_prompt = self._enhance_prompt_with_context(prompt, context)
         
         payload = {
             "model": "llama3",
@@ -175,70 +281,116 @@ class EnhancedAIAgent:
         }
         
         try:
-            response = requests.post(OLLAMA_URL, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            ai_response = response.json()["response"]
+            data = self._generate(payload, task="chat", session_id=session_id)
+            ai_response = data["response"]
+            self.performance_monitor.record_metric("ollama_error_rate", 0.0, data.get("model", payload["model"]))
             
             # Pós-processamento
             if status_callback:
                 status_callback("Finalizando resposta...")
             
-            processed_response = self._post_process_response(ai_response, prompt)
-            
-            # Salva na memória
-            self._save_enhanced_memory(prompt, processed_response, session_id, context)
+            with span("agent.post_process"):
+                processed_response = self._post_process_response(ai_response, prompt)
             
             # Registra métricas
             end_time = datetime.now()
             response_time = (end_time - start_time).total_seconds()
             self.performance_monitor.record_metric("response_time", response_time, "ollama")
             
+            # Salva na memória e atualiza o resumo da sessão em segundo plano
+            with span("agent.db_write"):
+                self._save_enhanced_memory(prompt, processed_response, session_id, context)
+                self._save_conversation_turn(session_id, prompt, processed_response, response_time)
+            self.summarizer.schedule_update(session_id)
+            
             return processed_response
             
         except Exception as e:
             error_msg = f"Erro ao processar: {e}"
-            self.performance_monitor.record_metric("error_rate", 1.0, "ollama_error")
+            self.performance_monitor.record_metric("ollama_error_rate", 1.0, "ollama_error")
             return error_msg
     
+    def _generate(self, payload, task="chat", session_id=None):
+        """Chama o Ollama respeitando as chaves de cache, retry e fallback
+        
+        A chave do cache cobre a sessão e o prompt já enriquecido com resumo e
+        contexto, para que uma resposta nunca seja servida a outro contexto.
+        """
+        cache_key = None
+        if self.switches.is_enabled("cache_responses"):
+            cache_key = ResponseCache.make_key(payload["model"], task, payload["prompt"], session_id)
+            cached = self.response_cache.get(cache_key)
+            self.performance_monitor.record_metric("response_cache_hit", 1.0 if cached is not None else 0.0, task)
+            if cached is not None:
+                with span("ollama.cache_hit", model=payload["model"]):
+                    return cached
+        
+        models = [payload["model"]]
+        if self.switches.is_enabled("fallback_models"):
+            models += [m for m in self.config.get("ollama", {}).get("models", []) if m not in models]
+        attempts = 3 if self.switches.is_enabled("retry_logic") else 1
+        
+        last_error = None
+        for model in models:
+            for attempt in range(attempts):
+                if attempt:
+                    time.sleep(0.5 * 2 ** (attempt - 1))  # Backoff exponencial
+                try:
+                    with span("ollama.generate", model=model, attempt=attempt + 1) as generate_span:
+                        request_start = time.perf_counter()
+                        response = requests.post(OLLAMA_URL, json={**payload, "model": model}, timeout=30)
+                        response.raise_for_status()
+                        client_latency = time.perf_counter() - request_start
+                        
+                        data = response.json()
+                        data.setdefault("model", model)
+                        
+                        # Tempos do servidor: carga do modelo, prompt, geração e fila
+                        timings = self.ollama_metrics.record(data, client_latency, model, task)
+                        if generate_span is not None:
+                            generate_span.attributes.update(timings)
+                    
+                    if cache_key:
+                        self.response_cache.put(cache_key, data)
+                    return data
+                
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    last_error = e
+                    if attempts > 1 or len(models) > 1:
+                        print(f"Erro no Ollama ({model}, tentativa {attempt + 1}): {e}")
+        
+        raise last_error
+    
     def _get_contextual_memory(self, prompt, session_id):
         """Obtém memória contextual relevante"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        summary, pending_turns = self.summarizer.get_context(session_id)
         
-        # Busca conversas recentes da sessão
-        if session_id:
-            cursor.execute("""
-                SELECT user_input, ai_response 
-                FROM conversations 
-                WHERE session_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT 5
-            """, (session_id,))
-            recent_conversations = cursor.fetchall()
-        else:
-            recent_conversations = []
-        
-        # Busca memórias similares
-        keywords = prompt.lower().split()[:3]  # Primeiras 3 palavras
-        if keywords:
-            like_pattern = f"%{keywords[0]}%"
-            cursor.execute("""
-                SELECT prompt, response, confidence 
-                FROM memory 
-                WHERE LOWER(prompt) LIKE ? 
-                ORDER BY confidence DESC, timestamp DESC 
-                LIMIT 3
-            """, (like_pattern,))
-            similar_memories = cursor.fetchall()
-        else:
-            similar_memories = []
+        # Com resumo, a sessão entra pelo resumo e pelos turnos que ele ainda não cobre,
+        # e o top-k fica livre para memórias e documentação
+        retrieval = self.retrieval_planner.retrieve(prompt, None if summary else session_id)
+        self.performance_monitor.record_metric(
+            "context_retrieval_time", retrieval["timings"]["total"], "retrieval_planner"
+        )
         
-        conn.close()
+        candidates = retrieval["results"]
+        if summary:
+            recent_conversations = pending_turns
+        else:
+            session_turns = sorted(
+                (c for c in candidates if c["source"] == "session"),
+                key=lambda c: int(c["key"].split(":")[1])
+            )
+            recent_conversations = [(c["prompt"], c["response"]) for c in session_turns]
         
         return {
             "recent_conversations": recent_conversations,
-            "similar_memories": similar_memories
+            "similar_memories": [
+                (c["prompt"], c["response"], c["confidence"])
+                for c in candidates if c["source"] in ("lexical", "semantic")
+            ],
+            "retrieved": candidates,
+            "retrieval_timings": retrieval["timings"],
+            "session_summary": summary
         }
     
     def _needs_agent_processing(self, prompt):
@@ -298,18 +450,21 @@ class EnhancedAIAgent:
         """Aprimora prompt com contexto"""
         enhanced = f"Contexto da conversa:\n"
         
-        # Adiciona conversas recentes
-        if context["recent_conversations"]:
-            enhanced += "Conversas recentes:\n"
-            for user_input, ai_response in context["recent_conversations"][-2:]:
+        # Usa o resumo da sessão no lugar do histórico já resumido
+        summary = context.get("session_summary")
+        if summary:
+            enhanced += f"Resumo da conversa até aqui:\n{summary}\n\n"
+            for user_input, ai_response in context.get("recent_conversations", []):
                 enhanced += f"Usuário: {user_input}\nAssistente: {ai_response}\n\n"
         
-        # Adiciona memórias similares
-        if context["similar_memories"]:
-            enhanced += "Conhecimento relacionado:\n"
-            for memory_prompt, memory_response, confidence in context["similar_memories"][:1]:
-                if confidence > 0.7:
-                    enhanced += f"Situação similar: {memory_prompt}\nResposta anterior: {memory_response}\n\n"
+        # Adiciona os candidatos na ordem do ranking do planejador
+        for candidate in context.get("retrieved", []):
+            if candidate["source"] == "session":
+                enhanced += f"Usuário: {candidate['prompt']}\nAssistente: {candidate['response']}\n\n"
+            elif candidate["source"] == "docs":
+                enhanced += f"Documentação ({candidate['prompt']}):\n{candidate['response']}\n\n"
+            else:
+                enhanced += f"Situação similar: {candidate['prompt']}\nResposta anterior: {candidate['response']}\n\n"
         
         enhanced += f"Pergunta atual: {prompt}\n\nResponda de forma contextualizada e personalizada:"
         
@@ -349,12 +504,33 @@ class EnhancedAIAgent:
             INSERT INTO memory (prompt, response, session_id, context, confidence) 
             VALUES (?, ?, ?, ?, ?)
         """, (prompt, response, session_id, json.dumps(context), confidence))
+        memory_id = cursor.lastrowid
         
         conn.commit()
         conn.close()
+        
+        # Indexa a memória para a busca semântica
+        self.retrieval_planner.index_memory(memory_id, prompt)
+    
+    def _save_conversation_turn(self, session_id, user_input, ai_response, response_time):
+        """Registra o turno da conversa na sessão"""
+        if not session_id:
+            return
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO conversations (session_id, user_input, ai_response, response_time)
+            VALUES (?, ?, ?, ?)
+        """, (session_id, user_input, ai_response, response_time))
+        conn.commit()
+        conn.close()
     
+    @traced("agent.generate_workflow")
     def generate_workflow(self, description, progress_callback=None, status_callback=None):
         """Gera workflow usando o gerador avançado"""
+        start_time = time.perf_counter()
+        
         if status_callback:
             status_callback("Analisando descrição do workflow...")
         
@@ -376,6 +552,9 @@ class EnhancedAIAgent:
         
         # Salva workflow gerado
         filename = self.workflow_generator.save_generated_workflow(optimized_workflow, description)
+        self.performance_monitor.record_metric(
+            "workflow_generation_time", time.perf_counter() - start_time, description[:50]
+        )
         
         return {
             "workflow": optimized_workflow,
@@ -383,6 +562,7 @@ class EnhancedAIAgent:
             "description": description
         }
     
+    @traced("agent.create_multimedia_content")
     def create_multimedia_content(self, prompt, content_type="complete", progress_callback=None, status_callback=None):
         """Cria conteúdo multimídia"""
         if status_callback:
@@ -391,7 +571,11 @@ class EnhancedAIAgent:
         if progress_callback:
             progress_callback(20)
         
+        start_time = time.perf_counter()
         content = self.media_orchestrator.create_multimedia_content(prompt, content_type)
+        self.performance_monitor.record_metric(
+            "multimedia_time", time.perf_counter() - start_time, content_type
+        )
         
         if progress_callback:
             progress_callback(100)
@@ -402,10 +586,27 @@ class EnhancedAIAgent:
         """Obtém status completo do sistema"""
         return {
             "performance": self.performance_monitor.identify_bottlenecks(),
+            "latency": {
+                name: self.performance_monitor.get_percentiles(name, minutes=60)
+                for name in list(self.performance_monitor.sketches)
+            },
             "optimization_report": self.auto_optimizer.generate_optimization_report(),
             "agent_status": self.agent_manager.get_available_agents(),
-            "agent_performance": self.agent_manager.get_agent_performance()
+            "agent_performance": self.agent_manager.get_agent_performance(),
+            "ollama": self.ollama_metrics.summary(),
+            "resources": self.resource_sampler.last_sample,
+            "slos": self.slo_evaluator.evaluate(),
+            "profiling": self.profiler.recent_sessions(5),
+            "last_trace": self.get_trace_waterfall()
         }
+    
+    def get_trace_waterfall(self, trace_id=None):
+        """Cascata de spans de uma requisição (a última, se não informada)"""
+        tracer = get_tracer()
+        trace_id = trace_id or tracer.last_trace_id
+        if not trace_id:
+            return None
+        return tracer.format_waterfall(trace_id)
 
 class EnhancedMainWindow(QMainWindow):
     """Interface principal aprimorada"""
@@ -422,6 +623,7 @@ class EnhancedMainWindow(QMainWindow):
         self._setup_ui()
         self._setup_dark_mode()
         self._setup_status_timer()
+        self._start_dashboard()
     
     def _setup_ui(self):
         """Configura interface aprimorada"""
@@ -775,14 +977,32 @@ class EnhancedMainWindow(QMainWindow):
         self.metrics_output = QTextEdit()
         self.metrics_output.setReadOnly(True)
         self.metrics_output.setPlaceholderText("Métricas de performance aparecerão aqui...")
+        self.metrics_output.setFont(QFont("Monospace", 9))
         metrics_layout.addWidget(self.metrics_output)
         
+        metrics_buttons = QHBoxLayout()
         refresh_metrics_btn = QPushButton("🔄 Atualizar Métricas")
         refresh_metrics_btn.clicked.connect(self.refresh_system_metrics)
-        metrics_layout.addWidget(refresh_metrics_btn)
+        metrics_buttons.addWidget(refresh_metrics_btn)
+        
+        profile_btn = QPushButton("🔬 Perfilar Próximas 5 Requisições")
+        profile_btn.clicked.connect(self.arm_profiling)
+        metrics_buttons.addWidget(profile_btn)
+        metrics_layout.addLayout(metrics_buttons)
         
         layout.addWidget(metrics_group)
         
+        # Painel ao vivo (atualizado a cada poucos segundos)
+        dashboard_group = QGroupBox("Painel ao Vivo (última hora)")
+        dashboard_layout = QVBoxLayout(dashboard_group)
+        
+        self.dashboard_view = QLabel("Aguardando métricas...")
+        self.dashboard_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.dashboard_view.setMinimumHeight(300)
+        dashboard_layout.addWidget(self.dashboard_view)
+        
+        layout.addWidget(dashboard_group)
+        
         self.tab_widget.addTab(status_widget, "📊 Status")
     
     def _setup_dark_mode(self):
@@ -816,6 +1036,26 @@ class EnhancedMainWindow(QMainWindow):
         # Primeira atualização
         self.update_system_status()
     
+    def _start_dashboard(self):
+        """Inicia a thread do painel de performance"""
+        self.dashboard_thread = DashboardThread(self.agent.performance_monitor.db_path)
+        self.dashboard_thread.frame_ready.connect(self.show_dashboard_frame)
+        self.dashboard_thread.start()
+    
+    def show_dashboard_frame(self, data, width, height):
+        """Exibe a imagem renderizada pela thread do painel"""
+        image = QImage(data, width, height, QImage.Format.Format_RGBA8888).copy()
+        pixmap = QPixmap.fromImage(image)
+        self.dashboard_view.setPixmap(pixmap.scaled(
+            self.dashboard_view.size(), Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        ))
+    
+    def closeEvent(self, event):
+        """Para a thread do painel ao fechar a janela"""
+        self.dashboard_thread.stop()
+        super().closeEvent(event)
+    
     def process_text_input(self):
         """Processa entrada de texto com funcionalidades aprimoradas"""
         if not self.is_running:
@@ -1003,6 +1243,68 @@ class EnhancedMainWindow(QMainWindow):
         else:
             metrics_text += "✅ Nenhum gargalo crítico identificado\n"
         
+        # SLOs: conformidade no período e consumo do orçamento de erro
+        if status["slos"]:
+            metrics_text += "\n=== SLOs ===\n\n"
+            for slo in status["slos"]:
+                if slo["compliance"] is None:
+                    metrics_text += f"{slo['name']} ({slo['objective']:.0%}): sem dados\n"
+                    continue
+                flag = "🔴" if slo["alerts"] else ("🟡" if slo["budget_remaining"] < 0.25 else "🟢")
+                burn = " | ".join(f"{w} {r:.1f}x" for w, r in slo["burn_rates"].items())
+                metrics_text += (
+                    f"{flag} {slo['name']}: {slo['compliance']:.2%} de {slo['objective']:.0%} | "
+                    f"orçamento restante {slo['budget_remaining']:.0%}\n"
+                    f"   consumo: {burn}\n"
+                )
+                for alert in slo["alerts"]:
+                    metrics_text += (
+                        f"   ⚠️ alerta {alert['alert']} ({alert['windows']}): "
+                        f"{alert['burn_rate']:.1f}x ≥ {alert['threshold']}x [{alert['severity']}]\n"
+                    )
+        
+        # Percentis de latência da última hora
+        latency = {name: p for name, p in status["latency"].items() if p}
+        if latency:
+            metrics_text += "\nLatência (última hora):\n"
+            for name, percentiles in sorted(latency.items()):
+                metrics_text += (
+                    f"- {name}: p50 {percentiles['p50']:.2f}s | p90 {percentiles['p90']:.2f}s | "
+                    f"p99 {percentiles['p99']:.2f}s ({percentiles['count']} amostras)\n"
+                )
+        
+        # Tempos do servidor Ollama por modelo e tarefa
+        if status["ollama"]:
+            metrics_text += "\n=== OLLAMA (médias recentes) ===\n\n"
+            for key, timings in sorted(status["ollama"].items()):
+                metrics_text += f"{key} ({timings['samples']} requisições):\n"
+                metrics_text += (
+                    f"  Carga do modelo: {timings.get('ollama_load_time', 0):.2f}s | "
+                    f"Fila/rede: {timings.get('ollama_queue_time', 0):.2f}s | "
+                    f"Total no servidor: {timings.get('ollama_total_time', 0):.2f}s\n"
+                )
+                metrics_text += (
+                    f"  Prompt: {timings.get('ollama_prompt_tokens_per_sec', 0):.1f} tokens/s | "
+                    f"Geração: {timings.get('ollama_eval_tokens_per_sec', 0):.1f} tokens/s\n"
+                )
+        
+        # Recursos do processo
+        resources = status["resources"]
+        if resources:
+            metrics_text += "\n=== RECURSOS DO PROCESSO ===\n\n"
+            metrics_text += (
+                f"Memória: {resources['process_rss_bytes'] / 2**20:.0f} MB "
+                f"({resources['memory_usage']:.1%} do orçamento, sistema {resources['system_memory_usage']:.0%}) | "
+                f"CPU: {resources['process_cpu_percent']:.0f}%\n"
+            )
+            metrics_text += (
+                f"Threads: {resources['process_threads']:.0f} | "
+                f"Descritores: {resources.get('process_open_fds', 0):.0f} | "
+                f"SQLite: {resources.get('sqlite_memory_bytes', 0) / 2**20:.1f} MB | "
+                f"GC: {resources['gc_gen0_objects']:.0f}/{resources['gc_gen1_objects']:.0f}/"
+                f"{resources['gc_gen2_objects']:.0f}\n"
+            )
+        
         metrics_text += "\n=== PERFORMANCE DOS AGENTES ===\n\n"
         
         # Performance dos agentes
@@ -1014,8 +1316,29 @@ class EnhancedMainWindow(QMainWindow):
             metrics_text += f"  Taxa de sucesso: {metrics['success_rate']:.1%}\n"
             metrics_text += f"  Tempo médio: {metrics['avg_execution_time']:.2f}s\n\n"
         
+        # Sessões de profiling recentes
+        if status["profiling"]:
+            metrics_text += "=== PROFILING ===\n\n"
+            for session in status["profiling"]:
+                metrics_text += f"{session['timestamp']} {session['description']}\n  {session['artifact']}\n"
+            metrics_text += "\n"
+        
+        # Cascata da última requisição
+        if status["last_trace"]:
+            metrics_text += "=== ÚLTIMA REQUISIÇÃO ===\n\n"
+            metrics_text += status["last_trace"] + "\n"
+        
         self.metrics_output.setText(metrics_text)
     
+    def arm_profiling(self):
+        """Arma o profiling das próximas requisições"""
+        if self.agent.profiler.arm(5, reason="status"):
+            QMessageBox.information(self, "Profiling",
+                                  f"As próximas 5 requisições serão perfiladas.\n"
+                                  f"Artefatos em: {self.agent.profiler.output_dir}")
+        else:
+            QMessageBox.warning(self, "Profiling", "Já existe uma sessão de profiling em andamento.")
+    
     def run_in_thread(self, target, on_done):
         """Executa função em thread separada"""
         self.thread = EnhancedWorkerThread(target)
@@ -0,0 +1,296 @@
+# modules/analytics_export.py
+"""
+Exportação Analítica do Cérebro Digital da Queen
+Copia as tabelas dos bancos em arquivos colunares comprimidos, de forma incremental
+"""
+
+import os
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sem pyarrow: exporta em NPZ comprimido
+    pa = pq = None
+
+from modules.db_migrations import DEFAULT_DATABASES
+from modules.metric_rollup import ROLLUP_RESOLUTIONS, rollup_table
+
+EXPORT_FORMATS = ("auto", "parquet", "npz")
+
+# Tabelas com linhas alteradas no lugar (UPDATE sem novo rowid) ou apagadas e
+# recriadas: a marca d'água não enxerga a mudança, então são reexportadas inteiras
+SNAPSHOT_TABLES = {
+    "memory", "agent_tasks", "optimization_history", "session_summaries",
+    "doc_files", "doc_chunks", "user_preferences", "schema_migrations", "n8n_ingest_state",
+    "n8n_workflows"
+}
+
+# Tabelas WITHOUT ROWID com avanço por coluna de tempo: (coluna, sobreposição em s).
+# O balde mais recente ainda pode receber amostras, então a exportação seguinte
+# recomeça um balde antes; a leitura fica com a última versão de cada chave
+TIME_KEYED_TABLES = {rollup_table(resolution): ("bucket_start", size) for resolution, size, _ in ROLLUP_RESOLUTIONS}
+
+MANIFEST = "_manifest.json"
+
+def resolve_format(export_format: str = "auto") -> str:
+    """Parquet se o pyarrow estiver instalado; senão NPZ"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato desconhecido: {export_format}")
+    if export_format == "auto":
+        return "parquet" if pq is not None else "npz"
+    if export_format == "parquet" and pq is None:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+    return export_format
+
+def _write_parquet(path: str, columns: List[str], rows: List[tuple]):
+    table = pa.Table.from_pandas(pd.DataFrame.from_records(rows, columns=columns), preserve_index=False)
+    pq.write_table(table, path, compression="zstd")
+
+def _write_npz(path: str, columns: List[str], rows: List[tuple]):
+    """Uma matriz por coluna, sem objetos Python (carrega sem pickle)
+
+    Nulos vão numa máscara `<coluna>__null`; BLOBs são concatenados em
+    bytes com os limites em `<coluna>__offsets`.
+    """
+    arrays: Dict[str, np.ndarray] = {"__columns__": np.array(columns)}
+    kinds = []
+    for index, name in enumerate(columns):
+        values = [row[index] for row in rows]
+        present = [v for v in values if v is not None]
+        nulls = np.array([v is None for v in values])
+
+        if present and all(isinstance(v, bytes) for v in present):
+            kinds.append("blob")
+            blobs = [v or b"" for v in values]
+            arrays[name] = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+            arrays[f"{name}__offsets"] = np.cumsum([0] + [len(b) for b in blobs], dtype=np.int64)
+        elif present and all(isinstance(v, int) for v in present):
+            kinds.append("int")
+            arrays[name] = np.array([0 if v is None else v for v in values], dtype=np.int64)
+        elif present and all(isinstance(v, (int, float)) for v in present):
+            kinds.append("float")
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            kinds.append("text")
+            arrays[name] = np.array(["" if v is None else str(v) for v in values], dtype=str)
+        arrays[f"{name}__null"] = nulls
+
+    arrays["__kinds__"] = np.array(kinds)
+    np.savez_compressed(path, **arrays)
+
+def _read_npz(path: str) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as data:
+        columns = {}
+        for name, kind in zip(data["__columns__"], data["__kinds__"]):
+            nulls = data[f"{name}__null"]
+            if kind == "blob":
+                buffer, offsets = data[name].tobytes(), data[f"{name}__offsets"]
+                values = [buffer[offsets[i]:offsets[i + 1]] for i in range(len(nulls))]
+            else:
+                values = data[name].tolist()
+            if nulls.any():
+                values = pd.Series(values, dtype=object if kind != "float" else float)
+                values[nulls] = None
+            columns[str(name)] = values
+        return pd.DataFrame(columns)
+
+def _readonly_connection(db_path: str) -> sqlite3.Connection:
+    """Conexão somente leitura (não cria o arquivo nem pega lock de escrita)"""
+    return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=10)
+
+def _exportable_tables(conn: sqlite3.Connection) -> Dict[str, bool]:
+    """Tabelas comuns (nome -> tem rowid), sem as internas do SQLite nem as de FTS"""
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY name").fetchall()
+    virtual = [name for name, sql in rows if (sql or "").upper().startswith("CREATE VIRTUAL TABLE")]
+    return {
+        name: "WITHOUT ROWID" not in (sql or "").upper()
+        for name, sql in rows
+        if not name.startswith("sqlite_")
+        and name not in virtual
+        and not any(name.startswith(f"{v}_") for v in virtual)
+    }
+
+def _primary_key(conn: sqlite3.Connection, table: str) -> List[str]:
+    columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    return [c[1] for c in sorted(columns, key=lambda c: c[5]) if c[5] > 0]
+
+class AnalyticsExporter:
+    """Exporta cada tabela em partes colunares, só com as linhas novas desde a última vez
+
+    Cada banco tem um diretório com um manifesto JSON (rowid exportado e
+    número de partes por tabela). As leituras usam uma conexão somente
+    leitura e blocos curtos de `chunk_size` linhas, cada um em sua própria
+    instrução, para nunca segurar o banco enquanto o app escreve.
+    """
+
+    def __init__(self, output_dir: str = "exports", databases: Optional[Dict[str, str]] = None,
+                 chunk_size: int = 50000, export_format: str = "auto"):
+        self.output_dir = output_dir
+        self.databases = dict(DEFAULT_DATABASES, **(databases or {}))
+        self.chunk_size = chunk_size
+        self.format = resolve_format(export_format)
+
+    def _manifest_path(self, database: str) -> str:
+        return os.path.join(self.output_dir, database, MANIFEST)
+
+    def load_manifest(self, database: str) -> Dict[str, Any]:
+        """Estado da última exportação do banco"""
+        try:
+            with open(self._manifest_path(database), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"tables": {}}
+
+    def _save_manifest(self, database: str, manifest: Dict[str, Any]):
+        path = self._manifest_path(database)
+        temp = f"{path}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp, path)
+
+    def export_all(self, full: bool = False) -> Dict[str, Dict[str, int]]:
+        """Exporta todos os bancos; retorna linhas exportadas por banco e tabela"""
+        return {database: self.export_database(database, full) for database in self.databases}
+
+    def export_database(self, database: str, full: bool = False) -> Dict[str, int]:
+        """Exporta as tabelas de um banco; `full` recomeça do zero"""
+        db_path = self.databases[database]
+        if not os.path.exists(db_path):
+            print(f"Banco não encontrado: {db_path}")
+            return {}
+
+        os.makedirs(os.path.join(self.output_dir, database), exist_ok=True)
+        manifest = {"tables": {}} if full else self.load_manifest(database)
+        exported = {}
+
+        conn = _readonly_connection(db_path)
+        try:
+            for table, has_rowid in _exportable_tables(conn).items():
+                try:
+                    exported[table] = self._export_table(conn, database, table, has_rowid, manifest)
+                except sqlite3.Error as e:
+                    print(f"Erro ao exportar {database}.{table}: {e}")
+                # Grava o progresso a cada tabela: uma falha não perde o que já foi exportado
+                self._save_manifest(database, manifest)
+        finally:
+            conn.close()
+
+        return exported
+
+    def _export_table(self, conn: sqlite3.Connection, database: str, table: str, has_rowid: bool,
+                      manifest: Dict[str, Any]) -> int:
+        time_key = TIME_KEYED_TABLES.get(table)
+        snapshot = table in SNAPSHOT_TABLES or not (has_rowid or time_key)
+        state = manifest["tables"].get(table)
+        table_dir = os.path.join(self.output_dir, database, table)
+        os.makedirs(table_dir, exist_ok=True)
+
+        if state is None or snapshot:
+            # Snapshot (ou primeira exportação): descarta as partes antigas
+            for name in os.listdir(table_dir):
+                if name.startswith("part-"):
+                    os.remove(os.path.join(table_dir, name))
+            state = {"rowid": 0, "since": None, "parts": 0}
+        key = _primary_key(conn, table)
+        state.update(key=key, snapshot=snapshot)
+
+        if has_rowid:
+            # Páginas por rowid: cada bloco é uma consulta curta pelo índice da tabela
+            pages = self._rowid_pages(conn, table, state)
+        else:
+            pages = self._key_pages(conn, table, key, time_key, state)
+
+        total = 0
+        for columns, rows in pages:
+            self._write_part(table_dir, state, columns, rows)
+            total += len(rows)
+
+        manifest["tables"][table] = state
+        return total
+
+    def _rowid_pages(self, conn: sqlite3.Connection, table: str, state: Dict[str, Any]):
+        while True:
+            cursor = conn.execute(
+                f'SELECT rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (state["rowid"], self.chunk_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield ["_rowid"] + [d[0] for d in cursor.description[1:]], rows
+            # Só avança a marca depois que a parte foi gravada
+            state["rowid"] = rows[-1][0]
+
+    def _key_pages(self, conn: sqlite3.Connection, table: str, key: List[str],
+                   time_key: Optional[tuple], state: Dict[str, Any]):
+        """Páginas pela chave primária (tabelas WITHOUT ROWID), desde a marca de tempo"""
+        key_list = ", ".join(f'"{c}"' for c in key)
+        placeholders = ", ".join("?" for _ in key)
+        where, params = "1", []
+        if time_key and state.get("since") is not None:
+            where, params = f'"{time_key[0]}" >= ?', [state["since"]]
+
+        last_key, newest = None, None
+        while True:
+            condition = where if last_key is None else f"{where} AND ({key_list}) > ({placeholders})"
+            cursor = conn.execute(
+                f'SELECT * FROM "{table}" WHERE {condition} ORDER BY {key_list} LIMIT ?',
+                params + (list(last_key) if last_key else []) + [self.chunk_size]
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            columns = [d[0] for d in cursor.description]
+            positions = [columns.index(c) for c in key]
+            last_key = tuple(rows[-1][i] for i in positions)
+            if time_key:
+                column = columns.index(time_key[0])
+                page_newest = max(row[column] for row in rows)
+                newest = page_newest if newest is None else max(newest, page_newest)
+            yield columns, rows
+
+        if time_key and newest is not None:
+            state["since"] = newest - time_key[1]
+
+    def _write_part(self, table_dir: str, state: Dict[str, Any], columns: List[str], rows: List[tuple]):
+        """Grava um bloco como a próxima parte (escrita atômica)"""
+        extension = "parquet" if self.format == "parquet" else "npz"
+        path = os.path.join(table_dir, f"part-{state['parts'] + 1:05d}.{extension}")
+        temp = f"{path}.tmp.{extension}"
+        if self.format == "parquet":
+            _write_parquet(temp, columns, rows)
+        else:
+            _write_npz(temp, columns, rows)
+        os.replace(temp, path)
+        state["parts"] += 1
+
+def load_table(output_dir: str, database: str, table: str) -> pd.DataFrame:
+    """Junta as partes exportadas de uma tabela em um DataFrame
+
+    Linhas regravadas com INSERT OR REPLACE aparecem em mais de uma parte;
+    fica a versão mais recente de cada chave primária.
+    """
+    table_dir = os.path.join(output_dir, database, table)
+    parts = sorted(name for name in os.listdir(table_dir) if name.startswith("part-")
+                   and ".tmp" not in name)
+
+    frames = []
+    for name in parts:
+        path = os.path.join(table_dir, name)
+        frames.append(pd.read_parquet(path) if name.endswith(".parquet") else _read_npz(path))
+    if not frames:
+        return pd.DataFrame()
+
+    frame = pd.concat(frames, ignore_index=True)
+    with open(os.path.join(output_dir, database, MANIFEST), 'r', encoding='utf-8') as f:
+        key = json.load(f)["tables"].get(table, {}).get("key")
+    if key and set(key) <= set(frame.columns):
+        frame = frame.drop_duplicates(subset=key, keep="last").reset_index(drop=True)
+    return frame
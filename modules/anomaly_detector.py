@@ -0,0 +1,152 @@
+# modules/anomaly_detector.py
+"""
+Detecção de Anomalias do Cérebro Digital da Queen
+Linhas de base adaptativas por métrica (EWMA + perfil por hora do dia) e z-scores
+"""
+
+import sqlite3
+import time
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+class AnomalyDetector:
+    """Detecta regressões comparando as amostras recentes à linha de base da própria métrica
+
+    Todas as séries são alinhadas em uma matriz (métricas x amostras) e a média e a
+    variância EWMA são calculadas de uma vez para todas as métricas.
+    """
+
+    def __init__(self, alpha: float = 0.1, z_threshold: float = 3.0, min_samples: int = 30,
+                 recent: int = 5, min_days: int = 3, relative_floor: float = 0.05,
+                 min_rate: float = 0.05):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.recent = recent
+        self.min_days = min_days
+        self.relative_floor = relative_floor
+        # Taxa mínima assumida no piso binomial das métricas _rate
+        self.min_rate = min_rate
+
+    def _matrix(self, series: Dict[str, Sequence[float]]) -> np.ndarray:
+        """Alinha as séries à direita (amostra mais recente na última coluna), NaN à esquerda"""
+        length = max(len(values) for values in series.values())
+        matrix = np.full((len(series), length), np.nan)
+        for row, values in enumerate(series.values()):
+            if len(values):
+                matrix[row, length - len(values):] = values
+        return matrix
+
+    def ewma_baseline(self, history: np.ndarray):
+        """Média e desvio padrão EWMA por linha, ignorando NaN"""
+        length = history.shape[1]
+        weights = (1 - self.alpha) ** np.arange(length - 1, -1, -1)
+        mask = ~np.isnan(history)
+        w = mask * weights
+        x = np.where(mask, history, 0.0)
+
+        total = w.sum(axis=1)
+        total[total == 0] = np.nan
+        mean = (w * x).sum(axis=1) / total
+        var = (w * (x - mean[:, None]) ** 2).sum(axis=1) / total
+        return mean, np.sqrt(var)
+
+    def detect(self, series: Dict[str, Sequence[float]],
+               seasonal: Optional[Dict[str, np.ndarray]] = None,
+               hour: Optional[int] = None) -> List[Dict]:
+        """Avalia todas as séries com amostras suficientes em uma passada
+
+        `seasonal` mapeia métrica -> matriz 24x3 (média, desvio, dias) por hora do
+        dia; quando a hora atual tem dias suficientes, substitui a média EWMA.
+        """
+        eligible = {name: values for name, values in series.items() if len(values) >= self.min_samples}
+        if not eligible:
+            return []
+
+        names = list(eligible)
+        matrix = self._matrix(eligible)
+        history, recent = matrix[:, :-self.recent], matrix[:, -self.recent:]
+
+        baseline, std = self.ewma_baseline(history)
+        current = np.nanmean(recent, axis=1)
+        method = np.array(["ewma"] * len(names), dtype=object)
+
+        if seasonal:
+            hour = time.localtime().tm_hour if hour is None else hour
+            profile = np.array([
+                seasonal[name][hour] if name in seasonal else (np.nan, np.nan, 0)
+                for name in names
+            ], dtype=float)
+            use_seasonal = profile[:, 2] >= self.min_days
+            baseline = np.where(use_seasonal, profile[:, 0], baseline)
+            std = np.where(use_seasonal, np.fmax(std, profile[:, 1]), std)
+            method[use_seasonal] = "seasonal"
+
+        # Piso no desvio para séries quase constantes não gerarem z enormes; em taxas
+        # (0..1) o piso é o erro binomial da média recente, que não zera com linha de base 0
+        floor = np.fmax(self.relative_floor * np.abs(baseline), 1e-6)
+        is_rate = np.array([name.endswith("_rate") for name in names])
+        if is_rate.any():
+            p = np.clip(np.nan_to_num(baseline), self.min_rate, 1 - self.min_rate)
+            n = np.maximum((~np.isnan(recent)).sum(axis=1), 1)
+            floor = np.where(is_rate, np.fmax(floor, np.sqrt(p * (1 - p) / n)), floor)
+        std = np.fmax(std, floor)
+        z_scores = (current - baseline) / std
+
+        return [
+            {
+                "metric": name,
+                "value": float(current[i]),
+                "baseline": float(baseline[i]),
+                "std": float(std[i]),
+                "z_score": float(z_scores[i]),
+                "method": method[i],
+                "anomaly": bool(z_scores[i] > self.z_threshold)
+            }
+            for i, name in enumerate(names)
+        ]
+
+    def seasonal_profiles(self, db_path: str, days: int = 28,
+                          now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Perfil por hora do dia (média, desvio entre dias, nº de dias) a partir do rollup horário"""
+        now = now or time.time()
+        current_hour = int(now // 3600) * 3600
+
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("""
+                SELECT metric_name, bucket_start, count, sum FROM metric_rollup_1h
+                WHERE bucket_start >= ? AND bucket_start < ? AND count > 0
+            """, (current_hour - days * 86400, current_hour)).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+
+        if not rows:
+            return {}
+
+        names = sorted({row[0] for row in rows})
+        index = {name: i for i, name in enumerate(names)}
+        metric_idx = np.array([index[row[0]] for row in rows])
+        buckets = np.array([row[1] for row in rows], dtype=np.int64)
+        hourly_mean = np.array([row[3] / row[2] for row in rows])
+
+        # Hora local de cada balde
+        offset = time.localtime(now).tm_gmtoff
+        hours = ((buckets + offset) // 3600) % 24
+
+        shape = (len(names), 24)
+        days_seen = np.zeros(shape)
+        sums = np.zeros(shape)
+        squares = np.zeros(shape)
+        np.add.at(days_seen, (metric_idx, hours), 1)
+        np.add.at(sums, (metric_idx, hours), hourly_mean)
+        np.add.at(squares, (metric_idx, hours), hourly_mean ** 2)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / days_seen
+            std = np.sqrt(np.maximum(squares / days_seen - mean ** 2, 0.0))
+
+        profiles = np.stack([mean, std, days_seen], axis=2)
+        return {name: profiles[i] for i, name in enumerate(names)}
@@ -4,86 +4,302 @@ Módulo de Auto-Otimização do Cérebro Digital da Queen
 Monitora performance, identifica gargalos e otimiza automaticamente
 """
 
+import gc
 import json
 import time
+import atexit
 import sqlite3
 import requests
 import threading
+from array import array
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
+
+from modules.db_migrations import migrate_database
+from modules.metric_sketch import QuantileSketch
+from modules.metric_rollup import apply_rollups, expire, choose_resolution, query_rollup
+from modules.runtime_switches import RuntimeSwitches
+from modules.anomaly_detector import AnomalyDetector
+from modules.resource_sampler import release_native_memory
+from modules.openmetrics import Histogram
+from modules.significance import mann_whitney_u
+from modules.n8n_ingest import ExecutionIngestor
+from modules.n8n_profile import profile_workflow
+
+class MetricRingBuffer:
+    """Buffer circular pré-alocado com (timestamp, valor) de uma métrica"""
+    
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def append(self, timestamp: float, value: float):
+        """Sobrescreve a posição mais antiga; custo constante, sem alocação"""
+        with self._lock:
+            slot = self._count % self.capacity
+            self._timestamps[slot] = timestamp
+            self._values[slot] = value
+            self._count += 1
+    
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+    
+    @property
+    def total(self) -> int:
+        """Quantos valores já foram registrados (inclusive os sobrescritos)"""
+        return self._count
+    
+    def snapshot(self, n: Optional[int] = None) -> Tuple[List[float], List[float]]:
+        """Retorna (timestamps, valores) dos últimos n registros em ordem cronológica"""
+        with self._lock:
+            size = min(self._count, self.capacity)
+            n = size if n is None else min(n, size)
+            start = self._count - n
+            slots = [(start + i) % self.capacity for i in range(n)]
+            return [self._timestamps[i] for i in slots], [self._values[i] for i in slots]
+    
+    def values(self, n: Optional[int] = None) -> List[float]:
+        """Retorna os últimos n valores em ordem cronológica"""
+        return self.snapshot(n)[1]
 
 class PerformanceMonitor:
     """Monitor de performance do sistema"""
     
-    def __init__(self, db_path: str = 'queen_performance.db'):
+    # Janela de cada sketch de latência (segundos) e quantas manter em memória
+    SKETCH_WINDOW = 60
+    SKETCH_RETENTION = 60
+    
+    # Intervalo entre limpezas de métricas fora da retenção (segundos)
+    EXPIRY_INTERVAL = 3600
+    
+    # Intervalo entre recargas dos perfis sazonais (segundos)
+    SEASONAL_REFRESH = 3600
+    
+    def __init__(self, db_path: str = 'queen_performance.db', buffer_size: int = 100,
+                 flush_interval: float = 1.0, batch_size: int = 500, max_pending: int = 50000,
+                 bottleneck_window_minutes: int = 15):
         self.db_path = db_path
-        self.metrics = {}
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.bottleneck_window_minutes = bottleneck_window_minutes
+        self.metrics: Dict[str, MetricRingBuffer] = {}
+        
+        # Sketches por métrica de latência (_time) e por janela de um minuto
+        self.sketches: Dict[str, Dict[int, QuantileSketch]] = {}
+        self._sketch_lock = threading.Lock()
+        
+        # Histogramas cumulativos das métricas _time desde o início do processo
+        self.histograms: Dict[str, Histogram] = {}
         self.running = False
+        
+        # deque.append é atômico: produtores não disputam lock
+        self._pending = deque(maxlen=max_pending)
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._last_expiry = 0.0
+        
+        # Métricas com amostras novas desde a última avaliação; o evento acorda
+        # quem espera por dados (o loop do otimizador) sem polling
+        self._dirty = set()
+        self.ingest_event = threading.Event()
+        
+        # Métricas só de diagnóstico (ex.: fases do Ollama): medidas, mas fora das regras de gargalo
+        self.diagnostic_metrics = set()
+        
+        # Linhas de base adaptativas por métrica
+        self.anomaly_detector = AnomalyDetector()
+        self._seasonal: Dict[str, Any] = {}
+        self._seasonal_loaded = 0.0
         self._init_db()
+        atexit.register(self.flush)
     
     def _init_db(self):
         """Inicializa o banco de dados de métricas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS performance_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                metric_name TEXT NOT NULL,
-                metric_value REAL NOT NULL,
-                context TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS optimization_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                optimization_type TEXT NOT NULL,
-                description TEXT,
-                before_value REAL,
-                after_value REAL,
-                success BOOLEAN
-            )
-        """)
-        conn.commit()
-        conn.close()
+        migrate_database(self.db_path, "performance")
     
     def record_metric(self, name: str, value: float, context: str = ""):
-        """Registra uma métrica de performance"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO performance_metrics (metric_name, metric_value, context) VALUES (?, ?, ?)",
-            (name, value, context)
-        )
-        conn.commit()
-        conn.close()
+        """Registra uma métrica de performance (gravação em lote em segundo plano)"""
+        now = time.time()
+        
+        buffer = self.metrics.get(name)
+        if buffer is None:
+            buffer = self.metrics.setdefault(name, MetricRingBuffer(self.buffer_size))
+        buffer.append(now, value)
+        
+        if name.endswith('_time'):
+            self._add_to_sketch(name, now, value)
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms.setdefault(name, Histogram())
+            histogram.observe(value)
+        
+        self._dirty.add(name)
+        if not self.ingest_event.is_set():
+            self.ingest_event.set()
+        
+        self._pending.append((now, name, float(value), context))
+        
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size:
+            self._flush_event.set()
+    
+    @property
+    def pending_count(self) -> int:
+        """Amostras aguardando gravação no banco"""
+        return len(self._pending)
+    
+    def drain_dirty(self) -> List[str]:
+        """Retorna e esquece as métricas com amostras novas"""
+        names = []
+        while True:
+            try:
+                names.append(self._dirty.pop())  # pop é atômico: nada se perde
+            except KeyError:
+                return names
+    
+    def _add_to_sketch(self, name: str, timestamp: float, value: float):
+        """Acumula o valor no sketch da janela corrente da métrica"""
+        window = int(timestamp // self.SKETCH_WINDOW)
+        
+        with self._sketch_lock:
+            windows = self.sketches.setdefault(name, {})
+            sketch = windows.get(window)
+            if sketch is None:
+                sketch = windows[window] = QuantileSketch()
+                # Descarta janelas fora da retenção ao abrir uma nova
+                for old in [w for w in windows if w <= window - self.SKETCH_RETENTION]:
+                    del windows[old]
+            sketch.add(value)
+    
+    def get_sketch(self, name: str, minutes: Optional[int] = None) -> Optional[QuantileSketch]:
+        """Mescla os sketches das janelas dos últimos N minutos (todas se None)"""
+        with self._sketch_lock:
+            windows = self.sketches.get(name)
+            if not windows:
+                return None
+            
+            current = int(time.time() // self.SKETCH_WINDOW)
+            merged = QuantileSketch()
+            for window, sketch in windows.items():
+                if minutes is None or window > current - minutes * 60 // self.SKETCH_WINDOW:
+                    merged.merge(sketch)
         
-        # Atualiza métricas em memória
-        if name not in self.metrics:
-            self.metrics[name] = []
-        self.metrics[name].append({
-            'value': value,
-            'timestamp': datetime.now(),
-            'context': context
+        return merged if merged.count else None
+    
+    def get_percentiles(self, name: str, minutes: Optional[int] = None,
+                        quantiles=(0.5, 0.9, 0.99)) -> Dict[str, Any]:
+        """Retorna p50/p90/p99 (ou os quantis pedidos) de uma métrica de latência"""
+        sketch = self.get_sketch(name, minutes)
+        if sketch is None:
+            return {}
+        
+        result = sketch.percentiles(quantiles)
+        result.update({
+            'count': sketch.count,
+            'mean': sketch.mean,
+            'max': sketch.max
         })
+        return result
+    
+    def _ensure_flusher(self):
+        """Inicia a thread de gravação sob demanda"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
         
-        # Mantém apenas os últimos 100 registros em memória
-        if len(self.metrics[name]) > 100:
-            self.metrics[name] = self.metrics[name][-100:]
+        with self._flusher_lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self.running = True
+            self._flusher = threading.Thread(target=self._flush_loop)
+            self._flusher.daemon = True
+            self._flusher.start()
+    
+    def _flush_loop(self):
+        """Grava periodicamente as métricas pendentes"""
+        while self.running:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
     
-    def get_metric_trend(self, name: str, hours: int = 24) -> List[Dict]:
-        """Obtém tendência de uma métrica nas últimas horas"""
+    def flush(self) -> int:
+        """Grava no banco todas as métricas pendentes; retorna quantas foram gravadas"""
+        with self._flush_lock:
+            rows = []
+            while self._pending:
+                try:
+                    rows.append(self._pending.popleft())
+                except IndexError:
+                    break
+            
+            if not rows:
+                return 0
+            
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT INTO performance_metrics (timestamp, metric_name, metric_value, context) VALUES (?, ?, ?, ?)",
+                    [
+                        # Mesmo formato do DEFAULT CURRENT_TIMESTAMP (UTC)
+                        (datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'), name, value, context)
+                        for ts, name, value, context in rows
+                    ]
+                )
+                # Rollups atualizados na mesma transação das linhas brutas
+                apply_rollups(cursor, [(ts, name, value) for ts, name, value, _ in rows])
+                
+                if time.time() - self._last_expiry > self.EXPIRY_INTERVAL:
+                    expire(cursor)
+                    self._last_expiry = time.time()
+                
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                print(f"Erro ao gravar métricas: {e}")
+                # Devolve o lote à fila para a próxima tentativa
+                self._pending.extendleft(reversed(rows))
+                return 0
+            
+            return len(rows)
+    
+    def close(self):
+        """Grava as métricas pendentes e encerra a thread de gravação"""
+        self.running = False
+        self._flush_event.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+    
+    def get_metric_trend(self, name: str, hours: int = 24, resolution: str = "auto") -> List[Dict]:
+        """Obtém tendência de uma métrica nas últimas horas
+        
+        Com resolution="auto" usa o rollup mais fino que cubra a janela com
+        poucos pontos (1m, 1h ou 1d); "raw" lê as linhas brutas ainda retidas.
+        """
+        self.flush()
+        
+        if resolution != "raw":
+            if resolution == "auto":
+                resolution = choose_resolution(hours * 3600)
+            return query_rollup(self.db_path, name, time.time() - hours * 3600, resolution)
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        since = datetime.now() - timedelta(hours=hours)
+        since = datetime.utcnow() - timedelta(hours=hours)
         
         cursor.execute("""
             SELECT timestamp, metric_value, context 
             FROM performance_metrics 
             WHERE metric_name = ? AND timestamp > ?
             ORDER BY timestamp DESC
-        """, (name, since))
+        """, (name, since.strftime('%Y-%m-%d %H:%M:%S')))
         
         results = cursor.fetchall()
         conn.close()
@@ -97,44 +313,198 @@ class PerformanceMonitor:
             for row in results
         ]
     
-    def identify_bottlenecks(self) -> List[Dict]:
-        """Identifica gargalos de performance"""
+    def detect_anomalies(self, now: Optional[float] = None,
+                         metric_names: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Compara cada métrica à sua linha de base adaptativa (todas de uma vez)"""
+        now = now or time.time()
+        names = list(self.metrics) if metric_names is None else metric_names
+        series = {name: self.metrics[name].values() for name in names if name in self.metrics}
+        if not series:
+            return []
+        
+        # Perfis por hora do dia vêm do rollup horário; recalculados a cada hora
+        if now - self._seasonal_loaded >= self.SEASONAL_REFRESH:
+            self._seasonal_loaded = now
+            try:
+                self._seasonal = self.anomaly_detector.seasonal_profiles(self.db_path, now=now)
+            except Exception as e:
+                print(f"Erro ao carregar perfis sazonais: {e}")
+        
+        hour = time.localtime(now).tm_hour
+        return self.anomaly_detector.detect(series, self._seasonal, hour)
+    
+    def exclude_from_bottlenecks(self, names: Iterable[str]):
+        """Marca métricas como diagnósticas: não disparam gargalos nem otimizações"""
+        self.diagnostic_metrics.update(names)
+    
+    def identify_bottlenecks(self, metric_names: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Identifica gargalos de performance
+        
+        Métricas com histórico suficiente são julgadas pela própria linha de base
+        (z-score); as demais caem nos limites fixos de 5s e 10% de erro.
+        Com `metric_names`, avalia só essas métricas (avaliação incremental).
+        """
         bottlenecks = []
+        watched = ('_time', '_error_rate')
+        names = set(self.metrics) if metric_names is None else set(metric_names) & set(self.metrics)
+        names -= self.diagnostic_metrics
         
-        for metric_name, values in self.metrics.items():
-            if len(values) < 10:  # Precisa de dados suficientes
+        adaptive = {}
+        try:
+            adaptive = {
+                a['metric']: a
+                for a in self.detect_anomalies(metric_names=[n for n in names if n.endswith(watched)])
+            }
+        except Exception as e:
+            print(f"Erro na detecção de anomalias: {e}")
+        
+        for anomaly in adaptive.values():
+            if not anomaly['anomaly']:
                 continue
             
-            recent_values = [v['value'] for v in values[-10:]]
-            avg_recent = sum(recent_values) / len(recent_values)
+            if anomaly['metric'].endswith('_error_rate'):
+                bottleneck_type = 'high_error_rate'
+                severity = 'critical' if anomaly['value'] > 0.3 else 'high'
+            else:
+                bottleneck_type = 'high_latency'
+                severity = 'high' if anomaly['z_score'] > 2 * self.anomaly_detector.z_threshold else 'medium'
             
-            # Identifica métricas com valores consistentemente altos
-            if metric_name.endswith('_time') and avg_recent > 5.0:  # Tempo > 5 segundos
+            bottlenecks.append({
+                'type': bottleneck_type,
+                'metric': anomaly['metric'],
+                'value': anomaly['value'],
+                'average_value': anomaly['baseline'],
+                'baseline': anomaly['baseline'],
+                'z_score': anomaly['z_score'],
+                'detection': anomaly['method'],
+                'severity': severity
+            })
+        
+        # Latência: regras sobre o p95 da janela recente, não sobre a média
+        for metric_name in list(self.sketches):
+            if metric_name not in names or metric_name in adaptive:
+                continue
+            sketch = self.get_sketch(metric_name, self.bottleneck_window_minutes)
+            if sketch is None or sketch.count < 10:  # Precisa de dados suficientes
+                continue
+            
+            p95 = sketch.quantile(0.95)
+            if p95 > 5.0:  # p95 > 5 segundos
                 bottlenecks.append({
                     'type': 'high_latency',
                     'metric': metric_name,
-                    'average_value': avg_recent,
-                    'severity': 'high' if avg_recent > 10.0 else 'medium'
+                    'percentile': 'p95',
+                    'value': p95,
+                    'average_value': sketch.mean,
+                    'detection': 'threshold',
+                    'severity': 'high' if p95 > 10.0 else 'medium'
                 })
+        
+        for metric_name, buffer in list(self.metrics.items()):
+            if metric_name not in names or not metric_name.endswith('_error_rate'):
+                continue
+            if metric_name in adaptive or len(buffer) < 10:
+                continue
+            
+            recent_values = buffer.values(10)
+            avg_recent = sum(recent_values) / len(recent_values)
             
-            elif metric_name.endswith('_error_rate') and avg_recent > 0.1:  # Taxa de erro > 10%
+            if avg_recent > 0.1:  # Taxa de erro > 10%
                 bottlenecks.append({
                     'type': 'high_error_rate',
                     'metric': metric_name,
+                    'value': avg_recent,
                     'average_value': avg_recent,
+                    'detection': 'threshold',
                     'severity': 'critical' if avg_recent > 0.3 else 'high'
                 })
         
+        # Memória: última amostra do processo ou do sistema acima de 80%
+        for metric_name in ('memory_usage', 'system_memory_usage'):
+            if metric_name not in names:
+                continue
+            buffer = self.metrics.get(metric_name)
+            if buffer is None or not len(buffer):
+                continue
+            
+            usage = buffer.values(1)[0]
+            if usage > 0.8:
+                bottlenecks.append({
+                    'type': 'memory_usage',
+                    'metric': metric_name,
+                    'value': usage,
+                    'average_value': sum(buffer.values(10)) / len(buffer.values(10)),
+                    'detection': 'threshold',
+                    'severity': 'critical' if usage > 0.95 else 'high'
+                })
+        
         return bottlenecks
 
 class AutoOptimizer:
-    """Sistema de auto-otimização"""
+    """Sistema de auto-otimização em malha fechada
+    
+    Quando um gargalo persiste, liga uma chave de execução ligada à ação da
+    regra, mede a métrica durante a janela de avaliação e mantém a mudança
+    só se ela melhorou o valor; caso contrário, desfaz. Uma tentativa por vez,
+    para que a melhora possa ser atribuída à ação.
+    """
     
-    def __init__(self, monitor: PerformanceMonitor, ollama_url: str = "http://localhost:11434/api/generate"):
+    def __init__(self, monitor: PerformanceMonitor, ollama_url: str = "http://localhost:11434/api/generate",
+                 switches: Optional[RuntimeSwitches] = None, debounce: float = 2.0, cooldown: int = 300,
+                 evaluation_window: int = 600, persistence: int = 3, min_samples: int = 10,
+                 min_improvement: float = 0.1, retry_after: int = 6 * 3600,
+                 memory_cooldown: int = 300, profiler=None, profile_calls: int = 5,
+                 profile_cooldown: int = 3600, slo_evaluator=None, significance: float = 0.05):
         self.monitor = monitor
         self.ollama_url = ollama_url
+        self.switches = switches or RuntimeSwitches()
+        self.debounce = debounce
+        self.cooldown = cooldown
+        self.evaluation_window = evaluation_window
+        self.persistence = persistence
+        self.min_samples = min_samples
+        self.min_improvement = min_improvement
+        # Nível de significância do teste antes/depois (Mann-Whitney unilateral)
+        self.significance = significance
+        self.retry_after = retry_after
         self.optimization_rules = self._load_optimization_rules()
         self.running = False
+        self.active_trial: Optional[Dict[str, Any]] = None
+        self._streaks: Dict[tuple, int] = {}
+        self._failed_actions: Dict[tuple, float] = {}
+        self._cooldown_until: Dict[tuple, float] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._trial_lock = threading.Lock()
+        
+        # Ações da regra memory_usage: callbacks que liberam memória da aplicação
+        self.memory_cooldown = memory_cooldown
+        self.memory_actions: Dict[str, List[Callable[[], Any]]] = {
+            'clear_cache': [],
+            'optimize_memory': [release_native_memory],
+            'garbage_collection': [gc.collect]
+        }
+        self._last_memory_relief = 0.0
+        self._memory_lock = threading.Lock()
+        
+        # Profiling automático das próximas requisições quando a latência dispara
+        self.profiler = profiler
+        self.profile_calls = profile_calls
+        self.profile_cooldown = profile_cooldown
+        self._last_profiled: Dict[str, float] = {}
+        
+        # SLOs consumindo orçamento acima do limite têm prioridade
+        self.slo_evaluator = slo_evaluator
+        
+        # Ações de regra sem chave no pipeline não podem ser aplicadas
+        unavailable = [
+            action
+            for rule in ('high_latency', 'high_error_rate')
+            for action in self.optimization_rules[rule]['actions']
+            if action not in self.switches
+        ]
+        if unavailable:
+            print(f"Ações sem chave de execução, ignoradas: {', '.join(unavailable)}")
     
     def _load_optimization_rules(self) -> Dict:
         """Carrega regras de otimização"""
@@ -155,76 +525,303 @@ class AutoOptimizer:
     
     def start_monitoring(self):
         """Inicia o monitoramento contínuo"""
+        if self._thread is not None and self._thread.is_alive():
+            return
         self.running = True
-        thread = threading.Thread(target=self._monitoring_loop)
-        thread.daemon = True
-        thread.start()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._monitoring_loop)
+        self._thread.daemon = True
+        self._thread.start()
     
-    def stop_monitoring(self):
-        """Para o monitoramento"""
+    def stop_monitoring(self, timeout: float = 5.0):
+        """Para o monitoramento e aguarda a thread terminar"""
         self.running = False
+        self._stop_event.set()
+        self.monitor.ingest_event.set()  # Acorda a espera por métricas
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _next_deadline(self, now: float) -> Optional[float]:
+        """Segundos até o fim da tentativa em curso; None se nada agendado"""
+        trial = self.active_trial
+        if trial is None:
+            return None
+        for limit in (self.evaluation_window, 3 * self.evaluation_window):
+            remaining = trial['started'] + limit - now
+            if remaining > 0:
+                return remaining
+        return 0.0
     
     def _monitoring_loop(self):
-        """Loop principal de monitoramento"""
-        while self.running:
+        """Loop principal: acorda com métricas novas (ou no fim da tentativa em curso)"""
+        while not self._stop_event.is_set():
             try:
-                # Identifica gargalos
-                bottlenecks = self.monitor.identify_bottlenecks()
+                # Ocioso, sem tentativa em curso: espera sem prazo e sem consumir CPU
+                self.monitor.ingest_event.wait(self._next_deadline(time.time()))
+                if self._stop_event.is_set():
+                    break
                 
-                # Aplica otimizações se necessário
-                for bottleneck in bottlenecks:
-                    self._apply_optimization(bottleneck)
-                
-                # Aguarda antes da próxima verificação
-                time.sleep(60)  # Verifica a cada minuto
+                # Debounce: junta a rajada de métricas em uma só avaliação
+                if self._stop_event.wait(self.debounce):
+                    break
+                self.monitor.ingest_event.clear()
+                self.run_cycle(metric_names=self.monitor.drain_dirty())
                 
             except Exception as e:
                 print(f"Erro no loop de monitoramento: {e}")
-                time.sleep(30)  # Aguarda menos tempo em caso de erro
+                self._stop_event.wait(30)  # Aguarda em caso de erro
+    
+    def run_cycle(self, now: Optional[float] = None, metric_names: Optional[List[str]] = None):
+        """Uma verificação: avalia a tentativa em curso ou inicia uma nova
+        
+        Com `metric_names`, só essas métricas são reavaliadas; as sequências das
+        demais ficam como estão até chegarem amostras novas delas.
+        """
+        now = now or time.time()
+        
+        with self._trial_lock:
+            if self.active_trial:
+                self._evaluate_trial(now)
+                return
+        
+        # Identifica gargalos e conta por quantas verificações seguidas persistem
+        bottlenecks = self.monitor.identify_bottlenecks(metric_names)
+        evaluated = None if metric_names is None else set(metric_names)
+        seen = set()
+        for bottleneck in bottlenecks:
+            key = (bottleneck['type'], bottleneck['metric'])
+            seen.add(key)
+            self._streaks[key] = self._streaks.get(key, 0) + 1
+        for key in list(self._streaks):
+            if key not in seen and (evaluated is None or key[1] in evaluated):
+                del self._streaks[key]
+        
+        # Gargalo de latência novo: coleta perfis enquanto ele ainda acontece
+        for bottleneck in bottlenecks:
+            if bottleneck['type'] == 'high_latency':
+                self._request_profile(bottleneck, now)
+        
+        # SLOs em alerta já vêm confirmados por duas janelas: dispensam a sequência
+        # e vão na frente, do maior consumo de orçamento ao menor
+        burning = []
+        if self.slo_evaluator is not None:
+            try:
+                burning = sorted(self.slo_evaluator.bottlenecks(now), key=lambda b: b['burn_rate'], reverse=True)
+            except Exception as e:
+                print(f"Erro ao avaliar SLOs: {e}")
+        burning_keys = {(b['type'], b['metric']) for b in burning}
+        
+        # Depois, o gargalo persistente mais severo; tudo fora do cooldown
+        persistent = sorted(
+            (b for b in bottlenecks
+             if self._streaks[(b['type'], b['metric'])] >= self.persistence
+             and (b['type'], b['metric']) not in burning_keys),
+            key=lambda b: b['value'], reverse=True
+        )
+        for bottleneck in burning + persistent:
+            if self._cooldown_until.get((bottleneck['type'], bottleneck['metric']), 0.0) > now:
+                continue
+            if self._apply_optimization(bottleneck, now):
+                break
     
-    def _apply_optimization(self, bottleneck: Dict):
+    def _apply_optimization(self, bottleneck: Dict, now: Optional[float] = None) -> bool:
         """Aplica otimização baseada no gargalo identificado"""
         optimization_type = bottleneck['type']
+        
+        # Aplica otimização específica
+        if optimization_type == 'high_latency':
+            return self._optimize_latency(bottleneck, now)
+        elif optimization_type == 'high_error_rate':
+            return self._optimize_error_rate(bottleneck, now)
+        elif optimization_type == 'memory_usage':
+            return self.relieve_memory(bottleneck, now=now)
+        return False
+    
+    def _optimize_latency(self, bottleneck: Dict, now: Optional[float] = None) -> bool:
+        """Otimiza latência (cache de respostas, processamento paralelo)"""
+        return self._start_trial(bottleneck, self.optimization_rules['high_latency']['actions'], now)
+    
+    def _optimize_error_rate(self, bottleneck: Dict, now: Optional[float] = None) -> bool:
+        """Otimiza taxa de erro (retry, modelos de fallback)"""
+        return self._start_trial(bottleneck, self.optimization_rules['high_error_rate']['actions'], now)
+    
+    def _request_profile(self, bottleneck: Dict, now: float) -> bool:
+        """Arma o profiler para a métrica, no máximo uma vez por cooldown"""
+        if self.profiler is None:
+            return False
+        
         metric_name = bottleneck['metric']
+        if now - self._last_profiled.get(metric_name, 0.0) < self.profile_cooldown:
+            return False
+        
+        reason = f"{bottleneck['type']} {metric_name} {bottleneck['value']:.2f}"
+        if not self.profiler.arm(self.profile_calls, reason=reason, metric=metric_name):
+            return False
+        self._last_profiled[metric_name] = now
+        return True
+    
+    def register_memory_action(self, action: str, callback: Callable[[], Any]):
+        """Associa um callback (ex.: limpar um cache) a uma ação da regra memory_usage"""
+        if action not in self.memory_actions:
+            raise KeyError(f"Ação de memória desconhecida: {action}")
+        self.memory_actions[action].append(callback)
+    
+    def relieve_memory(self, bottleneck: Dict, measure: Optional[Callable[[], float]] = None,
+                       now: Optional[float] = None) -> bool:
+        """Executa as ações da regra memory_usage, no máximo uma vez por cooldown"""
+        now = now or time.time()
+        with self._memory_lock:
+            if now - self._last_memory_relief < self.memory_cooldown:
+                return False
+            self._last_memory_relief = now
         
-        print(f"Aplicando otimização para {optimization_type} em {metric_name}")
+        actions = self.optimization_rules['memory_usage']['actions']
+        print(f"Aliviando memória ({bottleneck['metric']} = {bottleneck['value']:.0%})")
+        history_id = self._record_optimization_attempt('memory_usage', bottleneck, ",".join(actions))
         
-        # Registra tentativa de otimização
-        self._record_optimization_attempt(optimization_type, bottleneck)
+        for action in actions:
+            for callback in self.memory_actions.get(action, []):
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Erro na ação de memória {action}: {e}")
         
-        # Aplica otimização específica
+        after = measure() if measure else None
+        # Liberação de memória não é desfeita, mesmo sem melhora medida
+        self._record_optimization_result(
+            history_id, after, after is not None and after < bottleneck['value'], rolled_back=False
+        )
+        return True
+    
+    def _start_trial(self, bottleneck: Dict, actions: List[str], now: Optional[float] = None) -> bool:
+        """Liga a primeira chave ainda não tentada e abre a janela de avaliação"""
+        now = now or time.time()
+        metric_name = bottleneck['metric']
+        
+        for action in actions:
+            # Ignora ações sem chave no pipeline ou que não atuam sobre esta métrica
+            if action not in self.switches or self.switches.is_enabled(action):
+                continue
+            if not self.switches.affects(action, metric_name):
+                continue
+            failed_at = self._failed_actions.get((action, metric_name))
+            if failed_at and now - failed_at < self.retry_after:
+                continue
+            
+            # Guarda a distribuição do "antes" e a resume com a mesma estatística da avaliação
+            before_values = self._window_values(metric_name, now - self.evaluation_window)
+            before = self._summarize(bottleneck['type'], before_values)
+            if before is None:
+                before = bottleneck['value']
+            
+            print(f"Aplicando otimização {action} para {bottleneck['type']} em {metric_name}")
+            previous = self.switches.set(action, True)
+            history_id = self._record_optimization_attempt(bottleneck['type'], dict(bottleneck, value=before), action)
+            
+            with self._trial_lock:
+                self.active_trial = {
+                    'id': history_id,
+                    'type': bottleneck['type'],
+                    'metric': metric_name,
+                    'action': action,
+                    'previous': previous,
+                    'before': before,
+                    'before_values': before_values,
+                    'started': now
+                }
+            self._streaks.pop((bottleneck['type'], metric_name), None)
+            return True
+        
+        return False
+    
+    def _window_values(self, metric_name: str, since: float) -> List[float]:
+        """Amostras da métrica em memória registradas desde `since`"""
+        buffer = self.monitor.metrics.get(metric_name)
+        if buffer is None:
+            return []
+        timestamps, values = buffer.snapshot()
+        return [v for t, v in zip(timestamps, values) if t >= since]
+    
+    def _summarize(self, optimization_type: str, values: List[float]) -> Optional[float]:
+        """p95 para latência, média para taxa de erro"""
+        if not values:
+            return None
         if optimization_type == 'high_latency':
-            self._optimize_latency(bottleneck)
-        elif optimization_type == 'high_error_rate':
-            self._optimize_error_rate(bottleneck)
-    
-    def _optimize_latency(self, bottleneck: Dict):
-        """Otimiza latência"""
-        # Implementa cache de respostas
-        # Otimiza queries
-        # Implementa processamento paralelo
-        pass
-    
-    def _optimize_error_rate(self, bottleneck: Dict):
-        """Otimiza taxa de erro"""
-        # Implementa lógica de retry
-        # Configura modelos de fallback
-        # Melhora tratamento de erros
-        pass
-    
-    def _record_optimization_attempt(self, opt_type: str, bottleneck: Dict):
+            sketch = QuantileSketch()
+            sketch.update(values)
+            return sketch.quantile(0.95)
+        return sum(values) / len(values)
+    
+    def _evaluate_trial(self, now: float):
+        """Fecha a tentativa ao fim da janela: mantém se melhorou, desfaz se não"""
+        trial = self.active_trial
+        elapsed = now - trial['started']
+        if elapsed < self.evaluation_window:
+            return
+        
+        after_values = self._window_values(trial['metric'], trial['started'])
+        if len(after_values) < self.min_samples and elapsed < 3 * self.evaluation_window:
+            return  # Pouco tráfego: estende a janela
+        after = self._summarize(trial['type'], after_values)
+        
+        # A melhora precisa ser grande o bastante e estatisticamente significativa;
+        # sem distribuição do "antes" (só o valor do gargalo), vale apenas a melhora
+        before_values = trial.get('before_values', [])
+        p_value = None
+        if before_values and after_values:
+            p_value = mann_whitney_u(before_values, after_values)['p_value']
+        improved = after is not None and after <= trial['before'] * (1 - self.min_improvement)
+        success = improved and (p_value is None or p_value < self.significance)
+        if not success:
+            # Desfaz a mudança que não ajudou
+            self.switches.set(trial['action'], trial['previous'])
+            self._failed_actions[(trial['action'], trial['metric'])] = now
+        
+        print(f"Otimização {trial['action']} em {trial['metric']}: "
+              f"{trial['before']:.3f} -> {after if after is not None else float('nan'):.3f} "
+              f"({'mantida' if success else 'desfeita'}"
+              f"{f', p = {p_value:.3f}' if p_value is not None else ''})")
+        self._record_optimization_result(trial['id'], after, success, p_value=p_value,
+                                         before_samples=len(before_values), after_samples=len(after_values))
+        self._cooldown_until[(trial['type'], trial['metric'])] = now + self.cooldown
+        self.active_trial = None
+    
+    def _record_optimization_attempt(self, opt_type: str, bottleneck: Dict, action: Optional[str] = None) -> int:
         """Registra tentativa de otimização"""
         conn = sqlite3.connect(self.monitor.db_path)
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO optimization_history 
-            (optimization_type, description, before_value) 
-            VALUES (?, ?, ?)
+            (optimization_type, description, before_value, action, metric_name) 
+            VALUES (?, ?, ?, ?, ?)
         """, (
             opt_type,
-            f"Otimização automática para {bottleneck['metric']}",
-            bottleneck['average_value']
+            f"Otimização automática para {bottleneck['metric']}" + (f" ({action})" if action else ""),
+            bottleneck.get('value', bottleneck['average_value']),
+            action,
+            bottleneck['metric']
         ))
+        history_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return history_id
+    
+    def _record_optimization_result(self, history_id: int, after_value: Optional[float], success: bool,
+                                    rolled_back: Optional[bool] = None, p_value: Optional[float] = None,
+                                    before_samples: Optional[int] = None, after_samples: Optional[int] = None):
+        """Completa o registro com o valor medido após a mudança e o resultado do teste"""
+        if rolled_back is None:
+            rolled_back = not success
+        conn = sqlite3.connect(self.monitor.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE optimization_history
+            SET after_value = ?, success = ?, rolled_back = ?, evaluated_at = ?,
+                p_value = ?, before_samples = ?, after_samples = ?
+            WHERE id = ?
+        """, (after_value, success, rolled_back, datetime.now(),
+              p_value, before_samples, after_samples, history_id))
         conn.commit()
         conn.close()
     
@@ -235,11 +832,25 @@ class AutoOptimizer:
         
         # Últimas otimizações
         cursor.execute("""
-            SELECT * FROM optimization_history 
-            ORDER BY timestamp DESC LIMIT 10
+            SELECT timestamp, optimization_type, description, before_value, after_value, success, rolled_back,
+                   p_value, before_samples, after_samples
+            FROM optimization_history 
+            ORDER BY timestamp DESC, id DESC LIMIT 10
         """)
         recent_optimizations = cursor.fetchall()
         
+        # Eficácia de cada ação nas tentativas já avaliadas
+        cursor.execute("""
+            SELECT action, metric_name, COUNT(*), SUM(success),
+                   AVG(CASE WHEN success AND before_value > 0
+                            THEN (before_value - after_value) / before_value END)
+            FROM optimization_history
+            WHERE after_value IS NOT NULL AND optimization_type != 'profiling'
+            GROUP BY action, metric_name
+            ORDER BY SUM(success) * 1.0 / COUNT(*) DESC, COUNT(*) DESC
+        """)
+        effectiveness = cursor.fetchall()
+        
         # Métricas atuais
         bottlenecks = self.monitor.identify_bottlenecks()
         
@@ -252,56 +863,99 @@ class AutoOptimizer:
         if bottlenecks:
             for bottleneck in bottlenecks:
                 report += f"- **{bottleneck['type']}** em {bottleneck['metric']}: "
-                report += f"{bottleneck['average_value']:.2f} (Severidade: {bottleneck['severity']})\n"
+                if 'z_score' in bottleneck:
+                    report += f"recente = {bottleneck['value']:.2f}, base = {bottleneck['baseline']:.2f} "
+                    report += f"(z = {bottleneck['z_score']:.1f}, {bottleneck['detection']}) "
+                else:
+                    report += f"{bottleneck.get('percentile', 'média')} = {bottleneck['value']:.2f} "
+                report += f"(Severidade: {bottleneck['severity']})\n"
         else:
             report += "Nenhum gargalo crítico identificado.\n"
         
+        report += "\n## Chaves Ativas\n"
+        active = [name for name, enabled in self.switches.snapshot().items() if enabled]
+        report += (", ".join(active) if active else "Nenhuma") + "\n"
+        if self.active_trial:
+            report += f"Em avaliação: {self.active_trial['action']} ({self.active_trial['metric']})\n"
+        
         report += "\n## Otimizações Recentes\n"
         if recent_optimizations:
-            for opt in recent_optimizations:
-                report += f"- **{opt[2]}**: {opt[3]} ({opt[1]})\n"
+            for (timestamp, opt_type, description, before, after, success, rolled_back,
+                 p_value, before_samples, after_samples) in recent_optimizations:
+                report += f"- **{opt_type}**: {description} ({timestamp})"
+                if after is not None:
+                    outcome = 'mantida' if success else ('desfeita' if rolled_back else 'sem efeito')
+                    report += f" — {before:.2f} → {after:.2f}, {outcome}"
+                    if p_value is not None:
+                        report += f" (p = {p_value:.3f}, n = {before_samples}/{after_samples})"
+                report += "\n"
         else:
             report += "Nenhuma otimização recente.\n"
         
+        report += "\n## Eficácia por Ação\n"
+        if effectiveness:
+            for action, metric_name, attempts, kept, gain in effectiveness:
+                report += f"- **{action}** em {metric_name}: {kept or 0}/{attempts} mantidas"
+                if gain is not None:
+                    report += f", melhora média de {gain:.0%}"
+                report += "\n"
+        else:
+            report += "Nenhuma otimização avaliada ainda.\n"
+        
         return report
 
 class WorkflowOptimizer:
     """Otimizador específico para workflows do n8n"""
     
-    def __init__(self, n8n_url: str = "http://localhost:5678/api/v1"):
+    def __init__(self, n8n_url: str = "http://localhost:5678/api/v1", db_path: str = "queen_performance.db",
+                 api_key: Optional[str] = None, sample_size: int = 500,
+                 ingestor: Optional[ExecutionIngestor] = None):
         self.n8n_url = n8n_url
+        self.sample_size = sample_size
+        # As execuções vêm da tabela local, atualizada de forma incremental
+        self.ingestor = ingestor or ExecutionIngestor(n8n_url, db_path, api_key)
     
     def analyze_workflow_performance(self, workflow_id: str) -> Dict:
         """Analisa performance de um workflow específico"""
         try:
-            # Obtém dados de execução do workflow
-            response = requests.get(f"{self.n8n_url}/executions", params={
-                'workflowId': workflow_id,
-                'limit': 50
-            })
-            
-            if response.status_code == 200:
-                executions = response.json()
-                return self._calculate_workflow_metrics(executions)
-            
-        except Exception as e:
-            print(f"Erro ao analisar workflow {workflow_id}: {e}")
+            self.ingestor.ingest_workflow(workflow_id)
+        except (requests.RequestException, ValueError, KeyError, sqlite3.Error) as e:
+            # Sem o n8n, analisa o que já foi ingerido
+            print(f"n8n indisponível para o workflow {workflow_id}, usando execuções já ingeridas: {e}")
         
-        return {}
+        return self._workflow_metrics(workflow_id)
+    
+    def analyze_all_workflows(self, workflow_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Ingere todos os workflows em paralelo e calcula as métricas de cada um"""
+        ingested = self.ingestor.ingest_all(workflow_ids)
+        return {workflow_id: self._workflow_metrics(workflow_id) for workflow_id in ingested}
+    
+    def _workflow_metrics(self, workflow_id: str) -> Dict:
+        """Métricas das execuções ingeridas mais o perfil por nó"""
+        metrics = self._calculate_workflow_metrics(self.ingestor.executions(workflow_id, self.sample_size))
+        if metrics:
+            metrics.update(profile_workflow(self.ingestor.node_runs(workflow_id, self.sample_size),
+                                            self.ingestor.workflow_definition(workflow_id)))
+        return metrics
     
     def _calculate_workflow_metrics(self, executions: List[Dict]) -> Dict:
-        """Calcula métricas de performance do workflow"""
+        """Calcula métricas de performance do workflow
+        
+        Execuções ainda em andamento entram no total, mas não nas médias e
+        taxas: não têm duração nem resultado.
+        """
         if not executions:
             return {}
         
         total_time = 0
         success_count = 0
         error_count = 0
+        finished_count = 0
         
         for execution in executions:
             if execution.get('finished'):
-                duration = execution.get('duration', 0)
-                total_time += duration
+                finished_count += 1
+                total_time += execution.get('duration') or 0
                 
                 if execution.get('status') == 'success':
                     success_count += 1
@@ -309,29 +963,53 @@ class WorkflowOptimizer:
                     error_count += 1
         
         total_executions = len(executions)
-        avg_duration = total_time / total_executions if total_executions > 0 else 0
-        success_rate = success_count / total_executions if total_executions > 0 else 0
+        avg_duration = total_time / finished_count if finished_count > 0 else 0
+        success_rate = success_count / finished_count if finished_count > 0 else 0
         
         return {
             'total_executions': total_executions,
+            'finished_executions': finished_count,
             'average_duration': avg_duration,
             'success_rate': success_rate,
-            'error_rate': error_count / total_executions if total_executions > 0 else 0
+            'error_rate': error_count / finished_count if finished_count > 0 else 0
         }
     
     def suggest_optimizations(self, workflow_metrics: Dict) -> List[str]:
-        """Sugere otimizações baseadas nas métricas"""
+        """Sugere otimizações baseadas nas métricas
+        
+        Com o perfil por nó, as sugestões apontam os nós do caminho crítico
+        e os que mais falham; sem ele, ficam as recomendações gerais.
+        """
         suggestions = []
         
-        if workflow_metrics.get('average_duration', 0) > 30:  # > 30 segundos
-            suggestions.append("Considere paralelizar operações independentes")
-            suggestions.append("Implemente cache para operações repetitivas")
+        for bottleneck in workflow_metrics.get('bottlenecks', []):
+            node, node_type = bottleneck['node'], bottleneck['type'].lower()
+            prefix = (f"O nó '{node}' responde por {bottleneck['share']:.0%} do caminho crítico "
+                      f"(p95 {bottleneck['p95']:.1f}s)")
+            if 'httprequest' in node_type or 'webhook' in node_type:
+                suggestions.append(f"{prefix}: defina timeout, use cache ou agrupe as chamadas em lote")
+            elif 'code' in node_type or 'function' in node_type:
+                suggestions.append(f"{prefix}: otimize o código do nó ou mova o processamento pesado para fora")
+            elif 'splitinbatches' in node_type or 'loop' in node_type:
+                suggestions.append(f"{prefix}: aumente o tamanho do lote para reduzir as voltas do laço")
+            else:
+                suggestions.append(f"{prefix}: paralelize os ramos independentes que o antecedem")
         
-        if workflow_metrics.get('error_rate', 0) > 0.1:  # > 10% de erro
-            suggestions.append("Adicione tratamento de erro mais robusto")
-            suggestions.append("Implemente retry automático para operações falháveis")
+        for node in workflow_metrics.get('nodes', []):
+            if node['error_rate'] > 0.1:
+                suggestions.append(f"O nó '{node['node']}' falha em {node['error_rate']:.0%} das execuções: "
+                                   "ative 'Retry On Fail' ou trate o erro no próprio nó")
+        
+        if not workflow_metrics.get('nodes'):
+            if workflow_metrics.get('average_duration', 0) > 30:  # > 30 segundos
+                suggestions.append("Considere paralelizar operações independentes")
+                suggestions.append("Implemente cache para operações repetitivas")
+            
+            if workflow_metrics.get('error_rate', 0) > 0.1:  # > 10% de erro
+                suggestions.append("Adicione tratamento de erro mais robusto")
+                suggestions.append("Implemente retry automático para operações falháveis")
         
-        if workflow_metrics.get('success_rate', 1) < 0.9:  # < 90% de sucesso
+        if workflow_metrics.get('finished_executions', 1) and workflow_metrics.get('success_rate', 1) < 0.9:
             suggestions.append("Revise a lógica de validação de dados")
             suggestions.append("Adicione logs detalhados para debug")
         
@@ -0,0 +1,365 @@
+# modules/capacity_report.py
+"""
+Planejamento de Capacidade do Cérebro Digital da Queen
+Relatório offline de chegadas, tempos de serviço e fila projetada (M/G/c) a partir dos bancos
+"""
+
+import math
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from modules.db_migrations import DEFAULT_DATABASES
+from modules.metric_rollup import RAW_RETENTION, rollup_table
+from modules.metric_sketch import QuantileSketch
+
+def erlang_c(servers: int, offered_load: float) -> float:
+    """Probabilidade de espera em uma fila M/M/c (fórmula de Erlang C)"""
+    if offered_load <= 0:
+        return 0.0
+    if offered_load >= servers:
+        return 1.0
+
+    # Soma de a^k/k! de forma incremental (evita fatoriais grandes)
+    term, total = 1.0, 1.0
+    for k in range(1, servers):
+        term *= offered_load / k
+        total += term
+    last = term * offered_load / servers / (1 - offered_load / servers)
+    return last / (total + last)
+
+def mgc_wait(arrival_rate: float, mean_service: float, service_cv2: float, servers: int) -> Dict[str, float]:
+    """Espera média em fila M/G/c pela aproximação de Allen-Cunneen
+
+    Wq(M/G/c) ≈ Wq(M/M/c) * (1 + Cs²) / 2, com chegadas de Poisson (Ca² = 1).
+    """
+    offered_load = arrival_rate * mean_service
+    utilisation = offered_load / servers
+    if utilisation >= 1:
+        return {"utilisation": utilisation, "p_wait": 1.0, "wait": math.inf, "response": math.inf}
+
+    p_wait = erlang_c(servers, offered_load)
+    wait = p_wait * mean_service / (servers * (1 - utilisation)) * (1 + service_cv2) / 2
+    return {"utilisation": utilisation, "p_wait": p_wait, "wait": wait, "response": wait + mean_service}
+
+def _parse_context(context: Optional[str]) -> Dict[str, str]:
+    """Lê 'model=X task=Y' do contexto das métricas do Ollama"""
+    fields = {}
+    for part in (context or "").split():
+        key, _, value = part.partition("=")
+        if value:
+            fields[key] = value
+    return fields
+
+def _markdown_table(frame: pd.DataFrame, float_format: str = "{:.3g}") -> str:
+    """Tabela Markdown sem depender do tabulate"""
+    if frame.empty:
+        return "_Sem dados._\n"
+
+    def cell(value):
+        if isinstance(value, float):
+            return "∞" if math.isinf(value) else ("" if math.isnan(value) else float_format.format(value))
+        return str(value)
+
+    header = "| " + " | ".join(str(c) for c in frame.columns) + " |"
+    divider = "|" + "|".join("---" for _ in frame.columns) + "|"
+    rows = ["| " + " | ".join(cell(v) for v in row) + " |" for row in frame.itertuples(index=False)]
+    return "\n".join([header, divider] + rows) + "\n"
+
+class CapacityPlanner:
+    """Calcula taxas de chegada, tempos de serviço, utilização e fila projetada
+
+    Cada recurso é uma fila: o servidor Ollama (todos os modelos dividem a
+    mesma máquina, com `ollama_servers` requisições em paralelo) e cada agente
+    (uma tarefa por vez). A projeção usa a taxa da hora de pico (p95).
+
+    As linhas brutas de performance_metrics só são mantidas por RAW_RETENTION;
+    para o Ollama, chegadas por hora e tempos de serviço vêm do rollup horário,
+    que cobre o período inteiro, e as linhas brutas servem apenas ao
+    detalhamento por modelo/tarefa.
+    """
+
+    def __init__(self, databases: Optional[Dict[str, str]] = None, days: int = 28,
+                 ollama_servers: int = 1, multipliers: Sequence[float] = (1, 2, 4, 8),
+                 max_wait: float = 2.0, now: Optional[datetime] = None):
+        self.databases = dict(DEFAULT_DATABASES, **(databases or {}))
+        self.days = days
+        self.ollama_servers = ollama_servers
+        self.multipliers = list(multipliers)
+        self.max_wait = max_wait
+        self.now = now or datetime.utcnow()
+        self.arrivals = pd.DataFrame(columns=["resource", "timestamp"])
+        self.services = pd.DataFrame(columns=["resource", "task", "service_time"])
+        # Recursos lidos do rollup: chegadas por hora e distribuição agregada do serviço
+        self.hourly: Dict[str, pd.Series] = {}
+        self.service_sketches: Dict[str, QuantileSketch] = {}
+        self.raw_days = min(self.days, RAW_RETENTION / 86400)
+
+    def _query(self, database: str, sql: str, params=()) -> pd.DataFrame:
+        conn = sqlite3.connect(self.databases[database])
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        except (sqlite3.Error, pd.errors.DatabaseError) as e:
+            print(f"Erro ao ler {database}: {e}")
+            return pd.DataFrame()
+        finally:
+            conn.close()
+
+    def load(self) -> 'CapacityPlanner':
+        """Lê as chegadas e os tempos de serviço dos últimos `days` dias"""
+        since = (self.now - pd.Timedelta(days=self.days)).strftime('%Y-%m-%d %H:%M:%S')
+        arrivals, services = [], []
+
+        # Ollama: cada ollama_total_time é uma requisição atendida pelo servidor;
+        # sem os tempos do servidor, usa a latência vista pelo cliente
+        candidates = [("ollama_total_time", None), ("response_time", "task=chat")]
+        from_rollup = next(([c] for c in candidates if self._load_rollup("ollama", c[0])), [])
+
+        raw_since = (self.now - pd.Timedelta(days=self.raw_days)).strftime('%Y-%m-%d %H:%M:%S')
+        ollama = pd.DataFrame()
+        for metric, fallback_context in from_rollup or candidates:
+            ollama = self._query("performance", """
+                SELECT timestamp, metric_value, COALESCE(?, context) AS context FROM performance_metrics
+                WHERE metric_name = ? AND timestamp >= ?
+            """, (fallback_context, metric, raw_since))
+            if not ollama.empty:
+                break
+        if not ollama.empty:
+            fields = ollama["context"].map(_parse_context)
+            ollama["task"] = fields.map(lambda f: f"{f.get('model', '?')}/{f.get('task', '?')}")
+            if "ollama" not in self.hourly:
+                arrivals.append(pd.DataFrame({"resource": "ollama", "timestamp": ollama["timestamp"]}))
+            services.append(pd.DataFrame({"resource": "ollama", "task": ollama["task"],
+                                          "service_time": ollama["metric_value"]}))
+
+        # Conversas: chegadas vistas pelo usuário (sem tempo de serviço próprio)
+        chat = self._query("memory", "SELECT timestamp FROM conversations WHERE timestamp >= ?", (since,))
+        if not chat.empty:
+            arrivals.append(pd.DataFrame({"resource": "chat", "timestamp": chat["timestamp"]}))
+
+        # Agentes: chegadas de agent_tasks e tempos de agent_performance
+        tasks = self._query("agents", "SELECT agent_id, created_at FROM agent_tasks WHERE created_at >= ?",
+                            (since,))
+        if not tasks.empty:
+            arrivals.append(pd.DataFrame({"resource": "agent:" + tasks["agent_id"],
+                                          "timestamp": tasks["created_at"]}))
+        performance = self._query("agents", """
+            SELECT agent_id, task_type, execution_time FROM agent_performance
+            WHERE timestamp >= ? AND execution_time > 0
+        """, (since,))
+        if not performance.empty:
+            services.append(pd.DataFrame({"resource": "agent:" + performance["agent_id"],
+                                          "task": performance["task_type"],
+                                          "service_time": performance["execution_time"]}))
+
+        if arrivals:
+            self.arrivals = pd.concat(arrivals, ignore_index=True)
+            # Todos os bancos gravam UTC como 'AAAA-MM-DD HH:MM:SS[.ffffff]'
+            self.arrivals["timestamp"] = pd.to_datetime(
+                self.arrivals["timestamp"].astype(str).str.slice(0, 19), format='%Y-%m-%d %H:%M:%S', errors="coerce"
+            )
+            self.arrivals = self.arrivals.dropna(subset=["timestamp"])
+        if services:
+            self.services = pd.concat(services, ignore_index=True)
+        return self
+
+    def _load_rollup(self, resource: str, metric: str) -> bool:
+        """Lê do rollup horário as chegadas e o tempo de serviço de um recurso"""
+        since = int((self.now - datetime(1970, 1, 1)).total_seconds()) - self.days * 86400
+        rows = self._query("performance", f"""
+            SELECT bucket_start, count, sketch FROM {rollup_table('1h')}
+            WHERE metric_name = ? AND bucket_start >= ? AND count > 0
+            ORDER BY bucket_start
+        """, (metric, since))
+        if rows.empty:
+            return False
+
+        counts = pd.Series(rows["count"].astype(float).values,
+                           index=pd.to_datetime(rows["bucket_start"], unit="s"))
+        hours = pd.date_range(counts.index.min(), counts.index.max(), freq="h")
+        self.hourly[resource] = counts.reindex(hours, fill_value=0.0)
+
+        sketch = QuantileSketch()
+        for blob in rows["sketch"]:
+            if blob:
+                sketch.merge(QuantileSketch.from_bytes(blob))
+        if sketch.count:
+            self.service_sketches[resource] = sketch
+        return True
+
+    def _resources(self) -> List[str]:
+        return sorted(set(self.arrivals["resource"].unique()) | set(self.hourly))
+
+    def _service_stats(self, resource: str):
+        """(nº de amostras, média, cv²) do tempo de serviço; None sem dados"""
+        sketch = self.service_sketches.get(resource)
+        if sketch is not None:
+            mean = sketch.mean
+            return sketch.count, mean, sketch.variance / mean ** 2 if mean else 0.0
+        times = self.services.loc[self.services["resource"] == resource, "service_time"]
+        if times.empty:
+            return None
+        mean = times.mean()
+        return len(times), mean, times.var(ddof=0) / mean ** 2 if mean else 0.0
+
+    def hourly_counts(self, resource: str) -> pd.Series:
+        """Chegadas por hora, com as horas sem tráfego contadas como zero"""
+        if resource in self.hourly:
+            return self.hourly[resource]
+        times = self.arrivals.loc[self.arrivals["resource"] == resource, "timestamp"]
+        if times.empty:
+            return pd.Series(dtype=float)
+        counts = times.dt.floor("h").value_counts()
+        hours = pd.date_range(counts.index.min(), counts.index.max(), freq="h")
+        return counts.reindex(hours, fill_value=0).astype(float)
+
+    def arrival_rates(self) -> pd.DataFrame:
+        """Distribuição das chegadas por hora de cada recurso"""
+        rows = []
+        for resource in self._resources():
+            counts = self.hourly_counts(resource)
+            by_hour = counts.groupby(counts.index.hour).mean()
+            rows.append({
+                "recurso": resource,
+                "horas": len(counts),
+                "total": int(counts.sum()),
+                "média/h": counts.mean(),
+                "p50/h": counts.quantile(0.5),
+                "p95/h": counts.quantile(0.95),
+                "máx/h": counts.max(),
+                "hora de pico (UTC)": int(by_hour.idxmax())
+            })
+        return pd.DataFrame(rows)
+
+    def service_times(self) -> pd.DataFrame:
+        """Distribuição do tempo de serviço por recurso e tipo de tarefa/modelo"""
+        if self.services.empty and not self.service_sketches:
+            return pd.DataFrame()
+        grouped = self.services.groupby(["resource", "task"])["service_time"]
+        frame = grouped.agg(
+            amostras="count", média="mean",
+            p50=lambda s: s.quantile(0.5), p95=lambda s: s.quantile(0.95), máx="max"
+        ).reset_index()
+        frame["cv²"] = grouped.var(ddof=0).values / np.square(frame["média"].values)
+
+        # Distribuição agregada do período inteiro, do rollup
+        totals = [
+            {"resource": resource, "task": "(todas)", "amostras": sketch.count, "média": sketch.mean,
+             "p50": sketch.quantile(0.5), "p95": sketch.quantile(0.95), "máx": sketch.max,
+             "cv²": sketch.variance / sketch.mean ** 2 if sketch.mean else 0.0}
+            for resource, sketch in sorted(self.service_sketches.items())
+        ]
+        if totals:
+            frame = pd.concat([pd.DataFrame(totals), frame], ignore_index=True)
+        return frame.rename(columns={"resource": "recurso", "task": "tarefa"})
+
+    def _servers(self, resource: str) -> int:
+        return self.ollama_servers if resource == "ollama" else 1
+
+    def utilisation(self) -> pd.DataFrame:
+        """Utilização atual (média e no pico) de cada recurso com tempos de serviço"""
+        rows = []
+        for resource in sorted(set(self.services["resource"].unique()) | set(self.service_sketches)):
+            counts = self.hourly_counts(resource)
+            stats = self._service_stats(resource)
+            if counts.empty or stats is None:
+                continue
+            _, mean_service, cv2 = stats
+            servers = self._servers(resource)
+            rows.append({
+                "recurso": resource,
+                "servidores": servers,
+                "serviço médio (s)": mean_service,
+                "cv²": cv2,
+                "utilização média": counts.mean() / 3600 * mean_service / servers,
+                "utilização no pico": counts.quantile(0.95) / 3600 * mean_service / servers
+            })
+        return pd.DataFrame(rows)
+
+    def projection(self) -> pd.DataFrame:
+        """Fila projetada na hora de pico para cada múltiplo da carga atual"""
+        rows = []
+        for current in self.utilisation().to_dict("records"):
+            resource = current["recurso"]
+            peak_rate = self.hourly_counts(resource).quantile(0.95) / 3600
+            for servers in (current["servidores"], current["servidores"] + 1):
+                for multiplier in self.multipliers:
+                    result = mgc_wait(peak_rate * multiplier, current["serviço médio (s)"],
+                                      current["cv²"], servers)
+                    rows.append({
+                        "recurso": resource,
+                        "carga": f"{multiplier:g}x",
+                        "servidores": servers,
+                        "utilização": result["utilisation"],
+                        "P(espera)": result["p_wait"],
+                        "espera (s)": result["wait"],
+                        "resposta (s)": result["response"]
+                    })
+        return pd.DataFrame(rows)
+
+    def recommendations(self, projection: Optional[pd.DataFrame] = None) -> List[str]:
+        """Em que múltiplo da carga cada recurso passa da espera máxima"""
+        projection = self.projection() if projection is None else projection
+        notes = []
+        if projection.empty:
+            return notes
+        for resource, rows in projection.groupby("recurso", sort=True):
+            current = rows[rows["servidores"] == rows["servidores"].min()]
+            saturated = current[current["espera (s)"] > self.max_wait]
+            if saturated.empty:
+                notes.append(f"{resource}: espera no pico abaixo de {self.max_wait:g}s até "
+                             f"{self.multipliers[-1]:g}x a carga atual.")
+                continue
+            load = saturated.iloc[0]["carga"]
+            if resource == "ollama":
+                notes.append(f"ollama: a partir de {load} a carga atual a espera no pico passa de "
+                             f"{self.max_wait:g}s; uma segunda máquina Ollama (ou mais paralelismo) "
+                             f"será necessária.")
+            else:
+                notes.append(f"{resource}: espera no pico passa de {self.max_wait:g}s a partir de {load}; "
+                             f"considere outra instância do agente.")
+        return notes
+
+    def _sections(self) -> tuple:
+        projection = self.projection()
+        return [
+            ("Chegadas por hora", self.arrival_rates()),
+            ("Tempos de serviço (s)", self.service_times()),
+            ("Utilização atual", self.utilisation()),
+            ("Fila projetada na hora de pico (M/G/c)", projection)
+        ], self.recommendations(projection)
+
+    def _header(self) -> str:
+        header = (f"Período: últimos {self.days} dias até {self.now:%Y-%m-%d %H:%M} UTC. "
+                  f"Espera máxima aceitável: {self.max_wait:g}s.")
+        if self.raw_days < self.days:
+            header += (f" Tempos do Ollama por modelo/tarefa cobrem só os últimos {self.raw_days:g} dias "
+                       f"(retenção das métricas brutas)")
+            header += "; os totais vêm do rollup horário." if self.hourly else "."
+        return header
+
+    def to_markdown(self) -> str:
+        """Relatório completo em Markdown"""
+        sections, notes = self._sections()
+        report = "# Relatório de Capacidade\n\n" + self._header() + "\n\n"
+        report += "## Recomendações\n" + "".join(f"- {note}\n" for note in notes or ["Sem dados suficientes."])
+        for title, frame in sections:
+            report += f"\n## {title}\n\n" + _markdown_table(frame)
+        return report
+
+    def to_html(self) -> str:
+        """Relatório completo em HTML"""
+        sections, notes = self._sections()
+        html = ["<html><head><meta charset=\"utf-8\"><title>Relatório de Capacidade</title></head><body>",
+                "<h1>Relatório de Capacidade</h1>", f"<p>{self._header()}</p>", "<h2>Recomendações</h2><ul>"]
+        html += [f"<li>{note}</li>" for note in notes or ["Sem dados suficientes."]]
+        html.append("</ul>")
+        for title, frame in sections:
+            html.append(f"<h2>{title}</h2>")
+            html.append(frame.to_html(index=False, float_format="{:.3g}".format, na_rep="")
+                        if not frame.empty else "<p><em>Sem dados.</em></p>")
+        html.append("</body></html>")
+        return "\n".join(html)
@@ -0,0 +1,211 @@
+# modules/conversation_summarizer.py
+"""
+Módulo de Resumos de Conversa do Cérebro Digital da Queen
+Mantém um resumo incremental por sessão para limitar o tamanho dos prompts
+"""
+
+import time
+import queue
+import sqlite3
+import requests
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from modules.db_migrations import migrate_database
+
+class ConversationSummarizer:
+    """Mantém resumos incrementais das sessões usando um modelo pequeno"""
+
+    def __init__(self, db_path: str = 'queen_memory.db',
+                 ollama_url: str = "http://localhost:11434/api/generate",
+                 model: str = "phi-3:mini", max_summary_chars: int = 1200,
+                 timing_recorder=None):
+        self.db_path = db_path
+        self.timing_recorder = timing_recorder
+        self.ollama_url = ollama_url
+        self.model = model
+        self.max_summary_chars = max_summary_chars
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker = None
+        self._init_db()
+
+    def _init_db(self):
+        """Garante a tabela de resumos de sessão"""
+        migrate_database(self.db_path, "memory")
+
+    def get_summary(self, session_id: str) -> Optional[str]:
+        """Retorna o resumo atual da sessão, se houver"""
+        if not session_id:
+            return None
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT summary FROM session_summaries WHERE session_id = ?",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+        conn.close()
+
+        return row[0] if row and row[0] else None
+
+    def get_context(self, session_id: str, max_turns: int = 5) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+        """Retorna o resumo e os turnos mais novos que ele ainda não cobre
+
+        O resumo é atualizado em segundo plano; os turnos gravados depois do
+        último resumo precisam entrar brutos no prompt.
+        """
+        if not session_id:
+            return None, []
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT summary, last_conversation_id FROM session_summaries WHERE session_id = ?",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+        summary, last_id = (row[0] or None, row[1] or 0) if row else (None, 0)
+
+        cursor.execute("""
+            SELECT user_input, ai_response FROM conversations
+            WHERE session_id = ? AND id > ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (session_id, last_id, max_turns))
+        turns = cursor.fetchall()
+        conn.close()
+
+        return summary, list(reversed(turns))
+
+    @property
+    def queue_depth(self) -> int:
+        """Sessões aguardando atualização do resumo"""
+        return self._queue.qsize()
+
+    def schedule_update(self, session_id: str):
+        """Agenda a atualização do resumo em segundo plano"""
+        if not session_id:
+            return
+
+        with self._pending_lock:
+            # Várias mensagens da mesma sessão geram uma única atualização
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+
+        self._ensure_worker()
+        self._queue.put(session_id)
+
+    def _ensure_worker(self):
+        """Inicia a thread de resumos sob demanda"""
+        if self._worker and self._worker.is_alive():
+            return
+
+        self._worker = threading.Thread(target=self._worker_loop)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _worker_loop(self):
+        """Processa as sessões agendadas"""
+        while True:
+            session_id = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(session_id)
+
+            try:
+                self.update_summary(session_id)
+            except Exception as e:
+                print(f"Erro ao resumir sessão {session_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def update_summary(self, session_id: str) -> Optional[str]:
+        """Incorpora ao resumo os turnos ainda não resumidos da sessão"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT summary, turns_summarized, last_conversation_id
+            FROM session_summaries WHERE session_id = ?
+        """, (session_id,))
+        row = cursor.fetchone()
+        summary, turns_summarized, last_id = row if row else (None, 0, 0)
+
+        cursor.execute("""
+            SELECT id, user_input, ai_response
+            FROM conversations
+            WHERE session_id = ? AND id > ?
+            ORDER BY id
+        """, (session_id, last_id))
+        new_turns = cursor.fetchall()
+        conn.close()
+
+        if not new_turns:
+            return summary
+
+        new_summary = self._generate_summary(summary, [(t[1], t[2]) for t in new_turns])
+        if not new_summary:
+            return summary
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO session_summaries
+            (session_id, summary, turns_summarized, last_conversation_id, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                summary = excluded.summary,
+                turns_summarized = excluded.turns_summarized,
+                last_conversation_id = excluded.last_conversation_id,
+                updated_at = excluded.updated_at
+        """, (session_id, new_summary, turns_summarized + len(new_turns),
+              new_turns[-1][0], datetime.now()))
+        conn.commit()
+        conn.close()
+
+        return new_summary
+
+    def _generate_summary(self, previous_summary: Optional[str],
+                          turns: List[Tuple[str, str]]) -> Optional[str]:
+        """Gera o novo resumo com o modelo pequeno"""
+        transcript = ""
+        for user_input, ai_response in turns:
+            transcript += f"Usuário: {user_input}\nAssistente: {ai_response}\n\n"
+
+        summary_prompt = (
+            "Atualize o resumo da conversa incorporando os novos turnos. "
+            "Mantenha fatos, preferências e decisões importantes, em no máximo "
+            f"{self.max_summary_chars} caracteres.\n\n"
+            f"Resumo atual:\n{previous_summary or '(vazio)'}\n\n"
+            f"Novos turnos:\n{transcript}"
+            "Novo resumo:"
+        )
+
+        try:
+            request_start = time.perf_counter()
+            response = requests.post(self.ollama_url, json={
+                "model": self.model,
+                "prompt": summary_prompt,
+                "stream": False,
+                "options": {
+                    "temperature": 0.2,
+                    "num_predict": 300
+                }
+            }, timeout=60)
+            response.raise_for_status()
+            data = response.json()
+
+            if self.timing_recorder is not None:
+                self.timing_recorder.record(data, time.perf_counter() - request_start,
+                                            self.model, "summary")
+
+            summary = data.get("response", "").strip()
+            return summary[:self.max_summary_chars] if summary else None
+
+        except Exception as e:
+            print(f"Erro ao gerar resumo: {e}")
+            return None
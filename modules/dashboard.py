@@ -0,0 +1,170 @@
+# modules/dashboard.py
+"""
+Painel de Performance do Cérebro Digital da Queen
+Gráficos ao vivo alimentados pelos rollups de 1 minuto, renderizados fora da thread da interface
+"""
+
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import DateFormatter, date2num
+
+from modules.metric_sketch import QuantileSketch
+from modules.metric_rollup import rollup_table
+
+# (título do painel, [(rótulo, métrica, estatística)])
+# Estatísticas: p50/p95/p99 do sketch, count por minuto, mean e max do balde
+DASHBOARD_PANELS: List[Tuple[str, List[Tuple[str, str, str]]]] = [
+    ("Latência do chat (s)", [("p50", "response_time", "p50"),
+                              ("p95", "response_time", "p95"),
+                              ("p99", "response_time", "p99")]),
+    ("Vazão (req/min)", [("respostas", "response_time", "count")]),
+    ("Taxa de acerto do cache", [("acertos", "response_cache_hit", "mean")]),
+    ("Fila de agentes", [("tarefas", "agent_queue_depth", "max")])
+]
+
+_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+def _bucket_value(stat: str, count: int, total: float, maximum: float,
+                  blob: Optional[bytes]) -> Optional[float]:
+    """Valor de uma estatística a partir de uma linha de rollup"""
+    if stat == "count":
+        return float(count)
+    if stat == "mean":
+        return total / count if count else None
+    if stat == "max":
+        return maximum
+    if blob is None:
+        return None
+    return QuantileSketch.from_bytes(blob).quantile(_QUANTILES[stat])
+
+class DashboardFeed:
+    """Lê dos rollups de 1 minuto apenas os baldes novos desde a última leitura
+
+    O balde mais recente ainda pode receber amostras; por isso cada leitura
+    recomeça nele e o ponto correspondente é substituído, não duplicado.
+    """
+
+    def __init__(self, db_path: str, panels=DASHBOARD_PANELS, window_seconds: int = 3600):
+        self.db_path = db_path
+        self.panels = panels
+        self.window_seconds = window_seconds
+        self._watermarks: Dict[str, int] = {}
+
+    def poll(self, now: Optional[float] = None) -> Dict[str, List[Tuple[int, float]]]:
+        """Pontos (início do balde, valor) novos ou atualizados por métrica/estatística"""
+        now = now or time.time()
+        wanted: Dict[str, List[str]] = {}
+        for _, series in self.panels:
+            for _, metric, stat in series:
+                wanted.setdefault(metric, []).append(stat)
+
+        updates: Dict[str, List[Tuple[int, float]]] = {}
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            for metric, stats in wanted.items():
+                since = self._watermarks.get(metric, int(now - self.window_seconds))
+                cursor.execute(f"""
+                    SELECT bucket_start, count, sum, max, sketch FROM {rollup_table('1m')}
+                    WHERE metric_name = ? AND bucket_start >= ?
+                    ORDER BY bucket_start
+                """, (metric, since))
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+
+                self._watermarks[metric] = rows[-1][0]
+                for stat in stats:
+                    points = []
+                    for bucket, count, total, maximum, blob in rows:
+                        value = _bucket_value(stat, count, total, maximum, blob)
+                        if value is not None:
+                            points.append((bucket, value))
+                    if points:
+                        updates[f"{metric}:{stat}"] = points
+        except sqlite3.Error as e:
+            print(f"Erro ao ler rollups do painel: {e}")
+        finally:
+            conn.close()
+
+        return updates
+
+class DashboardRenderer:
+    """Mantém as linhas dos gráficos e acrescenta pontos a cada atualização
+
+    Usa uma Figure com canvas Agg (sem pyplot), segura para desenhar numa
+    thread que não é a da interface; a imagem sai como bytes RGBA.
+    """
+
+    def __init__(self, panels=DASHBOARD_PANELS, window_seconds: int = 3600,
+                 width: float = 8.0, height: float = 5.0, dpi: int = 100):
+        self.window_seconds = window_seconds
+        self.figure = Figure(figsize=(width, height), dpi=dpi, facecolor="#353535")
+        self.canvas = FigureCanvasAgg(self.figure)
+        self._series: Dict[str, Tuple[deque, deque, object]] = {}
+        self._axes = []
+
+        rows = (len(panels) + 1) // 2
+        for index, (title, series) in enumerate(panels):
+            ax = self.figure.add_subplot(rows, 2, index + 1)
+            ax.set_facecolor("#191919")
+            ax.set_title(title, color="white", fontsize=9)
+            ax.tick_params(colors="white", labelsize=7)
+            ax.xaxis.set_major_formatter(DateFormatter("%H:%M"))
+            ax.grid(True, color="#444444", linewidth=0.5)
+            for label, metric, stat in series:
+                line, = ax.plot([], [], label=label, linewidth=1.2)
+                self._series[f"{metric}:{stat}"] = (deque(), deque(), line)
+            if len(series) > 1:
+                ax.legend(fontsize=7, loc="upper left")
+            self._axes.append(ax)
+
+        self.figure.tight_layout()
+
+    def update(self, updates: Dict[str, List[Tuple[int, float]]], now: Optional[float] = None) -> bool:
+        """Acrescenta os pontos novos (substitui o último se for o mesmo balde); True se mudou"""
+        now = now or time.time()
+        cutoff = date2num(datetime.fromtimestamp(now - self.window_seconds))
+        changed = False
+
+        for key, points in updates.items():
+            if key not in self._series:
+                continue
+            xs, ys, line = self._series[key]
+            for bucket, value in points:
+                x = date2num(datetime.fromtimestamp(bucket))
+                if xs and x <= xs[-1]:
+                    if x == xs[-1]:
+                        ys[-1] = value
+                    continue
+                xs.append(x)
+                ys.append(value)
+
+            while xs and xs[0] < cutoff:
+                xs.popleft()
+                ys.popleft()
+
+            line.set_data(list(xs), list(ys))
+            changed = True
+
+        if changed:
+            for ax in self._axes:
+                ax.relim()
+                ax.autoscale_view()
+        return changed
+
+    def point_count(self, key: str) -> int:
+        """Quantos pontos a série tem no gráfico"""
+        return len(self._series[key][0]) if key in self._series else 0
+
+    def render(self) -> Tuple[bytes, int, int]:
+        """Rasteriza a figura: (bytes RGBA, largura, altura)"""
+        self.canvas.draw()
+        width, height = self.canvas.get_width_height()
+        return bytes(self.canvas.buffer_rgba()), width, height
@@ -0,0 +1,514 @@
+# modules/db_migrations.py
+"""
+Migrações de Esquema do Cérebro Digital da Queen
+Fonte única dos esquemas dos três bancos SQLite, com versionamento e índices
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Union
+
+from modules.metric_rollup import apply_rollups
+
+# Um passo é SQL idempotente ou uma função que recebe o cursor e
+# retorna a descrição da mudança feita (ou None se nada mudou)
+Step = Union[str, Callable[[sqlite3.Cursor], Optional[str]]]
+
+class Migration:
+    """Uma versão do esquema de um banco"""
+
+    def __init__(self, version: int, description: str, steps: List[Step]):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+def _object_exists(cursor: sqlite3.Cursor, name: str) -> bool:
+    """Verifica se tabela, índice ou gatilho já existe"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def create(name: str, sql: str) -> Step:
+    """Cria tabela, índice ou gatilho se ainda não existir"""
+    def step(cursor):
+        if _object_exists(cursor, name):
+            return None
+        cursor.execute(sql)
+        return f"criado {name}"
+    return step
+
+def add_column(table: str, column: str, declaration: str) -> Step:
+    """Adiciona coluna ausente em tabelas criadas por versões antigas"""
+    def step(cursor):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column in [row[1] for row in cursor.fetchall()]:
+            return None
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return f"adicionada coluna {table}.{column}"
+    return step
+
+def fts_index(table: str, source: str, columns: List[str]) -> Step:
+    """Cria índice FTS5 sincronizado por gatilhos com a tabela de origem"""
+    def step(cursor):
+        if _object_exists(cursor, table):
+            return None
+
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5({cols}, content='{source}', content_rowid='id')"
+            )
+        except sqlite3.OperationalError as e:
+            return f"FTS5 indisponível para {table}: {e}"
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN
+                INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN
+                INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON {source} BEGIN
+                INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """)
+
+        # Indexa as linhas já existentes
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        return f"criado índice FTS5 {table}"
+    return step
+
+def create_rollup(resolution: str) -> Step:
+    """Cria a tabela de rollup de uma resolução de métricas"""
+    name = f"metric_rollup_{resolution}"
+    return create(name, f"""
+        CREATE TABLE {name} (
+            metric_name TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL,
+            max REAL,
+            sketch BLOB,
+            PRIMARY KEY (metric_name, bucket_start)
+        ) WITHOUT ROWID
+    """)
+
+def backfill_rollups(cursor: sqlite3.Cursor) -> Optional[str]:
+    """Agrega nos rollups as métricas brutas gravadas antes deles existirem"""
+    cursor.execute("""
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER), metric_name, metric_value
+        FROM performance_metrics WHERE timestamp IS NOT NULL
+    """)
+    samples = cursor.fetchall()
+    if not samples:
+        return None
+
+    buckets = apply_rollups(cursor, samples)
+    return f"rollups preenchidos com {len(samples)} métricas ({buckets} baldes)"
+
+MIGRATIONS: Dict[str, List[Migration]] = {
+    # queen_memory.db
+    "memory": [
+        Migration(1, "Esquema base da memória", [
+            create("memory", """
+                CREATE TABLE memory (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt TEXT,
+                    response TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    session_id TEXT,
+                    context TEXT,
+                    confidence REAL DEFAULT 0.8,
+                    hit_count INTEGER DEFAULT 1
+                )
+            """),
+            create("conversations", """
+                CREATE TABLE conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT,
+                    user_input TEXT,
+                    ai_response TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    response_time REAL,
+                    satisfaction_score INTEGER
+                )
+            """),
+            create("user_preferences", """
+                CREATE TABLE user_preferences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    preference_key TEXT UNIQUE,
+                    preference_value TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """),
+            create("session_summaries", """
+                CREATE TABLE session_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT,
+                    turns_summarized INTEGER DEFAULT 0,
+                    last_conversation_id INTEGER DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """),
+            create("memory_embeddings", """
+                CREATE TABLE memory_embeddings (
+                    memory_id INTEGER PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            """),
+            create("doc_files", """
+                CREATE TABLE doc_files (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    chunk_count INTEGER DEFAULT 0,
+                    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """),
+            create("doc_chunks", """
+                CREATE TABLE doc_chunks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    heading TEXT,
+                    content TEXT NOT NULL,
+                    dim INTEGER,
+                    vector BLOB
+                )
+            """)
+        ]),
+        Migration(2, "Colunas ausentes em bancos criados por versões antigas", [
+            add_column("memory", "session_id", "TEXT"),
+            add_column("memory", "context", "TEXT"),
+            add_column("memory", "confidence", "REAL DEFAULT 0.8"),
+            add_column("memory", "hit_count", "INTEGER DEFAULT 1"),
+            add_column("conversations", "response_time", "REAL"),
+            add_column("conversations", "satisfaction_score", "INTEGER")
+        ]),
+        Migration(3, "Índices de busca textual e gatilhos de embeddings", [
+            fts_index("memory_fts", "memory", ["prompt", "response"]),
+            fts_index("doc_chunks_fts", "doc_chunks", ["heading", "content"]),
+            create("memory_embeddings_ad", """
+                CREATE TRIGGER memory_embeddings_ad AFTER DELETE ON memory BEGIN
+                    DELETE FROM memory_embeddings WHERE memory_id = old.id;
+                END
+            """)
+        ]),
+        Migration(4, "Índices secundários das consultas de contexto", [
+            create("idx_conversations_session_ts",
+                   "CREATE INDEX idx_conversations_session_ts ON conversations(session_id, timestamp)"),
+            create("idx_memory_session_ts",
+                   "CREATE INDEX idx_memory_session_ts ON memory(session_id, timestamp)"),
+            create("idx_memory_confidence_ts",
+                   "CREATE INDEX idx_memory_confidence_ts ON memory(confidence, timestamp)"),
+            create("idx_doc_chunks_path",
+                   "CREATE INDEX idx_doc_chunks_path ON doc_chunks(path)")
+        ]),
+        Migration(5, "Assinaturas MinHash persistidas da consolidação", [
+            create("memory_minhash", """
+                CREATE TABLE memory_minhash (
+                    memory_id INTEGER PRIMARY KEY,
+                    signature BLOB NOT NULL
+                )
+            """),
+            create("memory_lsh_bands", """
+                CREATE TABLE memory_lsh_bands (
+                    band INTEGER NOT NULL,
+                    bucket BLOB NOT NULL,
+                    memory_id INTEGER NOT NULL,
+                    PRIMARY KEY (band, bucket, memory_id)
+                ) WITHOUT ROWID
+            """),
+            create("idx_memory_lsh_bands_memory",
+                   "CREATE INDEX idx_memory_lsh_bands_memory ON memory_lsh_bands(memory_id)"),
+            create("memory_minhash_ad", """
+                CREATE TRIGGER memory_minhash_ad AFTER DELETE ON memory BEGIN
+                    DELETE FROM memory_minhash WHERE memory_id = old.id;
+                    DELETE FROM memory_lsh_bands WHERE memory_id = old.id;
+                END
+            """),
+            # Prompt editado perde a assinatura e volta a ser assinado na próxima passada
+            create("memory_minhash_au", """
+                CREATE TRIGGER memory_minhash_au AFTER UPDATE OF prompt ON memory BEGIN
+                    DELETE FROM memory_minhash WHERE memory_id = old.id;
+                    DELETE FROM memory_lsh_bands WHERE memory_id = old.id;
+                END
+            """)
+        ])
+    ],
+
+    # queen_performance.db
+    "performance": [
+        Migration(1, "Esquema base de performance", [
+            create("performance_metrics", """
+                CREATE TABLE performance_metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    metric_name TEXT NOT NULL,
+                    metric_value REAL NOT NULL,
+                    context TEXT
+                )
+            """),
+            create("optimization_history", """
+                CREATE TABLE optimization_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    optimization_type TEXT NOT NULL,
+                    description TEXT,
+                    before_value REAL,
+                    after_value REAL,
+                    success BOOLEAN
+                )
+            """)
+        ]),
+        Migration(2, "Índices secundários das consultas de métricas", [
+            create("idx_metrics_name_ts",
+                   "CREATE INDEX idx_metrics_name_ts ON performance_metrics(metric_name, timestamp)"),
+            create("idx_metrics_ts",
+                   "CREATE INDEX idx_metrics_ts ON performance_metrics(timestamp)"),
+            create("idx_optimization_ts",
+                   "CREATE INDEX idx_optimization_ts ON optimization_history(timestamp)")
+        ]),
+        Migration(3, "Rollups de métricas por minuto, hora e dia", [
+            create_rollup("1m"),
+            create_rollup("1h"),
+            create_rollup("1d"),
+            backfill_rollups
+        ]),
+        Migration(4, "Spans de tracing por requisição", [
+            create("trace_spans", """
+                CREATE TABLE trace_spans (
+                    span_id TEXT PRIMARY KEY,
+                    trace_id TEXT NOT NULL,
+                    parent_id TEXT,
+                    name TEXT NOT NULL,
+                    started_at DATETIME,
+                    start_ns INTEGER,
+                    duration_ms REAL,
+                    status TEXT,
+                    error TEXT,
+                    attributes TEXT
+                )
+            """),
+            create("idx_trace_spans_trace",
+                   "CREATE INDEX idx_trace_spans_trace ON trace_spans(trace_id, start_ns)"),
+            create("idx_trace_spans_roots",
+                   "CREATE INDEX idx_trace_spans_roots ON trace_spans(parent_id, started_at)")
+        ]),
+        Migration(5, "Resultado das otimizações em malha fechada", [
+            add_column("optimization_history", "action", "TEXT"),
+            add_column("optimization_history", "metric_name", "TEXT"),
+            add_column("optimization_history", "rolled_back", "BOOLEAN"),
+            add_column("optimization_history", "evaluated_at", "DATETIME")
+        ]),
+        Migration(6, "Artefatos de profiling ligados ao histórico", [
+            add_column("optimization_history", "artifact", "TEXT")
+        ]),
+        Migration(7, "Teste de significância das otimizações", [
+            add_column("optimization_history", "p_value", "REAL"),
+            add_column("optimization_history", "before_samples", "INTEGER"),
+            add_column("optimization_history", "after_samples", "INTEGER")
+        ]),
+        Migration(8, "Execuções do n8n ingeridas localmente", [
+            create("n8n_executions", """
+                CREATE TABLE n8n_executions (
+                    execution_id INTEGER PRIMARY KEY,
+                    workflow_id TEXT NOT NULL,
+                    status TEXT,
+                    finished BOOLEAN,
+                    mode TEXT,
+                    started_at DATETIME,
+                    stopped_at DATETIME,
+                    duration REAL
+                )
+            """),
+            create("idx_n8n_executions_workflow",
+                   "CREATE INDEX idx_n8n_executions_workflow ON n8n_executions(workflow_id, execution_id)"),
+            create("n8n_ingest_state", """
+                CREATE TABLE n8n_ingest_state (
+                    workflow_id TEXT PRIMARY KEY,
+                    last_execution_id INTEGER NOT NULL,
+                    updated_at DATETIME
+                )
+            """)
+        ]),
+        Migration(9, "Tempo por nó e definição dos workflows do n8n", [
+            create("n8n_node_runs", """
+                CREATE TABLE n8n_node_runs (
+                    execution_id INTEGER NOT NULL,
+                    node TEXT NOT NULL,
+                    run_index INTEGER NOT NULL,
+                    started_at_ms INTEGER,
+                    execution_time_ms REAL,
+                    status TEXT,
+                    PRIMARY KEY (execution_id, node, run_index)
+                )
+            """),
+            create("n8n_workflows", """
+                CREATE TABLE n8n_workflows (
+                    workflow_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    nodes TEXT,
+                    connections TEXT,
+                    updated_at DATETIME
+                )
+            """)
+        ]),
+        Migration(10, "Índice de retenção dos spans", [
+            create("idx_trace_spans_started",
+                   "CREATE INDEX idx_trace_spans_started ON trace_spans(started_at)")
+        ]),
+        Migration(11, "Retomada da ingestão do n8n interrompida no meio", [
+            add_column("n8n_ingest_state", "resume_cursor", "TEXT"),
+            add_column("n8n_ingest_state", "resume_high", "INTEGER")
+        ])
+    ],
+
+    # agents.db
+    "agents": [
+        Migration(1, "Esquema base dos agentes", [
+            create("agent_tasks", """
+                CREATE TABLE agent_tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    agent_id TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    task_data TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    completed_at DATETIME
+                )
+            """),
+            create("agent_performance", """
+                CREATE TABLE agent_performance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    agent_id TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    execution_time REAL,
+                    success_rate REAL,
+                    confidence_score REAL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        ]),
+        Migration(2, "Índices secundários das consultas de agentes", [
+            create("idx_agent_performance_agent_task",
+                   "CREATE INDEX idx_agent_performance_agent_task ON agent_performance(agent_id, task_type)"),
+            create("idx_agent_tasks_agent_task",
+                   "CREATE INDEX idx_agent_tasks_agent_task ON agent_tasks(agent_id, task_type)"),
+            create("idx_agent_tasks_status_created",
+                   "CREATE INDEX idx_agent_tasks_status_created ON agent_tasks(status, created_at)")
+        ])
+    ]
+}
+
+# Bancos padrão da aplicação
+DEFAULT_DATABASES = {
+    "memory": "queen_memory.db",
+    "performance": "queen_performance.db",
+    "agents": "agents.db"
+}
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+def _ensure_history_table(conn: sqlite3.Connection):
+    """Cria a tabela de histórico de migrações"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            changes TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def get_schema_version(db_path: str) -> int:
+    """Retorna a versão atual do esquema de um banco"""
+    conn = sqlite3.connect(db_path)
+    try:
+        _ensure_history_table(conn)
+        row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+        return row[0] or 0
+    finally:
+        conn.close()
+
+def migrate_database(db_path: str, schema: str, force: bool = False) -> List[Dict]:
+    """Aplica as migrações pendentes; executa uma vez por banco e processo"""
+    if schema not in MIGRATIONS:
+        raise ValueError(f"Esquema desconhecido: {schema}")
+
+    key = (os.path.abspath(db_path), schema)
+    with _migrated_lock:
+        if key in _migrated and not force:
+            return []
+
+        applied = []
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            _ensure_history_table(conn)
+            cursor = conn.cursor()
+
+            for migration in MIGRATIONS[schema]:
+                # BEGIN IMMEDIATE serializa migrações de processos concorrentes
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor.execute(
+                        "SELECT 1 FROM schema_migrations WHERE version = ?", (migration.version,)
+                    )
+                    if cursor.fetchone():
+                        cursor.execute("COMMIT")
+                        continue
+
+                    changes = []
+                    for step in migration.steps:
+                        if callable(step):
+                            change = step(cursor)
+                        else:
+                            cursor.execute(step)
+                            change = step.strip().splitlines()[0]
+                        if change:
+                            changes.append(change)
+
+                    cursor.execute("""
+                        INSERT INTO schema_migrations (version, description, changes, applied_at)
+                        VALUES (?, ?, ?, ?)
+                    """, (migration.version, migration.description,
+                          json.dumps(changes, ensure_ascii=False), datetime.now()))
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+
+                applied.append({
+                    "version": migration.version,
+                    "description": migration.description,
+                    "changes": changes
+                })
+        finally:
+            conn.close()
+
+        if db_path != ":memory:":
+            _migrated.add(key)
+
+    return applied
+
+def migrate_all(databases: Optional[Dict[str, str]] = None) -> Dict[str, List[Dict]]:
+    """Leva todos os bancos à versão mais recente do esquema"""
+    databases = databases or DEFAULT_DATABASES
+    return {
+        schema: migrate_database(db_path, schema)
+        for schema, db_path in databases.items()
+    }
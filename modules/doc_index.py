@@ -0,0 +1,231 @@
+# modules/doc_index.py
+"""
+Índice de Documentação do Cérebro Digital da Queen
+Indexa incrementalmente docs/*.md (FTS + embeddings) para fundamentar respostas
+"""
+
+import os
+import re
+import glob
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from modules.embeddings import HashingEmbedder, vector_to_blob, blob_to_vector
+from modules.db_migrations import migrate_database
+from modules.text_search import search_terms, bm25_relevance
+
+class DocumentIndex:
+    """Índice incremental da base de conhecimento em Markdown"""
+
+    def __init__(self, db_path: str = 'queen_memory.db', docs_dir: str = 'docs',
+                 embedder=None, chunk_size: int = 800):
+        self.db_path = db_path
+        self.docs_dir = docs_dir
+        self.embedder = embedder or HashingEmbedder()
+        self.chunk_size = chunk_size
+        self.fts_enabled = False
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._vector_cache = None
+        self._init_db()
+
+    def _init_db(self):
+        """Garante as tabelas do índice de documentos"""
+        migrate_database(self.db_path, "memory")
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'doc_chunks_fts'")
+        self.fts_enabled = cursor.fetchone() is not None
+        conn.close()
+
+    def chunk_markdown(self, text: str) -> List[Tuple[str, str]]:
+        """Divide o Markdown em trechos (título, conteúdo) por seção"""
+        sections = []
+        heading = ""
+        lines = []
+        in_code = False
+
+        for line in text.splitlines():
+            if line.strip().startswith("```"):
+                in_code = not in_code
+
+            match = None if in_code else re.match(r"^(#{1,6})\s+(.*)", line)
+            if match:
+                if "".join(lines).strip():
+                    sections.append((heading, "\n".join(lines).strip()))
+                heading = match.group(2).strip()
+                lines = []
+            else:
+                lines.append(line)
+
+        if "".join(lines).strip():
+            sections.append((heading, "\n".join(lines).strip()))
+
+        # Seções longas são quebradas por parágrafos
+        chunks = []
+        for section_heading, content in sections:
+            current = ""
+            for paragraph in re.split(r"\n\s*\n", content):
+                if current and len(current) + len(paragraph) > self.chunk_size:
+                    chunks.append((section_heading, current.strip()))
+                    current = ""
+                current += paragraph + "\n\n"
+            if current.strip():
+                chunks.append((section_heading, current.strip()))
+
+        return chunks
+
+    def index_directory(self) -> Dict[str, int]:
+        """Reindexa apenas os arquivos novos ou alterados"""
+        with self._index_lock:
+            return self._index_directory()
+
+    def _index_directory(self) -> Dict[str, int]:
+        """Executa a indexação incremental"""
+        stats = {"indexed": 0, "skipped": 0, "removed": 0, "chunks": 0}
+        paths = sorted(glob.glob(os.path.join(self.docs_dir, "*.md")))
+
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        cursor = conn.cursor()
+        cursor.execute("SELECT path, mtime, sha256 FROM doc_files")
+        known = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+        for path in paths:
+            mtime = os.path.getmtime(path)
+            previous = known.get(path)
+            if previous and previous[0] == mtime:
+                stats["skipped"] += 1
+                continue
+
+            with open(path, 'rb') as f:
+                raw = f.read()
+            sha256 = hashlib.sha256(raw).hexdigest()
+
+            # mtime mudou mas o conteúdo não: só atualiza o registro
+            if previous and previous[1] == sha256:
+                cursor.execute("UPDATE doc_files SET mtime = ? WHERE path = ?", (mtime, path))
+                stats["skipped"] += 1
+                continue
+
+            chunks = self.chunk_markdown(raw.decode('utf-8', errors='replace'))
+            vectors = self.embedder.embed([f"{h}\n{c}" for h, c in chunks]) if chunks else []
+
+            cursor.execute("DELETE FROM doc_chunks WHERE path = ?", (path,))
+            cursor.executemany("""
+                INSERT INTO doc_chunks (path, chunk_index, heading, content, dim, vector)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (path, i, heading, content, len(vectors[i]), vector_to_blob(vectors[i]))
+                for i, (heading, content) in enumerate(chunks)
+            ])
+            cursor.execute("""
+                INSERT OR REPLACE INTO doc_files (path, mtime, sha256, chunk_count, indexed_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (path, mtime, sha256, len(chunks), datetime.now()))
+
+            stats["indexed"] += 1
+            stats["chunks"] += len(chunks)
+
+        # Remove arquivos que não existem mais
+        for path in set(known) - set(paths):
+            cursor.execute("DELETE FROM doc_chunks WHERE path = ?", (path,))
+            cursor.execute("DELETE FROM doc_files WHERE path = ?", (path,))
+            stats["removed"] += 1
+
+        conn.commit()
+        conn.close()
+
+        if stats["indexed"] or stats["removed"]:
+            with self._lock:
+                self._vector_cache = None
+
+        return stats
+
+    def clear_cache(self):
+        """Descarta a matriz de embeddings em memória (recarregada sob demanda)"""
+        with self._lock:
+            self._vector_cache = None
+
+    def _load_vectors(self):
+        """Carrega (e mantém em cache) a matriz de embeddings dos trechos"""
+        with self._lock:
+            if self._vector_cache is not None:
+                return self._vector_cache
+
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, dim, vector FROM doc_chunks WHERE vector IS NOT NULL")
+            rows = cursor.fetchall()
+            conn.close()
+
+            dim = getattr(self.embedder, "dim", None) or (rows[0][1] if rows else None)
+            rows = [row for row in rows if row[1] == dim]
+            if rows:
+                ids = np.array([row[0] for row in rows], dtype=np.int64)
+                matrix = np.vstack([blob_to_vector(row[2]) for row in rows])
+                self._vector_cache = (ids, matrix)
+            else:
+                self._vector_cache = (np.zeros(0, dtype=np.int64), None)
+
+            return self._vector_cache
+
+    def search(self, query: str, k: int = 3) -> List[Dict]:
+        """Busca híbrida (lexical + semântica) nos trechos da documentação
+
+        O score é absoluto (metade BM25 calibrado, metade cosseno), para que
+        quem chama possa descartar os trechos sem relação com a consulta
+        """
+        scores: Dict[int, float] = {}
+
+        terms = search_terms(query)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        if self.fts_enabled and terms:
+            match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+            cursor.execute("""
+                SELECT rowid, -bm25(doc_chunks_fts) FROM doc_chunks_fts
+                WHERE doc_chunks_fts MATCH ?
+                ORDER BY bm25(doc_chunks_fts) LIMIT ?
+            """, (match, k * 3))
+            for chunk_id, rank in cursor.fetchall():
+                scores[chunk_id] = 0.5 * bm25_relevance(rank)
+
+        ids, matrix = self._load_vectors()
+        if matrix is not None:
+            # Sem as palavras vazias, que aproximam a consulta de qualquer trecho
+            query_vector = self.embedder.embed([" ".join(terms) or query])[0]
+            if query_vector.shape[0] == matrix.shape[1]:
+                similarities = matrix @ query_vector
+                for i in np.argsort(-similarities)[:k * 3]:
+                    if similarities[i] > 0:
+                        chunk_id = int(ids[i])
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + 0.5 * float(similarities[i])
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not top:
+            conn.close()
+            return []
+
+        cursor.execute(f"""
+            SELECT id, path, heading, content FROM doc_chunks
+            WHERE id IN ({','.join('?' * len(top))})
+        """, [chunk_id for chunk_id, _ in top])
+        rows = {row[0]: row for row in cursor.fetchall()}
+        conn.close()
+
+        return [
+            {
+                "id": chunk_id,
+                "path": rows[chunk_id][1],
+                "heading": rows[chunk_id][2],
+                "content": rows[chunk_id][3],
+                "score": score
+            }
+            for chunk_id, score in top if chunk_id in rows
+        ]
@@ -0,0 +1,78 @@
+# modules/embeddings.py
+"""
+Módulo de Embeddings do Cérebro Digital da Queen
+Gera vetores para busca semântica local
+"""
+
+import re
+import zlib
+import requests
+import numpy as np
+from typing import List, Optional
+
+class HashingEmbedder:
+    """Embeddings locais por hashing de tokens (rápido e sem dependência de rede)"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _tokens(self, text: str) -> List[str]:
+        """Extrai palavras e bigramas do texto"""
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Converte textos em vetores normalizados"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for token in self._tokens(text or ""):
+                h = zlib.crc32(token.encode("utf-8"))
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                vectors[row, h % self.dim] += sign
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+class OllamaEmbedder:
+    """Embeddings via endpoint /api/embeddings do Ollama"""
+
+    def __init__(self, model: str = "nomic-embed-text",
+                 url: str = "http://localhost:11434/api/embeddings", timeout: int = 10):
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+        self.dim = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Converte textos em vetores normalizados"""
+        vectors = []
+        for text in texts:
+            response = requests.post(self.url, json={
+                "model": self.model,
+                "prompt": text
+            }, timeout=self.timeout)
+            response.raise_for_status()
+            vectors.append(response.json()["embedding"])
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self.dim = matrix.shape[1] if matrix.ndim == 2 else self.dim
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+def create_embedder(model: Optional[str] = None, url: Optional[str] = None):
+    """Cria o embedder configurado; sem modelo, usa hashing local"""
+    if model:
+        return OllamaEmbedder(model, url or "http://localhost:11434/api/embeddings")
+    return HashingEmbedder()
+
+def vector_to_blob(vector: np.ndarray) -> bytes:
+    """Serializa um vetor para armazenamento no SQLite"""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def blob_to_vector(blob: bytes) -> np.ndarray:
+    """Desserializa um vetor armazenado no SQLite"""
+    return np.frombuffer(blob, dtype=np.float32)
@@ -8,13 +8,20 @@ import os
 import json
 import requests
 import base64
+import time
 import subprocess
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from PIL import Image, ImageEnhance, ImageFilter
 import speech_recognition as sr
 import pyttsx3
 
+from modules.tracing import span, traced
+from modules.openmetrics import Histogram
+
 class ImageProcessor:
     """Processador avançado de imagens"""
     
@@ -489,31 +496,80 @@ class VideoProcessor:
 class MediaOrchestrator:
     """Orquestrador de todas as funcionalidades de mídia"""
     
-    def __init__(self):
+    def __init__(self, switches=None):
         self.image_processor = ImageProcessor()
         self.audio_processor = AudioProcessor()
         self.video_processor = VideoProcessor()
+        self.switches = switches
+        
+        # Contadores em memória por tipo de mídia (expostos no endpoint /metrics)
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+    
+    def _measured(self, kind: str, generate):
+        """Executa uma geração contando duração, sucesso e gerações em andamento"""
+        with self._stats_lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        result = None
+        try:
+            result = generate()
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.in_flight -= 1
+                stats = self._stats.get(kind)
+                if stats is None:
+                    stats = self._stats[kind] = {"success": 0, "failure": 0, "duration": Histogram()}
+                stats["success" if result else "failure"] += 1
+            stats["duration"].observe(elapsed)
+    
+    def media_stats(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(tipo, contadores) de cada tipo de mídia já gerado"""
+        with self._stats_lock:
+            return [(kind, dict(stats)) for kind, stats in self._stats.items()]
     
+    @traced("media.create_multimedia_content")
     def create_multimedia_content(self, prompt: str, content_type: str = "complete") -> Dict[str, str]:
         """Cria conteúdo multimídia baseado em prompt"""
         results = {}
         
-        if content_type in ["complete", "image"]:
-            # Gera imagem
-            image_path = self.image_processor.generate_image(prompt)
-            if image_path:
-                results["image"] = image_path
+        def generate_image():
+            with span("media.generate_image"):
+                return self._measured("image", lambda: self.image_processor.generate_image(prompt))
+        
+        def generate_audio():
+            with span("media.generate_speech"):
+                return self._measured("audio", lambda: self.audio_processor.generate_speech(
+                    f"Conteúdo gerado para: {prompt}"))
+        
+        want_image = content_type in ["complete", "image"]
+        want_audio = content_type in ["complete", "audio"]
+        
+        if want_image and want_audio and self.switches is not None \
+                and self.switches.is_enabled("parallel_processing"):
+            # Imagem e áudio são independentes: gera os dois ao mesmo tempo
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                image_future = executor.submit(contextvars.copy_context().run, generate_image)
+                audio_future = executor.submit(contextvars.copy_context().run, generate_audio)
+                image_path, audio_path = image_future.result(), audio_future.result()
+        else:
+            image_path = generate_image() if want_image else None
+            audio_path = generate_audio() if want_audio else None
         
-        if content_type in ["complete", "audio"]:
-            # Gera áudio
-            audio_path = self.audio_processor.generate_speech(
-                f"Conteúdo gerado para: {prompt}"
-            )
+        if image_path:
+            results["image"] = image_path
+        
+        if want_audio:
             results["audio"] = audio_path
         
         if content_type in ["complete", "video"] and "image" in results:
             # Gera vídeo simples com a imagem
-            video_path = self.video_processor.generate_video_from_images([results["image"]])
+            with span("media.generate_video"):
+                video_path = self._measured("video", lambda: self.video_processor.generate_video_from_images(
+                    [results["image"]]))
             if video_path:
                 results["video"] = video_path
         
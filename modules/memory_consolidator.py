@@ -0,0 +1,314 @@
+# modules/memory_consolidator.py
+"""
+Módulo de Consolidação de Memória do Cérebro Digital da Queen
+Agrupa pares prompt/resposta quase duplicados usando MinHash com LSH
+"""
+
+import re
+import zlib
+import sqlite3
+import threading
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+from modules.db_migrations import migrate_database
+
+# Primo de Mersenne 2^31 - 1: mantém a*x + b dentro de uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+
+class MinHashLSH:
+    """Assinaturas MinHash com índice LSH por bandas"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 4, seed: int = 42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm deve ser múltiplo de bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Permutações universais (a * x + b) mod p
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def _shingles(self, text: str) -> Set[str]:
+        """Gera shingles de caracteres a partir do texto normalizado"""
+        normalized = re.sub(r"[^\w\s]", " ", text.lower())
+        normalized = re.sub(r"\s+", " ", normalized).strip()
+
+        if len(normalized) <= self.shingle_size:
+            return {normalized} if normalized else set()
+
+        return {
+            normalized[i:i + self.shingle_size]
+            for i in range(len(normalized) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        """Calcula a assinatura MinHash de um texto"""
+        shingles = self._shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+
+        hashes = np.array(
+            [zlib.crc32(s.encode("utf-8")) % _MERSENNE_PRIME for s in shingles],
+            dtype=np.uint64
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """Chave de cada banda da assinatura"""
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def buckets(self, signatures: Dict[int, np.ndarray]) -> List[List[int]]:
+        """Baldes de itens que colidem em uma mesma banda (só os com dois ou mais)"""
+        index = defaultdict(list)
+        for item_id, sig in signatures.items():
+            for band, key in enumerate(self.band_keys(sig)):
+                index[(band, key)].append(item_id)
+
+        return [bucket for bucket in index.values() if len(bucket) > 1]
+
+    @staticmethod
+    def estimate_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estima a similaridade de Jaccard entre duas assinaturas"""
+        return float(np.mean(sig_a == sig_b))
+
+class MemoryConsolidator:
+    """Consolida memórias quase duplicadas em uma linha canônica"""
+
+    def __init__(self, db_path: str = 'queen_memory.db', threshold: float = 0.8,
+                 interval: int = 600, confidence_boost: float = 0.05,
+                 max_representatives: int = 8):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.interval = interval
+        self.confidence_boost = confidence_boost
+        self.max_representatives = max_representatives
+        self.lsh = MinHashLSH()
+        self.running = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._delete_listeners = []
+        self._ensure_schema()
+
+    def on_delete(self, callback):
+        """Registra callback(ids) chamado após remover memórias duplicadas"""
+        self._delete_listeners.append(callback)
+
+    def _ensure_schema(self):
+        """Garante o esquema atual da memória (inclui a coluna hit_count)"""
+        migrate_database(self.db_path, "memory")
+
+    def find_duplicate_groups(self, rows: List[Tuple[int, str]]) -> List[List[int]]:
+        """Agrupa IDs de memórias com prompts quase idênticos"""
+        signatures = {memory_id: self.lsh.signature(prompt or "") for memory_id, prompt in rows}
+        return self._group_buckets(self.lsh.buckets(signatures), signatures)
+
+    def _group_buckets(self, buckets: List[List[int]],
+                       signatures: Dict[int, np.ndarray]) -> List[List[int]]:
+        """Union-find sobre os baldes do LSH, confirmando a similaridade das assinaturas
+
+        Cada membro do balde é comparado só com um representante de cada
+        componente já presente nele, e não com todos os outros membros: um
+        balde de n duplicatas exatas custa n comparações em vez de n²/2, e nas
+        demais bandas os mesmos itens já estão unidos e nem são comparados.
+        Em baldes com muitos textos distintos, só os `max_representatives`
+        componentes mais recentes são consultados; pares que escapam aqui
+        costumam colidir em outra banda.
+        """
+        parent = {}
+        # Pares já comparados sem atingir o limiar, que se repetem entre as bandas
+        rejected = set()
+
+        def find(item):
+            parent.setdefault(item, item)
+            while parent[item] != item:
+                parent[item] = parent[parent[item]]
+                item = parent[item]
+            return item
+
+        for bucket in buckets:
+            representatives = {}
+            roots = []
+            for item in bucket:
+                root = find(item)
+                if root in representatives:
+                    continue
+                for position in range(max(len(roots) - self.max_representatives, 0), len(roots)):
+                    rep_root = roots[position]
+                    rep = representatives[rep_root]
+                    pair = (min(item, rep), max(item, rep))
+                    if pair in rejected:
+                        continue
+                    if self.lsh.estimate_similarity(signatures[item], signatures[rep]) >= self.threshold:
+                        merged_root = min(root, rep_root)
+                        parent[max(root, rep_root)] = merged_root
+                        if merged_root != rep_root:
+                            representatives[merged_root] = representatives.pop(rep_root)
+                            roots[position] = merged_root
+                        break
+                    rejected.add(pair)
+                else:
+                    representatives[root] = item
+                    roots.append(root)
+
+        groups = defaultdict(list)
+        for memory_id in signatures:
+            groups[find(memory_id)].append(memory_id)
+
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+    def _store_signatures(self, cursor: sqlite3.Cursor,
+                          rows: List[Tuple[int, str]]) -> Dict[int, np.ndarray]:
+        """Assina as linhas novas e grava assinatura e chaves de banda"""
+        signatures = {memory_id: self.lsh.signature(prompt or "") for memory_id, prompt in rows}
+
+        cursor.executemany(
+            "INSERT OR REPLACE INTO memory_minhash (memory_id, signature) VALUES (?, ?)",
+            [(memory_id, sig.tobytes()) for memory_id, sig in signatures.items()]
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO memory_lsh_bands (band, bucket, memory_id) VALUES (?, ?, ?)",
+            [
+                (band, key, memory_id)
+                for memory_id, sig in signatures.items()
+                for band, key in enumerate(self.lsh.band_keys(sig))
+            ]
+        )
+        return signatures
+
+    def _touched_buckets(self, cursor: sqlite3.Cursor,
+                         signatures: Dict[int, np.ndarray]) -> List[List[int]]:
+        """Baldes das linhas novas, com as memórias já assinadas que caíram neles
+
+        As assinaturas das memórias antigas que aparecem nos baldes são
+        carregadas em `signatures`.
+        """
+        keys = {
+            (band, key)
+            for sig in signatures.values()
+            for band, key in enumerate(self.lsh.band_keys(sig))
+        }
+
+        buckets = []
+        for band, key in keys:
+            cursor.execute("""
+                SELECT memory_id FROM memory_lsh_bands
+                WHERE band = ? AND bucket = ? ORDER BY memory_id
+            """, (band, key))
+            bucket = [row[0] for row in cursor.fetchall()]
+            if len(bucket) > 1:
+                buckets.append(bucket)
+
+        missing = sorted({memory_id for bucket in buckets for memory_id in bucket} - set(signatures))
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            cursor.execute(
+                f"SELECT memory_id, signature FROM memory_minhash WHERE memory_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for memory_id, blob in cursor.fetchall():
+                signatures[memory_id] = np.frombuffer(blob, dtype=np.uint64)
+
+        return [[memory_id for memory_id in bucket if memory_id in signatures] for bucket in buckets]
+
+    def consolidate(self) -> Dict[str, int]:
+        """Executa uma passada de consolidação sobre as memórias ainda não assinadas
+
+        As assinaturas e as chaves de banda ficam em memory_minhash e
+        memory_lsh_bands; cada passada assina só as linhas novas (ou com o
+        prompt editado) e as compara com os baldes que elas tocam.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT m.id, m.prompt FROM memory m
+            LEFT JOIN memory_minhash s ON s.memory_id = m.id
+            WHERE s.memory_id IS NULL
+        """)
+        rows = cursor.fetchall()
+        signatures = self._store_signatures(cursor, rows)
+        buckets = self._touched_buckets(cursor, signatures)
+        groups = self._group_buckets(buckets, signatures)
+
+        merged = 0
+        removed = []
+        for group in groups:
+            placeholders = ",".join("?" * len(group))
+            cursor.execute(f"""
+                SELECT id, confidence, COALESCE(hit_count, 1), timestamp
+                FROM memory WHERE id IN ({placeholders})
+            """, group)
+            members = cursor.fetchall()
+            if len(members) < 2:
+                continue
+
+            # Linha canônica: maior confiança, depois a mais recente
+            canonical = max(members, key=lambda m: (m[1] or 0.0, m[0]))
+            total_hits = sum(m[2] for m in members)
+            latest_timestamp = max(m[3] for m in members)
+            confidence = min(
+                1.0,
+                max(m[1] or 0.0 for m in members) + self.confidence_boost * (len(members) - 1)
+            )
+
+            cursor.execute("""
+                UPDATE memory SET hit_count = ?, confidence = ?, timestamp = ?
+                WHERE id = ?
+            """, (total_hits, confidence, latest_timestamp, canonical[0]))
+
+            duplicates = [m[0] for m in members if m[0] != canonical[0]]
+            cursor.execute(
+                f"DELETE FROM memory WHERE id IN ({','.join('?' * len(duplicates))})",
+                duplicates
+            )
+            merged += len(duplicates)
+            removed.extend(duplicates)
+
+        conn.commit()
+        conn.close()
+
+        if removed:
+            for callback in self._delete_listeners:
+                callback(removed)
+
+        return {
+            "scanned": len(rows),
+            "groups": len(groups),
+            "merged": merged
+        }
+
+    def start(self):
+        """Inicia a consolidação periódica em segundo plano"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._consolidation_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Para a consolidação periódica"""
+        self.running = False
+        self._stop_event.set()
+
+    def _consolidation_loop(self):
+        """Loop da consolidação em segundo plano"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                stats = self.consolidate()
+                if stats["merged"]:
+                    print(f"Memória consolidada: {stats['merged']} duplicatas em {stats['groups']} grupos")
+            except Exception as e:
+                print(f"Erro na consolidação de memória: {e}")
@@ -0,0 +1,109 @@
+# modules/metric_rollup.py
+"""
+Rollups de Métricas do Cérebro Digital da Queen
+Agrega métricas em baldes de 1 minuto, 1 hora e 1 dia para consultas de tendência
+"""
+
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from modules.metric_sketch import QuantileSketch
+
+# (resolução, tamanho do balde em segundos, retenção em segundos; None = para sempre)
+ROLLUP_RESOLUTIONS: List[Tuple[str, int, Optional[int]]] = [
+    ("1m", 60, 7 * 86400),
+    ("1h", 3600, 90 * 86400),
+    ("1d", 86400, None)
+]
+
+# Linhas brutas de performance_metrics são mantidas por este período
+RAW_RETENTION = 2 * 86400
+
+def rollup_table(resolution: str) -> str:
+    """Nome da tabela de uma resolução"""
+    return f"metric_rollup_{resolution}"
+
+def apply_rollups(cursor: sqlite3.Cursor, samples: Iterable[Tuple[float, str, float]]) -> int:
+    """Incorpora amostras (epoch, métrica, valor) às tabelas de rollup; retorna baldes tocados"""
+    pending: Dict[Tuple[str, str, int], QuantileSketch] = defaultdict(QuantileSketch)
+    for timestamp, name, value in samples:
+        for resolution, size, _ in ROLLUP_RESOLUTIONS:
+            bucket = int(timestamp // size) * size
+            pending[(resolution, name, bucket)].add(value)
+
+    for (resolution, name, bucket), sketch in pending.items():
+        table = rollup_table(resolution)
+        cursor.execute(
+            f"SELECT sketch FROM {table} WHERE metric_name = ? AND bucket_start = ?",
+            (name, bucket)
+        )
+        row = cursor.fetchone()
+        if row and row[0]:
+            sketch.merge(QuantileSketch.from_bytes(row[0]))
+
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO {table}
+            (metric_name, bucket_start, count, sum, min, max, sketch)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (name, bucket, sketch.count, sketch.sum, sketch.min, sketch.max, sketch.to_bytes()))
+
+    return len(pending)
+
+def expire(cursor: sqlite3.Cursor, now: Optional[float] = None) -> Dict[str, int]:
+    """Remove linhas brutas e rollups além da retenção"""
+    now = now or time.time()
+    removed = {}
+
+    cutoff = datetime.utcfromtimestamp(now - RAW_RETENTION).strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute("DELETE FROM performance_metrics WHERE timestamp < ?", (cutoff,))
+    removed["raw"] = cursor.rowcount
+
+    for resolution, _, retention in ROLLUP_RESOLUTIONS:
+        if retention is None:
+            continue
+        cursor.execute(
+            f"DELETE FROM {rollup_table(resolution)} WHERE bucket_start < ?",
+            (int(now - retention),)
+        )
+        removed[resolution] = cursor.rowcount
+
+    return removed
+
+def choose_resolution(seconds: float, max_points: int = 200) -> str:
+    """Escolhe a resolução mais fina que cubra a janela com até max_points baldes"""
+    for resolution, size, retention in ROLLUP_RESOLUTIONS:
+        if seconds / size <= max_points and (retention is None or seconds <= retention):
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1][0]
+
+def query_rollup(db_path: str, name: str, since: float, resolution: str) -> List[Dict]:
+    """Lê os baldes de uma métrica a partir de `since` (epoch), do mais recente ao mais antigo"""
+    size = dict((r, s) for r, s, _ in ROLLUP_RESOLUTIONS)[resolution]
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT bucket_start, count, sum, min, max, sketch
+        FROM {rollup_table(resolution)}
+        WHERE metric_name = ? AND bucket_start >= ?
+        ORDER BY bucket_start DESC
+    """, (name, int(since // size) * size))
+    rows = cursor.fetchall()
+    conn.close()
+
+    points = []
+    for bucket, count, total, minimum, maximum, blob in rows:
+        sketch = QuantileSketch.from_bytes(blob) if blob else None
+        points.append({
+            'timestamp': datetime.utcfromtimestamp(bucket).strftime('%Y-%m-%d %H:%M:%S'),
+            'value': total / count if count else None,
+            'count': count,
+            'min': minimum,
+            'max': maximum,
+            'p95': sketch.quantile(0.95) if sketch else None,
+            'resolution': resolution
+        })
+    return points
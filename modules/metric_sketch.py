@@ -0,0 +1,148 @@
+# modules/metric_sketch.py
+"""
+Sketches de Quantis do Cérebro Digital da Queen
+Histograma logarítmico mesclável para percentis de latência em streaming
+"""
+
+import math
+import struct
+from typing import Dict, Iterable, Optional
+
+# Cabeçalho serializado: precisão, zeros, contagem, soma, mínimo, máximo, nº de baldes
+_HEADER = struct.Struct("<dqqdddI")
+
+class QuantileSketch:
+    """Histograma com baldes logarítmicos (estilo DDSketch) e erro relativo limitado
+
+    Cada valor cai no balde ceil(log_gamma(v)); o percentil estimado fica a no
+    máximo `relative_accuracy` do valor real. Sketches com a mesma precisão
+    podem ser mesclados somando os baldes, o que permite combinar janelas.
+    """
+
+    # Valores abaixo disso (inclusive negativos) contam como zero
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy deve estar entre 0 e 1")
+
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1):
+        """Adiciona um valor (com multiplicidade opcional)"""
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update(self, values: Iterable[float]):
+        """Adiciona vários valores"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'QuantileSketch'):
+        """Incorpora outro sketch com a mesma precisão"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Só é possível mesclar sketches com a mesma precisão")
+
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def copy(self) -> 'QuantileSketch':
+        """Retorna uma cópia independente"""
+        clone = QuantileSketch(self.relative_accuracy)
+        clone.merge(self)
+        return clone
+
+    def to_bytes(self) -> bytes:
+        """Serializa o sketch para gravação em BLOB"""
+        keys = sorted(self.buckets)
+        header = _HEADER.pack(self.relative_accuracy, self.zero_count, self.count,
+                              self.sum, self.min, self.max, len(keys))
+        body = struct.pack(f"<{len(keys)}i{len(keys)}q", *keys, *(self.buckets[k] for k in keys))
+        return header + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'QuantileSketch':
+        """Reconstrói um sketch serializado com to_bytes"""
+        accuracy, zero_count, count, total, minimum, maximum, size = _HEADER.unpack_from(data)
+        values = struct.unpack_from(f"<{size}i{size}q", data, _HEADER.size)
+
+        sketch = cls(accuracy)
+        sketch.buckets = dict(zip(values[:size], values[size:]))
+        sketch.zero_count = zero_count
+        sketch.count = count
+        sketch.sum = total
+        sketch.min = minimum
+        sketch.max = maximum
+        return sketch
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Variância estimada pelos pontos dos baldes, com a média exata"""
+        if not self.count:
+            return None
+        square_sum = sum(count * (2 * self._gamma ** key / (self._gamma + 1)) ** 2
+                         for key, count in self.buckets.items())
+        return max(square_sum / self.count - self.mean ** 2, 0.0)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estima o quantil q (0 a 1); None se o sketch estiver vazio"""
+        if not 0 <= q <= 1:
+            raise ValueError("q deve estar entre 0 e 1")
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return max(self.min, 0.0)
+
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Ponto do balde com erro relativo simétrico
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def count_above(self, value: float) -> int:
+        """Quantos valores excedem `value` (o balde do próprio valor conta como dentro)"""
+        if value < self.MIN_VALUE:
+            return self.count - self.zero_count
+        if value >= self.max:
+            return 0
+
+        limit = math.ceil(math.log(value) / self._log_gamma)
+        return sum(count for key, count in self.buckets.items() if key > limit)
+
+    def percentiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, Optional[float]]:
+        """Retorna os percentis pedidos com chaves no formato p50, p99, p99.9"""
+        return {
+            f"p{q * 100:g}": self.quantile(q)
+            for q in quantiles
+        }
@@ -0,0 +1,348 @@
+# modules/n8n_ingest.py
+"""
+Ingestão de Execuções do n8n para o Cérebro Digital da Queen
+Busca execuções de todos os workflows em paralelo, paginadas por cursor e só as novas
+"""
+
+import json
+import sqlite3
+import threading
+import requests
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from modules.db_migrations import migrate_database
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Converte os horários ISO 8601 da API do n8n ('...Z' ou com fuso)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+# Estados de execuções que ainda não terminaram
+PENDING_STATUSES = {"new", "running", "waiting"}
+
+def execution_row(workflow_id: str, execution: Dict[str, Any]) -> tuple:
+    """Linha da tabela n8n_executions a partir de uma execução da API
+
+    No n8n, `finished` só é verdadeiro para execuções bem-sucedidas; uma
+    execução com erro tem finished=false, mas já terminou (tem stoppedAt).
+    """
+    started = _parse_time(execution.get("startedAt"))
+    stopped = _parse_time(execution.get("stoppedAt"))
+    duration = (stopped - started).total_seconds() if started and stopped else None
+    status = execution.get("status")
+    if not status:
+        # Versões antigas da API não trazem status
+        status = "success" if execution.get("finished") else ("error" if stopped else "running")
+    finished = status not in PENDING_STATUSES and (bool(execution.get("finished")) or stopped is not None)
+    return (
+        int(execution["id"]),
+        str(execution.get("workflowId") or workflow_id),
+        status,
+        1 if finished else 0,
+        execution.get("mode"),
+        execution.get("startedAt"),
+        execution.get("stoppedAt"),
+        duration
+    )
+
+def node_rows(execution: Dict[str, Any]) -> List[tuple]:
+    """Linhas de n8n_node_runs a partir do runData de uma execução (includeData)
+
+    Um nó pode rodar várias vezes na mesma execução (laços, lotes); cada
+    rodada vira uma linha com seu índice.
+    """
+    run_data = ((execution.get("data") or {}).get("resultData") or {}).get("runData") or {}
+    rows = []
+    for node, runs in run_data.items():
+        for index, run in enumerate(runs or []):
+            status = run.get("executionStatus") or ("error" if run.get("error") else "success")
+            rows.append((int(execution["id"]), node, index, run.get("startTime"),
+                         run.get("executionTime"), status))
+    return rows
+
+class ExecutionIngestor:
+    """Copia as execuções do n8n para a tabela local n8n_executions
+
+    Cada workflow guarda a última execução ingerida; como a API devolve as
+    execuções da mais nova para a mais antiga, a paginação para assim que
+    alcança essa marca. Execuções ainda em andamento não avançam a marca e
+    são relidas (e atualizadas) na próxima ingestão.
+
+    Com `node_data`, as execuções vêm com o payload (includeData) para
+    guardar o tempo de cada nó, e a definição do workflow (nós e conexões)
+    é atualizada a cada ingestão; o payload em si não é armazenado.
+
+    Cada página é convertida em linhas e gravada antes da seguinte, com o
+    cursor da próxima página; se a ingestão falhar no meio, a próxima
+    retoma desse cursor em vez de recomeçar do topo. A marca só avança
+    quando a passada alcança a marca anterior, já que as páginas vêm das
+    mais novas para as mais antigas.
+    """
+
+    def __init__(self, n8n_url: str = "http://localhost:5678/api/v1", db_path: str = "queen_performance.db",
+                 api_key: Optional[str] = None, max_workers: int = 8, page_size: int = 250,
+                 timeout: float = 10.0, node_data: bool = True):
+        self.n8n_url = n8n_url.rstrip("/")
+        self.node_data = node_data
+        self.db_path = db_path
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.timeout = timeout
+        self._local = threading.local()
+        migrate_database(self.db_path, "performance")
+
+    def _session(self) -> requests.Session:
+        """Uma sessão (com keep-alive) por thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            if self.api_key:
+                session.headers["X-N8N-API-KEY"] = self.api_key
+            self._local.session = session
+        return session
+
+    def _get_page(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._session().get(f"{self.n8n_url}/{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def list_workflows(self, active_only: bool = True) -> List[str]:
+        """IDs de todos os workflows, percorrendo as páginas da API"""
+        workflow_ids, cursor = [], None
+        while True:
+            params = {"limit": self.page_size}
+            if active_only:
+                params["active"] = "true"
+            if cursor:
+                params["cursor"] = cursor
+            page = self._get_page("workflows", params)
+            workflow_ids.extend(str(workflow["id"]) for workflow in page.get("data", []))
+            cursor = page.get("nextCursor")
+            if not cursor:
+                return workflow_ids
+
+    def get_state(self, workflow_id: str) -> Tuple[int, Optional[str], Optional[int]]:
+        """(marca, cursor da passada interrompida, maior id dessa passada)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            row = conn.execute("""
+                SELECT last_execution_id, resume_cursor, resume_high
+                FROM n8n_ingest_state WHERE workflow_id = ?
+            """, (workflow_id,)).fetchone()
+            return tuple(row) if row else (0, None, None)
+        finally:
+            conn.close()
+
+    def get_watermark(self, workflow_id: str) -> int:
+        """Última execução já ingerida do workflow (0 se nenhuma)"""
+        return self.get_state(workflow_id)[0]
+
+    def iter_new_pages(self, workflow_id: str, since_id: int,
+                       cursor: Optional[str] = None) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Páginas de execuções com id maior que `since_id`: (execuções, cursor da próxima)
+
+        O cursor da próxima é None quando a página alcançou a marca ou era a
+        última. Numa ingestão incremental, uma sondagem de uma execução sem
+        payload evita baixar uma página inteira quando não há nada novo.
+        """
+        if since_id and cursor is None:
+            probe = self._get_page("executions", {"workflowId": workflow_id, "limit": 1, "includeData": "false"})
+            newest = probe.get("data", [])
+            if not newest or int(newest[0]["id"]) <= since_id:
+                return
+
+        while True:
+            params = {"workflowId": workflow_id, "limit": self.page_size,
+                      "includeData": "true" if self.node_data else "false"}
+            if cursor:
+                params["cursor"] = cursor
+            page = self._get_page("executions", params)
+
+            executions, reached = [], False
+            for execution in page.get("data", []):
+                if int(execution["id"]) <= since_id:
+                    reached = True
+                    break
+                executions.append(execution)
+
+            cursor = None if reached else page.get("nextCursor")
+            yield executions, cursor
+            if not cursor:
+                return
+
+    def fetch_workflow(self, workflow_id: str) -> Dict[str, Any]:
+        """Definição do workflow: nós e conexões"""
+        return self._get_page(f"workflows/{workflow_id}", {})
+
+    def _store_page(self, workflow_id: str, since_id: int, executions: List[Dict[str, Any]],
+                    next_cursor: Optional[str], high: int):
+        """Grava uma página e o ponto de retomada da passada na mesma transação"""
+        rows = [execution_row(workflow_id, execution) for execution in executions]
+        runs = [run for execution in executions for run in node_rows(execution)]
+
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.executemany("""
+                INSERT OR REPLACE INTO n8n_executions
+                (execution_id, workflow_id, status, finished, mode, started_at, stopped_at, duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.executemany("""
+                INSERT OR REPLACE INTO n8n_node_runs
+                (execution_id, node, run_index, started_at_ms, execution_time_ms, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, runs)
+            conn.execute("""
+                INSERT INTO n8n_ingest_state (workflow_id, last_execution_id, resume_cursor, resume_high, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(workflow_id) DO UPDATE SET
+                    resume_cursor = excluded.resume_cursor,
+                    resume_high = excluded.resume_high,
+                    updated_at = excluded.updated_at
+            """, (workflow_id, since_id, next_cursor, high))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _finish_pass(self, workflow_id: str, since_id: int, high: int) -> int:
+        """Avança a marca até antes da primeira execução não finalizada da passada"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            running = conn.execute("""
+                SELECT MIN(execution_id) FROM n8n_executions
+                WHERE workflow_id = ? AND finished = 0 AND execution_id > ? AND execution_id <= ?
+            """, (workflow_id, since_id, high)).fetchone()[0]
+            watermark = max(since_id, running - 1 if running else high)
+            conn.execute("""
+                UPDATE n8n_ingest_state
+                SET last_execution_id = ?, resume_cursor = NULL, resume_high = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE workflow_id = ?
+            """, (watermark, workflow_id))
+            conn.commit()
+        finally:
+            conn.close()
+        return watermark
+
+    def _ingest_pass(self, workflow_id: str, since_id: int, cursor: Optional[str] = None,
+                     high: Optional[int] = None) -> int:
+        """Percorre as páginas até a marca gravando uma a uma; retorna quantas execuções leu"""
+        count = 0
+        for executions, next_cursor in self.iter_new_pages(workflow_id, since_id, cursor):
+            if high is None:
+                if not executions:
+                    break
+                high = max(int(execution["id"]) for execution in executions)  # Primeira página: as mais novas
+            self._store_page(workflow_id, since_id, executions, next_cursor, high)
+            count += len(executions)
+        if high is not None:
+            self._finish_pass(workflow_id, since_id, high)
+        return count
+
+    def _store_workflow(self, workflow_id: str, workflow: Dict[str, Any]):
+        """Grava a definição do workflow (nós e conexões)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO n8n_workflows (workflow_id, name, nodes, connections, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (workflow_id, workflow.get("name"), json.dumps(workflow.get("nodes", [])),
+                  json.dumps(workflow.get("connections", {}))))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def ingest_workflow(self, workflow_id: str) -> int:
+        """Ingere as execuções novas de um workflow; retorna quantas foram gravadas"""
+        workflow_id = str(workflow_id)
+        since_id, cursor, high = self.get_state(workflow_id)
+        count = 0
+        if cursor:
+            # Termina a passada interrompida (das mais antigas até a marca) antes da nova
+            count += self._ingest_pass(workflow_id, since_id, cursor, high)
+            since_id = self.get_watermark(workflow_id)
+        count += self._ingest_pass(workflow_id, since_id)
+
+        # A definição só é relida quando há execuções novas para analisar
+        if self.node_data and (count or self.workflow_definition(workflow_id) is None):
+            self._store_workflow(workflow_id, self.fetch_workflow(workflow_id))
+        return count
+
+    def ingest_all(self, workflow_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Ingere todos os workflows (ativos, por padrão) em paralelo
+
+        Falhas de um workflow não interrompem os outros; ele fica com -1 no
+        resultado e sua marca não muda.
+        """
+        if workflow_ids is None:
+            try:
+                workflow_ids = self.list_workflows()
+            except (requests.RequestException, ValueError) as e:
+                print(f"Erro ao listar workflows do n8n: {e}")
+                return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.ingest_workflow, workflow_id): str(workflow_id)
+                       for workflow_id in workflow_ids}
+            for future in as_completed(futures):
+                workflow_id = futures[future]
+                try:
+                    results[workflow_id] = future.result()
+                except (requests.RequestException, ValueError, KeyError, sqlite3.Error) as e:
+                    print(f"Erro ao ingerir execuções do workflow {workflow_id}: {e}")
+                    results[workflow_id] = -1
+        return results
+
+    def executions(self, workflow_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Execuções ingeridas de um workflow, da mais nova para a mais antiga"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            query = "SELECT * FROM n8n_executions WHERE workflow_id = ? ORDER BY execution_id DESC"
+            params: List[Any] = [str(workflow_id)]
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def node_runs(self, workflow_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rodadas dos nós nas últimas `limit` execuções ingeridas do workflow"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            recent = "SELECT execution_id FROM n8n_executions WHERE workflow_id = ? ORDER BY execution_id DESC"
+            params: List[Any] = [str(workflow_id)]
+            if limit:
+                recent += " LIMIT ?"
+                params.append(limit)
+            rows = conn.execute(f"""
+                SELECT * FROM n8n_node_runs WHERE execution_id IN ({recent})
+                ORDER BY execution_id, started_at_ms
+            """, params)
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def workflow_definition(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """Última definição ingerida do workflow (nome, nós e conexões)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            row = conn.execute(
+                "SELECT name, nodes, connections FROM n8n_workflows WHERE workflow_id = ?", (str(workflow_id),)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {"id": str(workflow_id), "name": row[0], "nodes": json.loads(row[1] or "[]"),
+                "connections": json.loads(row[2] or "{}")}
@@ -0,0 +1,126 @@
+# modules/n8n_profile.py
+"""
+Perfil por Nó dos Workflows do n8n no Cérebro Digital da Queen
+Distribuição de latência de cada nó e caminho crítico pelo grafo de conexões
+"""
+
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+def node_latency_stats(node_runs: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Latência (s) de cada nó entre as execuções, da maior média para a menor
+
+    As rodadas repetidas de um nó na mesma execução (laços, lotes) são
+    somadas: o que importa é quanto aquele nó custou à execução.
+    """
+    columns = ["node", "executions", "mean", "p50", "p95", "max", "error_rate", "share"]
+    frame = pd.DataFrame(node_runs)
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    frame["seconds"] = frame["execution_time_ms"].fillna(0) / 1000.0
+    frame["failed"] = frame["status"] == "error"
+    per_execution = frame.groupby(["node", "execution_id"]).agg(
+        seconds=("seconds", "sum"), failed=("failed", "any")
+    ).reset_index()
+
+    stats = per_execution.groupby("node").agg(
+        executions=("execution_id", "nunique"),
+        mean=("seconds", "mean"),
+        p50=("seconds", "median"),
+        p95=("seconds", lambda s: s.quantile(0.95)),
+        max=("seconds", "max"),
+        error_rate=("failed", "mean")
+    ).reset_index()
+    total = per_execution["seconds"].sum()
+    stats["share"] = stats["node"].map(per_execution.groupby("node")["seconds"].sum()) / total if total else 0.0
+    return stats.sort_values("mean", ascending=False).reset_index(drop=True)[columns]
+
+def connection_graph(connections: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Sucessores de cada nó a partir do campo `connections` do workflow"""
+    graph: Dict[str, List[str]] = {}
+    for source, outputs in (connections or {}).items():
+        targets = graph.setdefault(source, [])
+        for output_type in outputs.values():
+            for branch in output_type or []:
+                for link in branch or []:
+                    if link.get("node") and link["node"] not in targets:
+                        targets.append(link["node"])
+    return graph
+
+def critical_path(graph: Dict[str, List[str]], weights: Dict[str, float]) -> Tuple[List[str], float]:
+    """Caminho de maior peso total do gatilho até um nó final
+
+    Laços (ex.: Split In Batches voltando para trás) têm as arestas de
+    retorno ignoradas; o custo das voltas já está somado no peso do nó.
+    """
+    nodes = set(graph) | {target for targets in graph.values() for target in targets} | set(weights)
+    order, state = [], {}
+
+    def visit(node: str):
+        # DFS iterativa: workflows grandes estourariam a recursão
+        stack = [(node, iter(graph.get(node, [])))]
+        state[node] = "open"
+        while stack:
+            current, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                state[current] = "done"
+                order.append(current)
+            elif child not in state:
+                state[child] = "open"
+                stack.append((child, iter(graph.get(child, []))))
+
+    for node in sorted(nodes):
+        if node not in state:
+            visit(node)
+    order.reverse()  # ordem topológica (arestas de retorno descartadas)
+
+    position = {node: index for index, node in enumerate(order)}
+    best: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for node in order:
+        if node not in best:
+            best[node], previous[node] = weights.get(node, 0.0), None
+        for child in graph.get(node, []):
+            if position[child] <= position[node]:
+                continue  # aresta de retorno
+            candidate = best[node] + weights.get(child, 0.0)
+            if candidate > best.get(child, float("-inf")):
+                best[child], previous[child] = candidate, node
+
+    if not best:
+        return [], 0.0
+    end = max(best, key=best.get)
+    path = [end]
+    while previous[path[-1]] is not None:
+        path.append(previous[path[-1]])
+    return path[::-1], best[end]
+
+def profile_workflow(node_runs: List[Dict[str, Any]],
+                     workflow: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Estatísticas por nó, caminho crítico e nós que dominam o tempo total"""
+    stats = node_latency_stats(node_runs)
+    if stats.empty:
+        return {}
+
+    node_types = {node.get("name"): node.get("type", "") for node in (workflow or {}).get("nodes", [])}
+    weights = dict(zip(stats["node"], stats["mean"]))
+    graph = connection_graph((workflow or {}).get("connections", {}))
+    path, path_time = critical_path(graph, weights) if graph else (list(stats["node"]), float(stats["mean"].sum()))
+
+    # Dominantes: nós do caminho crítico com ao menos 20% do seu tempo
+    bottlenecks = []
+    for node in path:
+        share = weights.get(node, 0.0) / path_time if path_time else 0.0
+        if share >= 0.2:
+            bottlenecks.append({"node": node, "type": node_types.get(node, ""), "share": share,
+                                "p95": float(stats.loc[stats["node"] == node, "p95"].iloc[0])})
+    bottlenecks.sort(key=lambda item: item["share"], reverse=True)
+
+    nodes = stats.to_dict("records")
+    for node in nodes:
+        node["type"] = node_types.get(node["node"], "")
+    return {"nodes": nodes, "critical_path": path, "critical_path_time": path_time,
+            "bottlenecks": bottlenecks}
@@ -0,0 +1,97 @@
+# modules/ollama_metrics.py
+"""
+Métricas do Ollama do Cérebro Digital da Queen
+Converte os tempos devolvidos pelo /api/generate em métricas por modelo e tarefa
+"""
+
+import time
+import threading
+from typing import Any, Dict, Tuple
+
+from modules.auto_optimizer import PerformanceMonitor, MetricRingBuffer
+
+# Campos de duração da resposta (nanossegundos) -> métrica em segundos
+_DURATION_FIELDS = {
+    "total_duration": "ollama_total_time",
+    "load_duration": "ollama_load_time",
+    "prompt_eval_duration": "ollama_prompt_eval_time",
+    "eval_duration": "ollama_eval_time"
+}
+
+# Fases da latência: uma carga de modelo a frio não é gargalo a otimizar,
+# a latência percebida continua coberta por response_time
+_PHASE_METRICS = list(_DURATION_FIELDS.values()) + ["ollama_client_time", "ollama_queue_time"]
+
+class OllamaTimingRecorder:
+    """Registra os tempos do servidor Ollama e deriva tokens/s e tempo de fila"""
+
+    def __init__(self, monitor: PerformanceMonitor, history: int = 100):
+        self.monitor = monitor
+        self.history = history
+        self._series: Dict[Tuple[str, str], Dict[str, MetricRingBuffer]] = {}
+        self._lock = threading.Lock()
+        monitor.exclude_from_bottlenecks(_PHASE_METRICS)
+
+    def record(self, data: Dict[str, Any], client_latency: float,
+               model: str, task: str = "chat") -> Dict[str, float]:
+        """Registra uma resposta do Ollama; retorna as métricas derivadas"""
+        metrics: Dict[str, float] = {}
+
+        for field, metric in _DURATION_FIELDS.items():
+            if data.get(field) is not None:
+                metrics[metric] = data[field] / 1e9
+
+        for field, metric in (("prompt_eval_count", "ollama_prompt_tokens"),
+                              ("eval_count", "ollama_eval_tokens")):
+            if data.get(field) is not None:
+                metrics[metric] = float(data[field])
+
+        # Tokens por segundo do processamento do prompt e da geração
+        if metrics.get("ollama_prompt_eval_time") and "ollama_prompt_tokens" in metrics:
+            metrics["ollama_prompt_tokens_per_sec"] = (
+                metrics["ollama_prompt_tokens"] / metrics["ollama_prompt_eval_time"]
+            )
+        if metrics.get("ollama_eval_time") and "ollama_eval_tokens" in metrics:
+            metrics["ollama_eval_tokens_per_sec"] = (
+                metrics["ollama_eval_tokens"] / metrics["ollama_eval_time"]
+            )
+
+        # O que o cliente esperou além do trabalho do servidor: rede e fila
+        metrics["ollama_client_time"] = client_latency
+        if "ollama_total_time" in metrics:
+            metrics["ollama_queue_time"] = max(client_latency - metrics["ollama_total_time"], 0.0)
+
+        context = f"model={model} task={task}"
+        for name, value in metrics.items():
+            self.monitor.record_metric(name, value, context)
+
+        self._remember(model, task, metrics)
+        return metrics
+
+    def _remember(self, model: str, task: str, metrics: Dict[str, float]):
+        """Guarda o histórico recente por modelo e tarefa"""
+        now = time.time()
+        with self._lock:
+            series = self._series.setdefault((model, task), {})
+            for name, value in metrics.items():
+                buffer = series.get(name)
+                if buffer is None:
+                    buffer = series[name] = MetricRingBuffer(self.history)
+                buffer.append(now, value)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Médias recentes por 'modelo/tarefa'"""
+        with self._lock:
+            items = [(key, dict(series)) for key, series in self._series.items()]
+
+        result = {}
+        for (model, task), series in items:
+            entry: Dict[str, Any] = {"model": model, "task": task}
+            for name, buffer in series.items():
+                values = buffer.values()
+                if values:
+                    entry[name] = sum(values) / len(values)
+            entry["samples"] = len(series["ollama_client_time"]) if "ollama_client_time" in series else 0
+            result[f"{model}/{task}"] = entry
+
+        return result
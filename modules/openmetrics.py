@@ -0,0 +1,278 @@
+# modules/openmetrics.py
+"""
+Exposição de Métricas do Cérebro Digital da Queen
+Endpoint HTTP local no formato Prometheus/OpenMetrics, servido dos agregados em memória
+"""
+
+import re
+import math
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Limites (segundos) dos baldes de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+    """Histograma cumulativo de baldes fixos (contadores desde o início do processo)"""
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Conta um valor no primeiro balde com limite >= valor"""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        """(baldes cumulativos (limite, contagem) incluindo +Inf, soma, contagem)"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+
+        cumulative, running = [], 0
+        for bound, bucket in zip(self.bounds + (math.inf,), counts):
+            running += bucket
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+class MetricFamily:
+    """Uma família de métricas (nome, tipo, ajuda) e suas amostras rotuladas"""
+
+    def __init__(self, name: str, kind: str, help_text: str, unit: str = ""):
+        self.name = sanitize_name(name)
+        self.kind = kind  # counter | gauge | histogram
+        self.help = help_text
+        self.unit = unit
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, value: float, labels: Optional[Dict[str, str]] = None, suffix: str = ""):
+        """Adiciona uma amostra (contadores recebem o sufixo _total na renderização)"""
+        self.samples.append((suffix, dict(labels or {}), float(value)))
+
+    def add_histogram(self, histogram: Histogram, labels: Optional[Dict[str, str]] = None):
+        """Adiciona baldes, soma e contagem de um histograma"""
+        labels = dict(labels or {})
+        buckets, total, count = histogram.snapshot()
+        for bound, cumulative in buckets:
+            self.add(cumulative, dict(labels, le=_format_value(bound)), "_bucket")
+        self.add(total, labels, "_sum")
+        self.add(count, labels, "_count")
+
+def sanitize_name(name: str) -> str:
+    """Converte para um nome de métrica válido"""
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return name if not name[:1].isdigit() else f"_{name}"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{sanitize_name(k)}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def render(families: Iterable[MetricFamily], openmetrics: bool = True) -> str:
+    """Texto de exposição; OpenMetrics termina com '# EOF'"""
+    lines = []
+    for family in families:
+        name = family.name
+        # No formato Prometheus clássico o nome do contador já inclui _total
+        declared = name if openmetrics or family.kind != "counter" else f"{name}_total"
+
+        lines.append(f"# HELP {declared} {_escape(family.help)}")
+        lines.append(f"# TYPE {declared} {family.kind}")
+        if openmetrics and family.unit:
+            lines.append(f"# UNIT {declared} {family.unit}")
+
+        for suffix, labels, value in family.samples:
+            if family.kind == "counter" and not suffix:
+                suffix = "_total"
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """Servidor HTTP local que expõe /metrics a partir dos coletores registrados"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464):
+        self.host = host
+        self.port = port
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """Registra uma função que devolve famílias de métricas"""
+        self._collectors.append(collector)
+
+    def collect(self) -> List[MetricFamily]:
+        """Executa os coletores e junta famílias com o mesmo nome"""
+        merged: Dict[str, MetricFamily] = {}
+        for collector in self._collectors:
+            try:
+                for family in collector():
+                    if family.name in merged:
+                        merged[family.name].samples.extend(family.samples)
+                    else:
+                        merged[family.name] = family
+            except Exception as e:
+                print(f"Erro no coletor de métricas: {e}")
+        return list(merged.values())
+
+    def start(self) -> bool:
+        """Sobe o servidor em segundo plano; False se a porta estiver ocupada"""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                body = render(exporter.collect(), openmetrics).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sem log por requisição de scrape
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Erro ao iniciar endpoint de métricas em {self.host}:{self.port}: {e}")
+            return False
+
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Para o servidor"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Coletores dos componentes: leem só contadores em memória, nunca o banco
+
+def collect_monitor(monitor) -> List[MetricFamily]:
+    """Amostras, último valor, histogramas e percentis recentes do PerformanceMonitor"""
+    samples = MetricFamily("queen_metric_samples", "counter", "Amostras registradas por métrica")
+    last = MetricFamily("queen_metric_last", "gauge", "Último valor registrado por métrica")
+    latency = MetricFamily("queen_latency_seconds", "histogram",
+                           "Latência das métricas _time desde o início do processo", "seconds")
+    window = MetricFamily("queen_latency_window_seconds", "gauge",
+                          "Percentis de latência na janela recente do monitor", "seconds")
+    queue = MetricFamily("queen_queue_depth", "gauge", "Itens aguardando em filas internas")
+
+    for name, buffer in list(monitor.metrics.items()):
+        samples.add(buffer.total, {"metric": name})
+        recent = buffer.values(1)
+        if recent:
+            last.add(recent[0], {"metric": name})
+
+    for name, histogram in list(monitor.histograms.items()):
+        latency.add_histogram(histogram, {"metric": name})
+        sketch = monitor.get_sketch(name, monitor.bottleneck_window_minutes)
+        if sketch is not None:
+            for quantile in (0.5, 0.9, 0.99):
+                window.add(sketch.quantile(quantile), {"metric": name, "quantile": str(quantile)})
+
+    queue.add(monitor.pending_count, {"queue": "metrics_flush"})
+    return [samples, last, latency, window, queue]
+
+def collect_agents(manager) -> List[MetricFamily]:
+    """Tarefas, sucesso e latência por agente do AgentManager"""
+    tasks = MetricFamily("queen_agent_tasks", "counter", "Tarefas executadas por agente e resultado")
+    duration = MetricFamily("queen_agent_task_duration_seconds", "histogram",
+                            "Tempo de execução das tarefas por agente", "seconds")
+    busy = MetricFamily("queen_agent_busy", "gauge", "1 se o agente está ocupado")
+    queue = MetricFamily("queen_queue_depth", "gauge", "Itens aguardando em filas internas")
+
+    for agent_id, stats in manager.task_stats():
+        tasks.add(stats["success"], {"agent": agent_id, "result": "success"})
+        tasks.add(stats["failure"], {"agent": agent_id, "result": "failure"})
+        duration.add_histogram(stats["duration"], {"agent": agent_id})
+    for agent_id, agent in list(manager.agents.items()):
+        busy.add(1 if agent.status.value == "busy" else 0, {"agent": agent_id})
+
+    queue.add(manager.queue_depth, {"queue": "agent_tasks"})
+    return [tasks, duration, busy, queue]
+
+def collect_cache(cache, name: str = "response") -> List[MetricFamily]:
+    """Acertos, falhas, ocupação e taxa de acerto de um cache"""
+    requests_family = MetricFamily("queen_cache_requests", "counter", "Consultas ao cache por resultado")
+    entries = MetricFamily("queen_cache_entries", "gauge", "Entradas no cache")
+    ratio = MetricFamily("queen_cache_hit_ratio", "gauge", "Fração de consultas atendidas pelo cache")
+
+    hits, misses = cache.hits, cache.misses
+    requests_family.add(hits, {"cache": name, "result": "hit"})
+    requests_family.add(misses, {"cache": name, "result": "miss"})
+    entries.add(len(cache), {"cache": name})
+    ratio.add(hits / (hits + misses) if hits + misses else 0.0, {"cache": name})
+    return [requests_family, entries, ratio]
+
+def collect_media(orchestrator) -> List[MetricFamily]:
+    """Gerações de mídia por tipo e resultado, com latência"""
+    requests_family = MetricFamily("queen_media_requests", "counter", "Gerações de mídia por tipo e resultado")
+    duration = MetricFamily("queen_media_duration_seconds", "histogram",
+                            "Tempo de geração de mídia por tipo", "seconds")
+    queue = MetricFamily("queen_queue_depth", "gauge", "Itens aguardando em filas internas")
+
+    for kind, stats in orchestrator.media_stats():
+        requests_family.add(stats["success"], {"kind": kind, "result": "success"})
+        requests_family.add(stats["failure"], {"kind": kind, "result": "failure"})
+        duration.add_histogram(stats["duration"], {"kind": kind})
+
+    queue.add(orchestrator.in_flight, {"queue": "media"})
+    return [requests_family, duration, queue]
+
+def collect_runtime(switches=None, optimizer=None, tracer=None, summarizer=None) -> List[MetricFamily]:
+    """Chaves de execução, tentativa do otimizador e filas de exportação"""
+    families = []
+    queue = MetricFamily("queen_queue_depth", "gauge", "Itens aguardando em filas internas")
+
+    if switches is not None:
+        enabled = MetricFamily("queen_switch_enabled", "gauge", "1 se a chave de execução está ligada")
+        for name, value in switches.snapshot().items():
+            enabled.add(1 if value else 0, {"switch": name})
+        families.append(enabled)
+
+    if optimizer is not None:
+        trial = MetricFamily("queen_optimizer_trial_active", "gauge", "1 se há otimização em avaliação")
+        trial.add(1 if optimizer.active_trial else 0)
+        families.append(trial)
+
+    if tracer is not None:
+        queue.add(tracer.pending_count, {"queue": "trace_spans"})
+    if summarizer is not None:
+        queue.add(summarizer.queue_depth, {"queue": "summaries"})
+
+    families.append(queue)
+    return families
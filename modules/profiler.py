@@ -0,0 +1,297 @@
+# modules/profiler.py
+"""
+Profiling sob Demanda do Cérebro Digital da Queen
+Perfila as próximas N requisições (cProfile ou amostragem de pilha) com diff de tracemalloc
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import sqlite3
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from modules.db_migrations import migrate_database, DEFAULT_DATABASES
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+class StackSampler:
+    """Profiler por amostragem: lê a pilha de uma thread em intervalos fixos"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Pilhas no formato 'collapsed' (uma por linha), aceito por geradores de flame graph"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class ProfilingController:
+    """Arma o profiling das próximas N chamadas e grava os artefatos com data
+
+    Pode ser armado pela interface, pelo otimizador ou por outro processo
+    (scripts/profiling.py), que grava o arquivo ARM no diretório de saída.
+    Cada sessão concluída vira uma linha em optimization_history com o
+    caminho dos artefatos.
+
+    Só a thread que executa a chamada perfilada é medida, nos dois modos:
+    o trabalho feito em outras threads (ex.: o pool de buscas do
+    RetrievalPlanner) não aparece nos artefatos.
+    """
+
+    ARM_FILE = "ARM"
+
+    def __init__(self, output_dir: str = "profiles", db_path: str = DEFAULT_DATABASES["performance"],
+                 sample_interval: float = 0.005, top: int = 30):
+        self.output_dir = output_dir
+        self.db_path = db_path
+        self.sample_interval = sample_interval
+        self.top = top
+        self._session: Optional[Dict[str, Any]] = None
+        self._busy = False
+        self._lock = threading.Lock()
+
+    @property
+    def armed(self) -> bool:
+        return self._session is not None
+
+    def arm(self, calls: int = 5, mode: str = "cprofile", reason: str = "manual",
+            metric: Optional[str] = None, memory: bool = True) -> bool:
+        """Perfila as próximas `calls` chamadas; retorna False se já houver sessão armada"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de profiling desconhecido: {mode}")
+
+        with self._lock:
+            if self._session is not None:
+                return False
+
+            slug = re.sub(r"[^a-z0-9]+", "-", reason.lower()).strip("-")[:40] or "manual"
+            self._session = {
+                "calls": max(1, int(calls)),
+                "mode": mode,
+                "reason": reason,
+                "metric": metric,
+                "memory": memory,
+                "done": 0,
+                "dir": os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{slug}"),
+                "artifacts": []
+            }
+        print(f"Profiling armado: {calls} chamadas ({mode}, {reason})")
+        return True
+
+    def disarm(self):
+        """Cancela a sessão armada (as chamadas já perfiladas são descartadas)"""
+        with self._lock:
+            self._session = None
+
+    def _check_arm_file(self):
+        """Consome um pedido gravado por outro processo"""
+        path = os.path.join(self.output_dir, self.ARM_FILE)
+        if not os.path.exists(path):
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                request = json.load(f)
+            os.remove(path)
+            self.arm(
+                calls=request.get("calls", 5),
+                mode=request.get("mode", "cprofile"),
+                reason=request.get("reason", "cli"),
+                memory=request.get("memory", True)
+            )
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler pedido de profiling: {e}")
+
+    @contextmanager
+    def profile(self, name: str):
+        """Perfila o bloco se houver sessão armada (uma chamada por vez)"""
+        self._check_arm_file()
+
+        with self._lock:
+            session = self._session
+            if session is None or self._busy:
+                session = None
+            else:
+                self._busy = True
+
+        if session is None:
+            yield None
+            return
+
+        index = session["done"] + 1
+        profiler = sampler = None
+        started_tracing = False
+        before = None
+
+        if session["memory"]:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        if session["mode"] == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+
+        start = time.perf_counter()
+        try:
+            yield session
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+
+            after = tracemalloc.take_snapshot() if before is not None else None
+            if started_tracing:
+                tracemalloc.stop()
+
+            try:
+                files = self._save_call(session, index, name, elapsed, profiler, sampler, before, after)
+            except Exception as e:
+                print(f"Erro ao salvar profiling: {e}")
+                files = []
+
+            with self._lock:
+                self._busy = False
+                session["artifacts"].extend(files)
+                session["done"] = index
+                finished = self._session is session and index >= session["calls"]
+                if finished:
+                    self._session = None
+
+            if finished:
+                self._finish(session)
+
+    def _save_call(self, session: Dict[str, Any], index: int, name: str, elapsed: float,
+                   profiler: Optional[cProfile.Profile], sampler: Optional[StackSampler],
+                   before, after) -> List[str]:
+        """Grava os artefatos de uma chamada; retorna os caminhos"""
+        os.makedirs(session["dir"], exist_ok=True)
+        prefix = os.path.join(session["dir"], f"{index:02d}_{name}")
+        files = []
+
+        report = io.StringIO()
+        report.write(f"{name} #{index}: {elapsed:.3f}s ({session['mode']})\n\n")
+
+        if profiler is not None:
+            profiler.dump_stats(prefix + ".prof")
+            files.append(prefix + ".prof")
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats("cumulative").print_stats(self.top)
+
+        if sampler is not None:
+            with open(prefix + ".stacks", "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+            files.append(prefix + ".stacks")
+            report.write(f"Amostras: {sampler.samples} (a cada {self.sample_interval * 1000:.0f} ms)\n")
+            leaves = Counter()
+            for stack, count in sampler.stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            for frame, count in leaves.most_common(self.top):
+                report.write(f"{count:6d}  {frame}\n")
+
+        if before is not None and after is not None:
+            report.write("\nAlocações (tracemalloc, diferença por linha):\n")
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+            for stat in diff[:self.top]:
+                report.write(f"{stat}\n")
+
+        with open(prefix + ".txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        files.append(prefix + ".txt")
+        return files
+
+    def _finish(self, session: Dict[str, Any]):
+        """Registra a sessão concluída em optimization_history"""
+        print(f"Profiling concluído: {session['dir']}")
+        try:
+            migrate_database(self.db_path, "performance")
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("""
+                INSERT INTO optimization_history
+                (optimization_type, description, action, metric_name, artifact)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                "profiling",
+                f"Profiling de {session['done']} chamadas ({session['reason']})",
+                session["mode"],
+                session["metric"],
+                session["dir"]
+            ))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Erro ao registrar profiling: {e}")
+
+    def recent_sessions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Sessões de profiling registradas, da mais recente à mais antiga"""
+        migrate_database(self.db_path, "performance")
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("""
+            SELECT timestamp, description, action, metric_name, artifact
+            FROM optimization_history WHERE optimization_type = 'profiling'
+            ORDER BY id DESC LIMIT ?
+        """, (limit,)).fetchall()
+        conn.close()
+
+        return [
+            {"timestamp": r[0], "description": r[1], "mode": r[2], "metric": r[3], "artifact": r[4]}
+            for r in rows
+        ]
+
+def request_profiling(output_dir: str = "profiles", calls: int = 5, mode: str = "cprofile",
+                      reason: str = "cli", memory: bool = True) -> str:
+    """Grava o pedido de profiling lido pela aplicação em execução"""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de profiling desconhecido: {mode}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, ProfilingController.ARM_FILE)
+    # Grava e renomeia para a aplicação nunca ler um pedido pela metade
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"calls": calls, "mode": mode, "reason": reason, "memory": memory}, f)
+    os.replace(path + ".tmp", path)
+    return path
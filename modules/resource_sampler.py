@@ -0,0 +1,189 @@
+# modules/resource_sampler.py
+"""
+Amostragem de Recursos do Cérebro Digital da Queen
+Memória, CPU, threads, descritores, GC e heap do SQLite do próprio processo
+"""
+
+import gc
+import os
+import sys
+import ctypes
+import ctypes.util
+import threading
+import psutil
+from typing import Callable, Dict, Optional
+
+def _load_library(name: str):
+    """Carrega uma biblioteca nativa pelo nome, se disponível"""
+    path = ctypes.util.find_library(name)
+    if not path:
+        return None
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+def _load_sqlite_library():
+    """Abre o SQLite usado pelo módulo sqlite3 do Python, não o do sistema
+
+    O dlopen da extensão _sqlite3 expõe os símbolos dela e de suas dependências:
+    cobre tanto o SQLite embutido estaticamente quanto o libsqlite3 ao qual ela
+    está ligada. No Windows a DLL fica ao lado da extensão. Sem acesso a esse
+    SQLite, os contadores ficam indisponíveis (nunca lidos de outra cópia).
+    """
+    try:
+        import _sqlite3
+    except ImportError:
+        return None
+
+    path = getattr(_sqlite3, "__file__", None)
+    if not path:
+        return None  # Extensão embutida no interpretador
+    candidates = [path]
+    if sys.platform == "win32":
+        candidates.append(os.path.join(os.path.dirname(path), "sqlite3.dll"))
+
+    for candidate in candidates:
+        try:
+            lib = ctypes.CDLL(candidate)
+            lib.sqlite3_memory_used
+            lib.sqlite3_release_memory
+            return lib
+        except (OSError, AttributeError):
+            continue
+    return None
+
+_sqlite_lib = _load_sqlite_library()
+if _sqlite_lib is not None:
+    _sqlite_lib.sqlite3_memory_used.restype = ctypes.c_int64
+    _sqlite_lib.sqlite3_release_memory.argtypes = [ctypes.c_int]
+
+_libc = _load_library("c") if sys.platform.startswith("linux") else None
+
+def sqlite_memory_used() -> Optional[int]:
+    """Bytes do heap inteiro do SQLite no processo (não só o cache de páginas; None se não acessível)"""
+    if _sqlite_lib is None:
+        return None
+    return int(_sqlite_lib.sqlite3_memory_used())
+
+def release_native_memory() -> Dict[str, int]:
+    """Pede ao SQLite e ao malloc que devolvam memória livre ao sistema"""
+    released = {}
+    if _sqlite_lib is not None:
+        released["sqlite"] = int(_sqlite_lib.sqlite3_release_memory(2 ** 30))
+    if _libc is not None and hasattr(_libc, "malloc_trim"):
+        released["malloc_trim"] = int(_libc.malloc_trim(0))
+    return released
+
+class ResourceSampler:
+    """Thread que registra periodicamente o consumo de recursos do processo
+
+    Quando o uso de memória passa do limite da regra memory_usage do
+    otimizador, dispara as ações dessa regra (limpar caches, GC).
+    """
+
+    def __init__(self, monitor, optimizer=None, interval: float = 10.0,
+                 memory_budget: Optional[int] = None):
+        self.monitor = monitor
+        self.optimizer = optimizer
+        self.interval = interval
+        self.process = psutil.Process()
+        # Uso de memória é medido contra este orçamento (padrão: RAM total)
+        self.memory_budget = memory_budget or psutil.virtual_memory().total
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_sample: Dict[str, float] = {}
+        # Medidores extras da aplicação (ex.: profundidade de filas)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self.process.cpu_percent(None)  # Primeira leitura só inicia a medição
+
+    def sample(self) -> Dict[str, float]:
+        """Lê os recursos do processo e os registra como métricas"""
+        with self.process.oneshot():
+            rss = self.process.memory_info().rss
+            metrics = {
+                "process_rss_bytes": float(rss),
+                "process_cpu_percent": self.process.cpu_percent(None),
+                "process_threads": float(self.process.num_threads())
+            }
+            if hasattr(self.process, "num_fds"):
+                metrics["process_open_fds"] = float(self.process.num_fds())
+            elif hasattr(self.process, "num_handles"):
+                metrics["process_open_fds"] = float(self.process.num_handles())
+
+        for generation, count in enumerate(gc.get_count()):
+            metrics[f"gc_gen{generation}_objects"] = float(count)
+
+        sqlite_bytes = sqlite_memory_used()
+        if sqlite_bytes is not None:
+            metrics["sqlite_memory_bytes"] = float(sqlite_bytes)
+
+        metrics["memory_usage"] = rss / self.memory_budget
+        metrics["system_memory_usage"] = self.system_memory_usage()
+
+        for name, gauge in list(self._gauges.items()):
+            try:
+                metrics[name] = float(gauge())
+            except Exception as e:
+                print(f"Erro ao ler medidor {name}: {e}")
+
+        for name, value in metrics.items():
+            self.monitor.record_metric(name, value, "resource")
+
+        self.last_sample = metrics
+        return metrics
+
+    def register_gauge(self, name: str, gauge: Callable[[], float]):
+        """Registra um medidor lido e gravado a cada amostra"""
+        self._gauges[name] = gauge
+
+    def memory_usage(self) -> float:
+        """Fração do orçamento de memória em uso pelo processo"""
+        return self.process.memory_info().rss / self.memory_budget
+
+    def system_memory_usage(self) -> float:
+        """Fração da memória do sistema em uso"""
+        return psutil.virtual_memory().percent / 100
+
+    def check(self) -> Dict[str, float]:
+        """Amostra e, sob pressão de memória, aciona a regra do otimizador"""
+        metrics = self.sample()
+        if self.optimizer is None:
+            return metrics
+
+        threshold = self.optimizer.optimization_rules['memory_usage']['threshold']
+        pressure = max(metrics["memory_usage"], metrics["system_memory_usage"])
+        if pressure > threshold:
+            metric = "memory_usage" if metrics["memory_usage"] > threshold else "system_memory_usage"
+            self.optimizer.relieve_memory({
+                'type': 'memory_usage',
+                'metric': metric,
+                'value': metrics[metric],
+                'average_value': metrics[metric],
+                'severity': 'critical' if pressure > 0.95 else 'high'
+            }, measure=self.memory_usage if metric == "memory_usage" else self.system_memory_usage)
+
+        return metrics
+
+    def start(self):
+        """Inicia a amostragem em segundo plano"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a amostragem e aguarda a thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _loop(self):
+        """Amostra a cada intervalo até ser parado"""
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Erro ao amostrar recursos: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,407 @@
+# modules/retrieval_planner.py
+"""
+Planejador de Recuperação de Contexto do Cérebro Digital da Queen
+Executa buscas de sessão, lexical (FTS), semântica e na documentação em
+paralelo e combina os candidatos em um único ranking
+"""
+
+import os
+import math
+import time
+import heapq
+import contextvars
+import sqlite3
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from modules.embeddings import HashingEmbedder, vector_to_blob, blob_to_vector
+from modules.db_migrations import migrate_database
+from modules.text_search import search_terms, bm25_relevance
+from modules.tracing import span
+
+@dataclass
+class RetrievalCandidate:
+    """Candidato de contexto retornado por uma das fontes"""
+    source: str
+    key: str
+    prompt: str
+    response: str
+    relevance: float
+    confidence: float
+    timestamp: Optional[str] = None
+    score: float = 0.0
+
+@dataclass
+class ScoringWeights:
+    """Pesos da função de pontuação do ranking"""
+    relevance: float = 0.6
+    recency: float = 0.25
+    confidence: float = 0.15
+    recency_half_life_hours: float = 24.0
+    # Recência atribuída a candidatos sem data (ex.: trechos da documentação)
+    undated_recency: float = 0.5
+
+class RetrievalPlanner:
+    """Planejador único de recuperação de contexto"""
+
+    def __init__(self, db_path: str = 'queen_memory.db', embedder=None,
+                 weights: Optional[ScoringWeights] = None, candidates_per_source: int = 5,
+                 doc_index=None, min_doc_score: float = 0.3,
+                 reserved_slots: Optional[Dict[str, int]] = None,
+                 min_reserved_relevance: Optional[Dict[str, float]] = None):
+        self.db_path = db_path
+        self.embedder = embedder or HashingEmbedder()
+        self.weights = weights or ScoringWeights()
+        self.candidates_per_source = candidates_per_source
+        self.doc_index = doc_index
+        # Score absoluto da busca na documentação; abaixo dele o trecho nem concorre à vaga reservada
+        self.min_doc_score = min_doc_score
+        # Vagas mínimas por fonte: os turnos da sessão, sempre recentes, não tomam todo o top-k
+        self.reserved_slots = {"docs": 1, "lexical": 1} if reserved_slots is None else reserved_slots
+        # Relevância mínima para ocupar a vaga reservada: um casamento fraco concorre só pela pontuação
+        self.min_reserved_relevance = {"lexical": 0.5} if min_reserved_relevance is None else min_reserved_relevance
+        self.fts_enabled = False
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._vector_lock = threading.Lock()
+        self._vector_ids = np.zeros(0, dtype=np.int64)
+        self._vector_matrix = None
+        self._last_vector_id = 0
+        self._last_memory_id = 0
+        self._init_db()
+
+    def _init_db(self):
+        """Garante os índices FTS e de embeddings da memória"""
+        migrate_database(self.db_path, "memory")
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'memory_fts'")
+        self.fts_enabled = cursor.fetchone() is not None
+        conn.close()
+
+        if not self.fts_enabled:
+            print("FTS5 indisponível, usando busca por LIKE")
+
+    def index_memory(self, memory_id: int, prompt: str):
+        """Gera e grava o embedding de uma memória"""
+        vector = self.embedder.embed([prompt or ""])[0]
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO memory_embeddings (memory_id, dim, vector) VALUES (?, ?, ?)",
+            (memory_id, len(vector), vector_to_blob(vector))
+        )
+        conn.commit()
+        conn.close()
+
+    def retrieve(self, prompt: str, session_id: Optional[str] = None, k: int = 5) -> Dict[str, Any]:
+        """Executa as buscas em paralelo e retorna o top-k com tempos por fonte"""
+        total_start = time.perf_counter()
+
+        lookups = {
+            "session": (self._session_lookup, (prompt, session_id)),
+            "lexical": (self._lexical_lookup, (prompt,)),
+            "semantic": (self._semantic_lookup, (prompt,))
+        }
+        if self.doc_index is not None:
+            lookups["docs"] = (self._docs_lookup, (prompt,))
+        # Cada busca roda no contexto atual para herdar o span pai
+        futures = {
+            source: self._executor.submit(contextvars.copy_context().run, self._timed, source, func, *args)
+            for source, (func, args) in lookups.items()
+        }
+
+        timings = {}
+        candidates: Dict[str, RetrievalCandidate] = {}
+        for source, future in futures.items():
+            try:
+                results, elapsed = future.result()
+            except Exception as e:
+                print(f"Erro na busca {source}: {e}")
+                results, elapsed = [], 0.0
+            timings[source] = elapsed
+
+            # Mesma memória encontrada por fontes diferentes fica com a maior relevância
+            for candidate in results:
+                existing = candidates.get(candidate.key)
+                if existing is None or candidate.relevance > existing.relevance:
+                    candidates[candidate.key] = candidate
+
+        merge_start = time.perf_counter()
+        now = datetime.utcnow()
+        for candidate in candidates.values():
+            candidate.score = self.score(candidate, now)
+        top = self._select_top(list(candidates.values()), k)
+        timings["merge"] = time.perf_counter() - merge_start
+        timings["total"] = time.perf_counter() - total_start
+
+        return {
+            "results": [asdict(c) for c in top],
+            "timings": timings
+        }
+
+    def _select_top(self, candidates: List[RetrievalCandidate], k: int) -> List[RetrievalCandidate]:
+        """Top-k por pontuação respeitando as vagas reservadas por fonte"""
+        ranked = sorted(candidates, key=lambda c: c.score, reverse=True)
+
+        chosen = []
+        for source, slots in self.reserved_slots.items():
+            floor = self.min_reserved_relevance.get(source, 0.0)
+            chosen.extend([c for c in ranked if c.source == source and c.relevance >= floor][:slots])
+        chosen = heapq.nlargest(k, chosen, key=lambda c: c.score)
+
+        taken = {c.key for c in chosen}
+        for candidate in ranked:
+            if len(chosen) >= k:
+                break
+            if candidate.key not in taken:
+                chosen.append(candidate)
+                taken.add(candidate.key)
+
+        chosen.sort(key=lambda c: c.score, reverse=True)
+        return chosen
+
+    def score(self, candidate: RetrievalCandidate, now: Optional[datetime] = None) -> float:
+        """Pontua um candidato por relevância, recência e confiança"""
+        now = now or datetime.utcnow()
+        recency = self.weights.undated_recency
+        if candidate.timestamp:
+            recency = 0.0
+            try:
+                age_hours = max((now - datetime.fromisoformat(str(candidate.timestamp))).total_seconds() / 3600, 0.0)
+                recency = math.exp(-math.log(2) * age_hours / self.weights.recency_half_life_hours)
+            except ValueError:
+                pass
+
+        return (self.weights.relevance * candidate.relevance
+                + self.weights.recency * recency
+                + self.weights.confidence * candidate.confidence)
+
+    def _timed(self, source: str, func, *args):
+        """Executa uma busca medindo seu tempo"""
+        with span(f"retrieval.{source}") as current:
+            start = time.perf_counter()
+            results = func(*args)
+            if current is not None:
+                current.set_attribute("candidates", len(results))
+            return results, time.perf_counter() - start
+
+    def _tokens(self, text: str) -> List[str]:
+        """Extrai termos relevantes para a busca"""
+        return search_terms(text)
+
+    def _session_lookup(self, prompt: str, session_id: Optional[str]) -> List[RetrievalCandidate]:
+        """Turnos recentes da sessão atual"""
+        if not session_id:
+            return []
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, user_input, ai_response, timestamp
+            FROM conversations
+            WHERE session_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (session_id, self.candidates_per_source))
+        rows = cursor.fetchall()
+        conn.close()
+
+        query_terms = set(self._tokens(prompt))
+        candidates = []
+        for row_id, user_input, ai_response, timestamp in rows:
+            turn_terms = set(self._tokens(f"{user_input} {ai_response}"))
+            overlap = len(query_terms & turn_terms) / len(query_terms | turn_terms) if query_terms else 0.0
+            candidates.append(RetrievalCandidate(
+                source="session",
+                key=f"conversation:{row_id}",
+                prompt=user_input,
+                response=ai_response,
+                relevance=0.5 + 0.5 * overlap,
+                confidence=1.0,
+                timestamp=timestamp
+            ))
+
+        return candidates
+
+    def _lexical_lookup(self, prompt: str) -> List[RetrievalCandidate]:
+        """Busca lexical na memória (FTS5 com BM25)"""
+        terms = self._tokens(prompt)
+        if not terms:
+            return []
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        if self.fts_enabled:
+            match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+            cursor.execute("""
+                SELECT m.id, m.prompt, m.response, m.confidence, m.timestamp, -bm25(memory_fts)
+                FROM memory_fts
+                JOIN memory m ON m.id = memory_fts.rowid
+                WHERE memory_fts MATCH ?
+                ORDER BY bm25(memory_fts)
+                LIMIT ?
+            """, (match, self.candidates_per_source))
+        else:
+            # Sem BM25 não há como medir o casamento: relevância neutra
+            cursor.execute("""
+                SELECT id, prompt, response, confidence, timestamp, NULL
+                FROM memory
+                WHERE LOWER(prompt) LIKE ?
+                ORDER BY confidence DESC, timestamp DESC
+                LIMIT ?
+            """, (f"%{terms[0]}%", self.candidates_per_source))
+
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [
+            RetrievalCandidate(
+                source="lexical",
+                key=f"memory:{row[0]}",
+                prompt=row[1],
+                response=row[2],
+                relevance=bm25_relevance(row[5]) if row[5] is not None else 0.5,
+                confidence=row[3] if row[3] is not None else 0.8,
+                timestamp=row[4]
+            )
+            for row in rows
+        ]
+
+    def _docs_lookup(self, prompt: str) -> List[RetrievalCandidate]:
+        """Trechos relevantes da documentação local"""
+        return [
+            RetrievalCandidate(
+                source="docs",
+                key=f"doc:{chunk['id']}",
+                prompt=f"{os.path.basename(chunk['path'])} - {chunk['heading']}",
+                response=chunk["content"],
+                relevance=min(chunk["score"], 1.0),
+                confidence=0.9
+            )
+            for chunk in self.doc_index.search(prompt, k=self.candidates_per_source)
+            if chunk["score"] >= self.min_doc_score
+        ]
+
+    def _refresh_vectors(self):
+        """Carrega incrementalmente os embeddings novos para a matriz em memória"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        # Memórias ainda sem embedding (ex.: gravadas antes do índice existir);
+        # só as posteriores à marca d'água, para não varrer a tabela a cada busca
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM memory")
+        max_memory_id = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT m.id, m.prompt FROM memory m
+            WHERE m.id > ? AND m.id <= ?
+              AND NOT EXISTS (SELECT 1 FROM memory_embeddings e WHERE e.memory_id = m.id)
+        """, (self._last_memory_id, max_memory_id))
+        missing = cursor.fetchall()
+        if missing:
+            vectors = self.embedder.embed([row[1] or "" for row in missing])
+            cursor.executemany(
+                "INSERT OR REPLACE INTO memory_embeddings (memory_id, dim, vector) VALUES (?, ?, ?)",
+                [(row[0], len(vec), vector_to_blob(vec)) for row, vec in zip(missing, vectors)]
+            )
+            conn.commit()
+        self._last_memory_id = max(self._last_memory_id, max_memory_id)
+
+        cursor.execute("""
+            SELECT memory_id, dim, vector FROM memory_embeddings
+            WHERE memory_id > ? ORDER BY memory_id
+        """, (self._last_vector_id,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        if not rows:
+            return
+
+        dim = getattr(self.embedder, "dim", None) or rows[-1][1]
+        rows = [row for row in rows if row[1] == dim]
+        if not rows:
+            return
+
+        new_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        new_matrix = np.vstack([blob_to_vector(row[2]) for row in rows])
+
+        with self._vector_lock:
+            # Outra busca pode ter carregado as mesmas linhas enquanto esta lia o banco
+            new_rows = new_ids > self._last_vector_id
+            if not new_rows.any():
+                return
+            new_ids, new_matrix = new_ids[new_rows], new_matrix[new_rows]
+
+            if self._vector_matrix is None or self._vector_matrix.shape[1] != dim:
+                self._vector_ids = new_ids
+                self._vector_matrix = new_matrix
+            else:
+                self._vector_ids = np.concatenate([self._vector_ids, new_ids])
+                self._vector_matrix = np.vstack([self._vector_matrix, new_matrix])
+            self._last_vector_id = int(new_ids[-1])
+
+    def forget(self, memory_ids):
+        """Remove da matriz em memória os vetores de memórias apagadas"""
+        with self._vector_lock:
+            if self._vector_matrix is None or not len(memory_ids):
+                return
+            keep = ~np.isin(self._vector_ids, np.asarray(list(memory_ids), dtype=np.int64))
+            if not keep.all():
+                self._vector_ids = self._vector_ids[keep]
+                self._vector_matrix = self._vector_matrix[keep]
+
+    def _semantic_lookup(self, prompt: str) -> List[RetrievalCandidate]:
+        """Busca semântica por similaridade de cosseno nos embeddings"""
+        self._refresh_vectors()
+
+        # O embedding da consulta pode ser uma chamada HTTP: fica fora do lock
+        query = self.embedder.embed([prompt])[0]
+
+        with self._vector_lock:
+            if self._vector_matrix is None or not len(self._vector_ids):
+                return []
+            if query.shape[0] != self._vector_matrix.shape[1]:
+                return []
+            similarities = self._vector_matrix @ query
+            ids = self._vector_ids
+
+        n = min(self.candidates_per_source * 2, len(ids))
+        top_idx = np.argpartition(-similarities, n - 1)[:n]
+        top_idx = top_idx[np.argsort(-similarities[top_idx])]
+        top = {int(ids[i]): float(similarities[i]) for i in top_idx if similarities[i] > 0}
+        if not top:
+            return []
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, prompt, response, confidence, timestamp
+            FROM memory WHERE id IN ({','.join('?' * len(top))})
+        """, list(top))
+        rows = cursor.fetchall()
+        conn.close()
+
+        # Memórias removidas (ex.: consolidadas) não retornam e saem da matriz
+        gone = set(top) - {row[0] for row in rows}
+        if gone:
+            self.forget(gone)
+
+        candidates = [
+            RetrievalCandidate(
+                source="semantic",
+                key=f"memory:{row[0]}",
+                prompt=row[1],
+                response=row[2],
+                relevance=min(top[row[0]], 1.0),
+                confidence=row[3] if row[3] is not None else 0.8,
+                timestamp=row[4]
+            )
+            for row in rows
+        ]
+        candidates.sort(key=lambda c: c.relevance, reverse=True)
+        return candidates[:self.candidates_per_source]
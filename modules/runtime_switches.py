@@ -0,0 +1,126 @@
+# modules/runtime_switches.py
+"""
+Chaves de Execução do Cérebro Digital da Queen
+Recursos do pipeline que o auto-otimizador liga e desliga em tempo real
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class RuntimeSwitches:
+    """Conjunto de chaves booleanas consultadas pelo pipeline a cada requisição"""
+
+    DEFAULTS = {
+        "cache_responses": False,
+        "fallback_models": False,
+        "parallel_processing": False,
+        "retry_logic": False
+    }
+
+    # Métricas que cada chave pode melhorar: só elas justificam uma tentativa
+    AFFECTS: Dict[str, Tuple[str, ...]] = {
+        "cache_responses": ("response_time",),
+        "fallback_models": ("ollama_error_rate",),
+        "parallel_processing": ("multimedia_time",),
+        "retry_logic": ("ollama_error_rate",)
+    }
+
+    def __init__(self, overrides: Optional[Dict[str, bool]] = None):
+        self._values = dict(self.DEFAULTS)
+        self._values.update(overrides or {})
+        self._listeners: List[Callable[[str, bool], None]] = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values
+
+    def is_enabled(self, name: str) -> bool:
+        """Indica se a chave está ligada"""
+        return self._values.get(name, False)
+
+    def affects(self, name: str, metric_name: str) -> bool:
+        """Indica se a chave atua sobre a métrica"""
+        return metric_name in self.AFFECTS.get(name, ())
+
+    def set(self, name: str, enabled: bool) -> bool:
+        """Altera uma chave e retorna o valor anterior"""
+        if name not in self._values:
+            raise KeyError(f"Chave desconhecida: {name}")
+
+        with self._lock:
+            previous = self._values[name]
+            self._values[name] = enabled
+            listeners = list(self._listeners)
+
+        if previous != enabled:
+            for listener in listeners:
+                try:
+                    listener(name, enabled)
+                except Exception as e:
+                    print(f"Erro ao notificar mudança de {name}: {e}")
+
+        return previous
+
+    def on_change(self, listener: Callable[[str, bool], None]):
+        """Registra um callback chamado quando uma chave muda"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def snapshot(self) -> Dict[str, bool]:
+        """Retorna o estado atual de todas as chaves"""
+        with self._lock:
+            return dict(self._values)
+
+class ResponseCache:
+    """Cache LRU com expiração para respostas do modelo"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, task: str, prompt: str, session_id: Optional[str] = None) -> str:
+        """Chave do cache: o prompt completo (com resumo e contexto) e a sessão
+
+        Perguntas que dependem do contexto ("e o segundo?") só reaproveitam
+        respostas geradas exatamente para o mesmo contexto.
+        """
+        raw = f"{model}\n{task}\n{session_id or ''}\n{prompt}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor em cache, se ainda válido"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any):
+        """Guarda um valor, descartando o menos usado se cheio"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Esvazia o cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
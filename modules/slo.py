@@ -0,0 +1,187 @@
+# modules/slo.py
+"""
+SLOs do Cérebro Digital da Queen
+Objetivos declarados no config.json, orçamento de erro e alertas por taxa de consumo
+"""
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from modules.metric_sketch import QuantileSketch
+from modules.metric_rollup import rollup_table
+
+@dataclass
+class SLO:
+    """Um objetivo: a fração `objective` das amostras de `metric` fica em até `threshold`"""
+    name: str
+    metric: str
+    objective: float
+    threshold: float = 0.0
+    kind: str = "latency"  # latency | error_rate
+    window_days: int = 28
+
+    @property
+    def error_budget(self) -> float:
+        return 1.0 - self.objective
+
+    @classmethod
+    def from_config(cls, entry: Dict[str, Any]) -> 'SLO':
+        return cls(
+            name=entry["name"],
+            metric=entry["metric"],
+            objective=float(entry["objective"]),
+            threshold=float(entry.get("threshold", 0.0)),
+            kind=entry.get("type", "latency"),
+            window_days=int(entry.get("window_days", 28))
+        )
+
+# SLOs padrão (config.json pode substituí-los na seção "slos")
+DEFAULT_SLOS = [
+    {"name": "chat_p95", "metric": "response_time", "type": "latency",
+     "threshold": 4.0, "objective": 0.95},
+    {"name": "workflow_p95", "metric": "workflow_generation_time", "type": "latency",
+     "threshold": 10.0, "objective": 0.95},
+    {"name": "chat_errors", "metric": "ollama_error_rate", "type": "error_rate",
+     "threshold": 0.0, "objective": 0.99}
+]
+
+# Alertas em duas janelas (longa, curta): ambas precisam consumir o orçamento
+# acima do limite. A curta faz o alerta cessar logo que o problema acaba.
+# (nome, janela longa s, janela curta s, taxa de consumo, severidade)
+BURN_RATE_ALERTS: List[Tuple[str, int, int, float, str]] = [
+    ("rápido", 3600, 300, 14.4, "critical"),
+    ("lento", 6 * 3600, 1800, 6.0, "high")
+]
+
+def load_slos(config: Optional[Dict[str, Any]]) -> List[SLO]:
+    """Lê os SLOs da seção "slos" do config (ou os padrões)"""
+    entries = (config or {}).get("slos", DEFAULT_SLOS)
+    slos = []
+    for entry in entries:
+        try:
+            slos.append(SLO.from_config(entry))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Erro no SLO {entry}: {e}")
+    return slos
+
+def _format_window(seconds: int) -> str:
+    return f"{seconds // 3600}h" if seconds % 3600 == 0 else f"{seconds // 60}m"
+
+class SLOEvaluator:
+    """Avalia os SLOs a partir dos sketches de rollup (1 minuto e 1 hora)"""
+
+    def __init__(self, monitor, slos: List[SLO], alerts=BURN_RATE_ALERTS,
+                 min_events: int = 10, cache_seconds: float = 30.0):
+        self.monitor = monitor
+        self.slos = slos
+        self.alerts = alerts
+        self.min_events = min_events
+        self.cache_seconds = cache_seconds
+        self._cache: Tuple[float, List[Dict[str, Any]]] = (0.0, [])
+
+    def _bad_events(self, cursor: sqlite3.Cursor, slo: SLO, resolution: str,
+                    since: float) -> List[Tuple[int, int, int]]:
+        """(início do balde, total, ruins) de cada balde desde `since`"""
+        cursor.execute(f"""
+            SELECT bucket_start, count, sketch FROM {rollup_table(resolution)}
+            WHERE metric_name = ? AND bucket_start >= ?
+        """, (slo.metric, int(since)))
+
+        buckets = []
+        for bucket, count, blob in cursor.fetchall():
+            bad = QuantileSketch.from_bytes(blob).count_above(slo.threshold) if blob else 0
+            buckets.append((bucket, count, bad))
+        return buckets
+
+    def evaluate(self, now: Optional[float] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Conformidade, orçamento restante, taxas de consumo e alertas de cada SLO"""
+        now = now or time.time()
+        cached_at, cached = self._cache
+        if use_cache and now - cached_at < self.cache_seconds:
+            return cached
+
+        # Garante que as amostras em memória já estão nos rollups
+        self.monitor.flush()
+
+        longest = max(long for _, long, _, _, _ in self.alerts)
+        windows = sorted({w for _, long, short, _, _ in self.alerts for w in (long, short)})
+
+        conn = sqlite3.connect(self.monitor.db_path)
+        cursor = conn.cursor()
+        results = []
+        try:
+            for slo in self.slos:
+                recent = self._bad_events(cursor, slo, "1m", now - longest)
+                period = self._bad_events(cursor, slo, "1h", now - slo.window_days * 86400)
+
+                total = sum(count for _, count, _ in period)
+                bad = sum(b for _, _, b in period)
+                compliance = 1.0 - bad / total if total else None
+                budget_remaining = (
+                    1.0 - (bad / total) / slo.error_budget if total and slo.error_budget > 0 else None
+                )
+
+                burn_rates = {}
+                events = {}
+                for window in windows:
+                    in_window = [(c, b) for start, c, b in recent if start >= now - window]
+                    window_total = sum(c for c, _ in in_window)
+                    window_bad = sum(b for _, b in in_window)
+                    events[window] = window_total
+                    burn_rates[window] = (
+                        (window_bad / window_total) / slo.error_budget
+                        if window_total and slo.error_budget > 0 else 0.0
+                    )
+
+                alerts = []
+                for name, long, short, rate, severity in self.alerts:
+                    if events[long] < self.min_events:
+                        continue
+                    if burn_rates[long] >= rate and burn_rates[short] >= rate:
+                        alerts.append({
+                            "alert": name,
+                            "windows": f"{_format_window(long)}/{_format_window(short)}",
+                            "burn_rate": burn_rates[long],
+                            "threshold": rate,
+                            "severity": severity
+                        })
+
+                results.append({
+                    "name": slo.name,
+                    "metric": slo.metric,
+                    "type": slo.kind,
+                    "objective": slo.objective,
+                    "threshold": slo.threshold,
+                    "events": total,
+                    "compliance": compliance,
+                    "budget_remaining": budget_remaining,
+                    "burn_rates": {_format_window(w): r for w, r in burn_rates.items()},
+                    "alerts": alerts
+                })
+        finally:
+            conn.close()
+
+        self._cache = (now, results)
+        return results
+
+    def bottlenecks(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """SLOs em alerta, no formato de gargalo usado pelo AutoOptimizer"""
+        bottlenecks = []
+        for result in self.evaluate(now):
+            if not result["alerts"]:
+                continue
+
+            worst = max(result["alerts"], key=lambda a: a["burn_rate"])
+            bottlenecks.append({
+                'type': 'high_error_rate' if result["type"] == "error_rate" else 'high_latency',
+                'metric': result["metric"],
+                'value': worst["burn_rate"],
+                'average_value': worst["burn_rate"],
+                'burn_rate': worst["burn_rate"],
+                'slo': result["name"],
+                'detection': 'slo',
+                'severity': worst["severity"]
+            })
+        return bottlenecks
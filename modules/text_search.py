@@ -0,0 +1,36 @@
+# modules/text_search.py
+"""
+Busca Textual do Cérebro Digital da Queen
+Termos de consulta sem palavras vazias e relevância absoluta a partir do BM25
+"""
+
+import re
+from typing import List
+
+# Palavras vazias do português (e algumas do inglês) que casam com quase qualquer texto
+STOPWORDS = frozenset("""
+    que para como com uma umas uns por pela pelas pelo pelos dos das nos nas num numa
+    não sim mas mais menos muito muita muitos muitas pouco também já ainda só até
+    seu sua seus suas meu minha meus minhas teu tua nosso nossa esse essa esses essas
+    este esta estes estas isso isto aquele aquela aquilo ele ela eles elas você vocês
+    ser sou são era foi fui está estou estão estava tem tenho têm tinha ter há
+    quando onde qual quais quem porque porquê então assim sobre entre depois antes
+    bem aqui ali cada todo toda todos todas outro outra outros outras mesmo mesma
+    pode posso podem fazer faz faço quero queria gostaria preciso favor olá oi
+    tudo bom boa dia tarde noite obrigado obrigada
+    the and for with this that from are was you your how what
+""".split())
+
+def search_terms(text: str) -> List[str]:
+    """Termos da consulta: palavras com mais de 2 letras, sem palavras vazias"""
+    return [w for w in re.findall(r"\w+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+def bm25_relevance(score: float, half: float = 4.0) -> float:
+    """Relevância de 0 a 1 do BM25 (-bm25() do FTS5): vale 0.5 quando score == half
+
+    Ao contrário de dividir pelo melhor resultado, não depende dos outros
+    resultados: um casamento fraco continua fraco mesmo sendo o único.
+    """
+    if score <= 0:
+        return 0.0
+    return score / (score + half)
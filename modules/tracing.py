@@ -0,0 +1,285 @@
+# modules/tracing.py
+"""
+Tracing do Cérebro Digital da Queen
+Spans hierárquicos (pai/filho) com tempos monotônicos, gravados em lote no SQLite
+"""
+
+import json
+import time
+import atexit
+import uuid
+import sqlite3
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from modules.db_migrations import migrate_database, DEFAULT_DATABASES
+
+# Span ativo no contexto atual (thread ou tarefa)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """Uma etapa cronometrada de uma requisição"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes",
+                 "started_at", "start_ns", "end_ns", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.started_at = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any):
+        """Anexa um atributo ao span"""
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+class Tracer:
+    """Cria spans e os exporta em lote para a tabela trace_spans"""
+
+    # Intervalo mínimo entre limpezas de spans antigos (segundos)
+    EXPIRY_INTERVAL = 3600
+
+    def __init__(self, db_path: str = DEFAULT_DATABASES["performance"], flush_interval: float = 1.0,
+                 max_pending: int = 20000, retention_seconds: float = 7 * 86400):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.retention_seconds = retention_seconds
+        self._last_expiry = 0.0
+        self.enabled = True
+        self._finished = deque(maxlen=max_pending)
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._last_trace_id = None
+        atexit.register(self.flush)
+
+    @property
+    def last_trace_id(self) -> Optional[str]:
+        """ID do último trace raiz concluído"""
+        return self._last_trace_id
+
+    @property
+    def pending_count(self) -> int:
+        """Spans concluídos aguardando exportação"""
+        return len(self._finished)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Abre um span filho do span ativo (ou a raiz de um novo trace)"""
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            _current_span.reset(token)
+            self._finished.append(span)
+            if span.parent_id is None:
+                self._last_trace_id = span.trace_id
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        """Inicia a thread de exportação sob demanda"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+
+        with self._flusher_lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop)
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _flush_loop(self):
+        """Exporta periodicamente os spans concluídos"""
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        """Grava os spans concluídos; retorna quantos foram gravados"""
+        with self._flush_lock:
+            spans = []
+            while self._finished:
+                try:
+                    spans.append(self._finished.popleft())
+                except IndexError:
+                    break
+
+            if not spans:
+                return 0
+
+            try:
+                migrate_database(self.db_path, "performance")
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                conn.executemany("""
+                    INSERT OR REPLACE INTO trace_spans
+                    (span_id, trace_id, parent_id, name, started_at, start_ns,
+                     duration_ms, status, error, attributes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (s.span_id, s.trace_id, s.parent_id, s.name,
+                     datetime.fromtimestamp(s.started_at).isoformat(), s.start_ns,
+                     s.duration_ms, s.status, s.error,
+                     json.dumps(s.attributes, ensure_ascii=False, default=str))
+                    for s in spans
+                ])
+
+                if time.time() - self._last_expiry > self.EXPIRY_INTERVAL:
+                    self.expire(conn.cursor())
+                    self._last_expiry = time.time()
+
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                print(f"Erro ao gravar spans: {e}")
+                # Devolve o lote à fila para a próxima tentativa
+                self._finished.extendleft(reversed(spans))
+                return 0
+
+            return len(spans)
+
+    def expire(self, cursor: sqlite3.Cursor, now: Optional[float] = None) -> int:
+        """Remove spans além da retenção; retorna quantos foram removidos"""
+        now = now or time.time()
+        cutoff = datetime.fromtimestamp(now - self.retention_seconds).isoformat()
+        cursor.execute("DELETE FROM trace_spans WHERE started_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def get_trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        """Retorna os spans de um trace em ordem de início"""
+        self.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT span_id, parent_id, name, started_at, start_ns, duration_ms,
+                   status, error, attributes
+            FROM trace_spans WHERE trace_id = ?
+            ORDER BY start_ns
+        """, (trace_id,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [
+            {
+                "span_id": row[0],
+                "parent_id": row[1],
+                "name": row[2],
+                "started_at": row[3],
+                "start_ns": row[4],
+                "duration_ms": row[5],
+                "status": row[6],
+                "error": row[7],
+                "attributes": json.loads(row[8]) if row[8] else {}
+            }
+            for row in rows
+        ]
+
+    def recent_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Lista os traces raiz mais recentes"""
+        self.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT trace_id, name, started_at, duration_ms, status
+            FROM trace_spans WHERE parent_id IS NULL
+            ORDER BY started_at DESC LIMIT ?
+        """, (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [
+            {"trace_id": r[0], "name": r[1], "started_at": r[2], "duration_ms": r[3], "status": r[4]}
+            for r in rows
+        ]
+
+    def format_waterfall(self, trace_id: str, width: int = 40) -> str:
+        """Desenha o trace como cascata de texto (uma linha por span)"""
+        spans = self.get_trace(trace_id)
+        if not spans:
+            return "Trace não encontrado"
+
+        origin = min(s["start_ns"] for s in spans)
+        end = max(s["start_ns"] + (s["duration_ms"] or 0) * 1e6 for s in spans)
+        total = max(end - origin, 1)
+
+        depth = {}
+        for s in spans:
+            depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1 if s["parent_id"] else 0
+
+        name_width = max(len("  " * depth[s["span_id"]] + s["name"]) for s in spans)
+        lines = []
+        for s in spans:
+            offset = int((s["start_ns"] - origin) / total * width)
+            length = max(1, int((s["duration_ms"] or 0) * 1e6 / total * width))
+            bar = " " * offset + "█" * min(length, width - offset)
+            label = ("  " * depth[s["span_id"]] + s["name"]).ljust(name_width)
+            flag = " ✗" if s["status"] == "error" else ""
+            lines.append(f"{label} |{bar.ljust(width)}| {s['duration_ms'] or 0:8.1f} ms{flag}")
+
+        return "\n".join(lines)
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """Retorna o tracer global"""
+    return _tracer
+
+def set_tracer(tracer: Tracer):
+    """Substitui o tracer global (por exemplo, para outro banco)"""
+    global _tracer
+    _tracer = tracer
+
+def span(name: str, **attributes):
+    """Abre um span no tracer global"""
+    return _tracer.span(name, **attributes)
+
+def traced(name: Optional[str] = None):
+    """Decorador que cria um span no tracer global a cada chamada"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_span() -> Optional[Span]:
+    """Retorna o span ativo, se houver"""
+    return _current_span.get()
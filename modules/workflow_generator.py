@@ -11,6 +11,8 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
+from modules.tracing import traced
+
 @dataclass
 class WorkflowNode:
     """Representa um nó do workflow"""
@@ -232,6 +234,7 @@ class AdvancedWorkflowGenerator:
             }
         }
     
+    @traced("workflow.generate_from_prompt")
     def generate_from_prompt(self, prompt: str) -> Dict:
         """Gera workflow baseado em prompt em linguagem natural"""
         # Analisa o prompt para identificar intenções
@@ -246,6 +249,7 @@ class AdvancedWorkflowGenerator:
         
         return workflow.to_n8n_json()
     
+    @traced("workflow.analyze_prompt")
     def _analyze_prompt(self, prompt: str) -> Dict:
         """Analisa o prompt para extrair intenções e entidades"""
         # Usa IA para analisar o prompt
@@ -415,6 +419,7 @@ class AdvancedWorkflowGenerator:
         
         return defaults.get(node_config["type"], {})
     
+    @traced("workflow.save")
     def save_generated_workflow(self, workflow_json: Dict, prompt: str) -> str:
         """Salva workflow gerado para histórico"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -435,6 +440,7 @@ class AdvancedWorkflowGenerator:
         
         return filename
     
+    @traced("workflow.optimize")
     def optimize_workflow(self, workflow_json: Dict) -> Dict:
         """Otimiza um workflow existente"""
         # Analisa o workflow para identificar oportunidades de otimização
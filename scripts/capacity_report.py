@@ -0,0 +1,45 @@
+# scripts/capacity_report.py
+"""
+Script para gerar o relatório de capacidade do Cérebro Digital da Queen
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.capacity_report import CapacityPlanner
+from modules.db_migrations import DEFAULT_DATABASES
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Planejamento de capacidade (fila M/G/c)")
+    parser.add_argument("--days", type=int, default=28, help="Dias de histórico considerados")
+    parser.add_argument("--ollama-servers", type=int, default=1,
+                        help="Requisições atendidas em paralelo pelo Ollama (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--load", type=float, nargs="+", default=[1, 2, 4, 8],
+                        help="Múltiplos da carga atual a projetar")
+    parser.add_argument("--max-wait", type=float, default=2.0, help="Espera aceitável na fila (s)")
+    parser.add_argument("--format", choices=["md", "html"], default="md")
+    parser.add_argument("--output", help="Arquivo de saída (padrão: imprime na tela)")
+    args = parser.parse_args()
+
+    planner = CapacityPlanner(
+        {name: str(ROOT / path) for name, path in DEFAULT_DATABASES.items()},
+        days=args.days,
+        ollama_servers=args.ollama_servers,
+        multipliers=args.load,
+        max_wait=args.max_wait
+    ).load()
+    report = planner.to_html() if args.format == "html" else planner.to_markdown()
+
+    if args.output:
+        Path(args.output).write_text(report, encoding="utf-8")
+        print(f"📈 Relatório gravado em {args.output}")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# scripts/export_analytics.py
+"""
+Script para exportar os bancos do Cérebro Digital da Queen em formato colunar
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.analytics_export import AnalyticsExporter, EXPORT_FORMATS
+from modules.db_migrations import DEFAULT_DATABASES
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Exportação incremental para análise (Parquet/NPZ)")
+    parser.add_argument("--output", default=str(ROOT / "exports"), help="Diretório das exportações")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Linhas por parte")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="auto",
+                        help="auto usa Parquet quando o pyarrow está instalado")
+    parser.add_argument("--full", action="store_true", help="Descarta o estado e exporta tudo de novo")
+    args = parser.parse_args()
+
+    exporter = AnalyticsExporter(
+        args.output,
+        {name: str(ROOT / path) for name, path in DEFAULT_DATABASES.items()},
+        chunk_size=args.chunk_size,
+        export_format=args.format
+    )
+
+    for database, tables in exporter.export_all(full=args.full).items():
+        print(f"📦 {database}:")
+        for table, rows in tables.items():
+            print(f"   {table}: {rows} linhas novas")
+    print(f"✅ Exportação ({exporter.format}) em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/ingest_n8n.py
+"""
+Script para ingerir as execuções do n8n e resumir a performance dos workflows e de seus nós
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.auto_optimizer import WorkflowOptimizer
+from modules.n8n_ingest import ExecutionIngestor
+from modules.db_migrations import DEFAULT_DATABASES
+
+def load_n8n_config() -> dict:
+    """Seção n8n do config.json, se existir"""
+    try:
+        with open(ROOT / "config.json", 'r', encoding='utf-8') as f:
+            return json.load(f).get("n8n", {})
+    except (OSError, ValueError):
+        return {}
+
+def main():
+    """Função principal"""
+    config = load_n8n_config()
+    parser = argparse.ArgumentParser(description="Ingestão incremental das execuções do n8n")
+    parser.add_argument("--url", default=config.get("url", "http://localhost:5678/api/v1"))
+    parser.add_argument("--workers", type=int, default=8, help="Workflows buscados em paralelo")
+    parser.add_argument("--page-size", type=int, default=250, help="Execuções por página da API")
+    parser.add_argument("--workflow", nargs="+", help="Só estes workflows (padrão: todos os ativos)")
+    args = parser.parse_args()
+
+    ingestor = ExecutionIngestor(
+        args.url,
+        str(ROOT / DEFAULT_DATABASES["performance"]),
+        api_key=config.get("api_key") or None,
+        max_workers=args.workers,
+        page_size=args.page_size
+    )
+    optimizer = WorkflowOptimizer(args.url, ingestor=ingestor)
+
+    for workflow_id, metrics in optimizer.analyze_all_workflows(args.workflow).items():
+        if not metrics:
+            continue
+        print(f"🔄 {workflow_id}: {metrics['total_executions']} execuções, "
+              f"{metrics['average_duration']:.1f}s em média, {metrics['success_rate']:.0%} de sucesso")
+        if metrics.get("critical_path"):
+            print(f"   ⏱️  Caminho crítico ({metrics['critical_path_time']:.1f}s): "
+                  f"{' → '.join(metrics['critical_path'])}")
+        for suggestion in optimizer.suggest_optimizations(metrics):
+            print(f"   💡 {suggestion}")
+
+if __name__ == "__main__":
+    main()
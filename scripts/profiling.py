@@ -0,0 +1,43 @@
+# scripts/profiling.py
+"""
+Script para perfilar requisições do Cérebro Digital da Queen em execução
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.profiler import ProfilingController, request_profiling, PROFILE_MODES
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Profiling sob demanda do Cérebro Digital da Queen")
+    parser.add_argument("--calls", type=int, default=5, help="Quantas requisições perfilar")
+    parser.add_argument("--mode", choices=PROFILE_MODES, default="cprofile",
+                        help="cprofile (determinístico) ou sampling (amostragem de pilha)")
+    parser.add_argument("--no-memory", action="store_true", help="Não coletar diff do tracemalloc")
+    parser.add_argument("--reason", default="cli", help="Motivo registrado no histórico")
+    parser.add_argument("--list", action="store_true", help="Lista as sessões registradas")
+    args = parser.parse_args()
+
+    output_dir = str(ROOT / "profiles")
+
+    if args.list:
+        controller = ProfilingController(output_dir, db_path=str(ROOT / "queen_performance.db"))
+        sessions = controller.recent_sessions(20)
+        if not sessions:
+            print("Nenhuma sessão de profiling registrada.")
+        for session in sessions:
+            print(f"{session['timestamp']}  {session['description']}")
+            print(f"    {session['artifact']}")
+        return
+
+    path = request_profiling(output_dir, args.calls, args.mode, args.reason, not args.no_memory)
+    print(f"🔬 Pedido gravado em {path}")
+    print(f"   As próximas {args.calls} requisições do app em execução serão perfiladas ({args.mode}).")
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,6 @@ Script de configuração inicial do Cérebro Digital da Queen
 import os
 import sys
 import subprocess
-import sqlite3
 import json
 from pathlib import Path
 
@@ -84,71 +83,15 @@ def create_directories():
     print("✅ Diretórios criados")
 
 def initialize_databases():
-    """Inicializa bancos de dados SQLite"""
+    """Inicializa bancos de dados SQLite aplicando as migrações pendentes"""
     print("🗄️  Inicializando bancos de dados...")
     
-    # Banco principal da Queen
-    conn = sqlite3.connect('queen_memory.db')
-    cursor = conn.cursor()
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from modules.db_migrations import migrate_all
     
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS memory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            prompt TEXT,
-            response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            user_input TEXT,
-            ai_response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
-    
-    # Banco de performance
-    conn = sqlite3.connect('queen_performance.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS performance_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            metric_name TEXT NOT NULL,
-            metric_value REAL NOT NULL,
-            context TEXT
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
-    
-    # Banco de agentes
-    conn = sqlite3.connect('agents.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS agent_tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            agent_id TEXT NOT NULL,
-            task_type TEXT NOT NULL,
-            task_data TEXT NOT NULL,
-            status TEXT NOT NULL,
-            result TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            completed_at DATETIME
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    for schema, applied in migrate_all().items():
+        for migration in applied:
+            print(f"   {schema} v{migration['version']}: {migration['description']}")
     
     print("✅ Bancos de dados inicializados")
 
@@ -160,11 +103,13 @@ def create_config_file():
         "ollama": {
             "url": "http://localhost:11434/api/generate",
             "default_model": "llama3",
+            "summary_model": "phi-3:mini",
             "models": ["phi-3:mini", "llama3", "mistral"]
         },
         "n8n": {
             "url": "http://localhost:5678/api/v1",
-            "webhook_url": "http://localhost:5678/webhook"
+            "webhook_url": "http://localhost:5678/webhook",
+            "api_key": ""
         },
         "apis": {
             "flux_ai": {
@@ -191,7 +136,29 @@ def create_config_file():
             "theme": "dark",
             "window_size": [800, 600],
             "auto_save": True
-        }
+        },
+        # Janela (s) de medição antes/depois de cada otimização e nível de
+        # significância exigido para mantê-la
+        "optimizer": {
+            "evaluation_window": 600,
+            "significance": 0.05
+        },
+        # Endpoint /metrics (Prometheus/OpenMetrics), apenas local por padrão
+        "metrics": {
+            "enabled": True,
+            "host": "127.0.0.1",
+            "port": 9464
+        },
+        # Objetivos de nível de serviço: fração `objective` das amostras de
+        # `metric` em até `threshold` (erros: qualquer valor acima de 0)
+        "slos": [
+            {"name": "chat_p95", "metric": "response_time", "type": "latency",
+             "threshold": 4.0, "objective": 0.95},
+            {"name": "workflow_p95", "metric": "workflow_generation_time", "type": "latency",
+             "threshold": 10.0, "objective": 0.95},
+            {"name": "chat_errors", "metric": "ollama_error_rate", "type": "error_rate",
+             "threshold": 0.0, "objective": 0.99}
+        ]
     }
     
     with open('config.json', 'w', encoding='utf-8') as f:
@@ -205,14 +205,25 @@ def get_performance_summary():
         conn = sqlite3.connect("queen_performance.db")
         cursor = conn.cursor()
         
-        # Métricas das últimas 24 horas
-        since = datetime.now() - timedelta(hours=24)
-        cursor.execute("""
-            SELECT metric_name, AVG(metric_value), COUNT(*)
-            FROM performance_metrics 
-            WHERE timestamp > ?
-            GROUP BY metric_name
-        """, (since,))
+        # Métricas das últimas 24 horas: no máximo 25 baldes horários por métrica
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'metric_rollup_1h'")
+        if cursor.fetchone():
+            since = int(datetime.now().timestamp() // 3600 - 24) * 3600
+            cursor.execute("""
+                SELECT metric_name, SUM(sum) / SUM(count), SUM(count)
+                FROM metric_rollup_1h
+                WHERE bucket_start > ?
+                GROUP BY metric_name
+            """, (since,))
+        else:
+            # Banco ainda sem migração de rollups
+            since = datetime.utcnow() - timedelta(hours=24)
+            cursor.execute("""
+                SELECT metric_name, AVG(metric_value), COUNT(*)
+                FROM performance_metrics 
+                WHERE timestamp > ?
+                GROUP BY metric_name
+            """, (since.strftime('%Y-%m-%d %H:%M:%S'),))
         
         metrics = cursor.fetchall()
         conn.close()
@@ -0,0 +1,4 @@
+# tests/stubs/__init__.py
+"""
+Servidores locais que imitam os serviços externos, para testes e benchmarks sem rede
+"""
@@ -0,0 +1,355 @@
+# tests/stubs/n8n_stub.py
+"""
+Servidor n8n de Mentira para Testes de Performance
+Implementa a parte da API pública (/api/v1) e dos webhooks usada pelo Cérebro Digital,
+com latência configurável, injeção de erros e históricos sintéticos de qualquer tamanho
+"""
+
+import sys
+import json
+import time
+import bisect
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+MAX_PAGE_SIZE = 250  # Limite do n8n para ?limit
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+# Tipos de nó dos workflows sintéticos e a latência típica (ms) de cada um
+SYNTHETIC_NODES = [
+    ("n8n-nodes-base.httpRequest", 800.0),
+    ("n8n-nodes-base.code", 120.0),
+    ("n8n-nodes-base.set", 5.0),
+    ("n8n-nodes-base.if", 2.0),
+    ("n8n-nodes-base.postgres", 250.0)
+]
+
+def _iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+class N8nStubServer:
+    """n8n compatível o bastante para ingestão, importação e verificação de status
+
+    Rotas: GET / (status), GET/POST /api/v1/workflows, GET /api/v1/workflows/{id},
+    GET /api/v1/executions (paginado por cursor, mais novas primeiro),
+    GET /api/v1/executions/{id} e GET/POST /webhook/{path} e /webhook-test/{path}.
+
+    As execuções sintéticas guardam só (id, workflow, status, início,
+    duração); o runData de cada uma é gerado na hora a partir da semente e
+    do id, então históricos grandes cabem na memória e são reproduzíveis.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, api_key: Optional[str] = None,
+                 seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.api_key = api_key
+        self.seed = seed
+
+        self.workflows: Dict[str, Dict[str, Any]] = {}
+        self._executions: Dict[int, Tuple[str, str, float, float]] = {}
+        self._ids: List[int] = []                       # ids em ordem crescente
+        self._ids_by_workflow: Dict[str, List[int]] = {}
+        self._next_workflow = 1
+        self._next_execution = 1
+        self._forced_failures: List[int] = []
+        self.requests: List[Tuple[str, str]] = []
+        self.webhook_calls: List[Dict[str, Any]] = []
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """URL base (sem /api/v1)"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api/v1"
+
+    # Dados
+
+    def add_workflow(self, workflow: Dict[str, Any], active: bool = True) -> Dict[str, Any]:
+        """Registra um workflow (como o POST /workflows) e devolve-o com id"""
+        with self._lock:
+            workflow_id = str(workflow.get("id") or self._next_workflow)
+            self._next_workflow = max(self._next_workflow, int(workflow_id) + 1 if workflow_id.isdigit() else 0)
+            stored = dict(workflow, id=workflow_id, active=workflow.get("active", active),
+                          nodes=workflow.get("nodes", []), connections=workflow.get("connections", {}),
+                          createdAt=_iso(EPOCH), updatedAt=_iso(EPOCH))
+            self.workflows[workflow_id] = stored
+            self._ids_by_workflow.setdefault(workflow_id, [])
+            return stored
+
+    def add_execution(self, workflow_id: str, status: str = "success", duration: float = 1.0,
+                      started: Optional[float] = None) -> int:
+        """Acrescenta uma execução; status 'running' fica sem fim"""
+        with self._lock:
+            execution_id = self._next_execution
+            self._next_execution += 1
+            if started is None:
+                started = float(execution_id)
+            self._executions[execution_id] = (str(workflow_id), status, started, duration)
+            self._ids.append(execution_id)
+            self._ids_by_workflow.setdefault(str(workflow_id), []).append(execution_id)
+            return execution_id
+
+    def generate_history(self, workflows: int = 10, executions: int = 100, nodes: int = 5,
+                         error_rate: float = 0.05, running: int = 0) -> List[str]:
+        """Cria `workflows` workflows lineares com `executions` execuções cada
+
+        As execuções dos workflows são intercaladas (como em produção), cada
+        uma começando um minuto depois da anterior; as `running` mais novas
+        de cada workflow ficam em andamento.
+        """
+        created = []
+        for index in range(workflows):
+            names = ["Gatilho"] + [f"Nó {n}" for n in range(1, nodes)]
+            node_list = [{"name": "Gatilho", "type": "n8n-nodes-base.webhook",
+                          "parameters": {"path": f"sintetico-{index + 1}", "httpMethod": "POST"}}]
+            for n in range(1, nodes):
+                node_type, _ = SYNTHETIC_NODES[(index + n) % len(SYNTHETIC_NODES)]
+                node_list.append({"name": names[n], "type": node_type, "parameters": {}})
+            connections = {names[n]: {"main": [[{"node": names[n + 1], "type": "main", "index": 0}]]}
+                           for n in range(nodes - 1)}
+            created.append(self.add_workflow({"name": f"Sintético {index + 1}", "nodes": node_list,
+                                              "connections": connections})["id"])
+
+        rng = random.Random(self.seed + 1)
+        for round_index in range(executions):
+            for workflow_id in created:
+                if round_index >= executions - running:
+                    status = "running"
+                else:
+                    status = "error" if rng.random() < error_rate else "success"
+                started = round_index * 60.0 + rng.random()
+                self.add_execution(workflow_id, status, 0.0, started)
+        return created
+
+    def fail_next(self, count: int = 1, status: int = 500):
+        """Faz as próximas `count` requisições à API falharem com `status`"""
+        with self._lock:
+            self._forced_failures.extend([status] * count)
+
+    def _run_data(self, execution_id: int) -> Tuple[Dict[str, List[Dict[str, Any]]], float]:
+        """runData determinístico da execução e sua duração total (s)"""
+        workflow_id, status, started, duration = self._executions[execution_id]
+        workflow = self.workflows.get(workflow_id, {})
+        rng = random.Random(self.seed * 1_000_003 + execution_id)
+        start_ms = int((EPOCH.timestamp() + started) * 1000)  # epoch em ms, como o n8n
+        clock, run_data = start_ms, {}
+        node_list = workflow.get("nodes", [])
+        typical = dict(SYNTHETIC_NODES)
+
+        for position, node in enumerate(node_list):
+            if status == "running" and position == len(node_list) - 1:
+                break
+            elapsed = round(typical.get(node.get("type"), 10.0) * rng.lognormvariate(0, 0.4), 1)
+            run = {"startTime": clock, "executionTime": elapsed, "executionStatus": "success", "source": []}
+            if status == "error" and position == len(node_list) - 1:
+                run.update(executionStatus="error", error={"message": "Falha sintética"})
+            run_data[node["name"]] = [run]
+            clock += int(elapsed) + 1
+
+        total = duration or (clock - start_ms) / 1000.0
+        return run_data, total
+
+    def _execution(self, execution_id: int, include_data: bool) -> Dict[str, Any]:
+        workflow_id, status, started, _ = self._executions[execution_id]
+        run_data, duration = self._run_data(execution_id)
+        finished = status != "running"
+        started_at = EPOCH + timedelta(seconds=started)
+        execution = {
+            "id": str(execution_id), "workflowId": workflow_id, "mode": "webhook",
+            "finished": status == "success", "status": status,
+            "startedAt": _iso(started_at),
+            "stoppedAt": _iso(started_at + timedelta(seconds=duration)) if finished else None,
+            "retryOf": None, "retrySuccessId": None, "waitTill": None
+        }
+        if include_data:
+            execution["data"] = {"resultData": {"runData": run_data}}
+        return execution
+
+    # Rotas
+
+    def _list_workflows(self, query: Dict[str, str]) -> Dict[str, Any]:
+        ids = sorted(self.workflows, key=lambda w: int(w) if w.isdigit() else 0)
+        if "active" in query:
+            wanted = query["active"] == "true"
+            ids = [w for w in ids if self.workflows[w]["active"] == wanted]
+        limit = min(int(query.get("limit", 100)), MAX_PAGE_SIZE)
+        start = int(query.get("cursor", 0))
+        page = ids[start:start + limit]
+        more = start + limit < len(ids)
+        return {"data": [self.workflows[w] for w in page], "nextCursor": str(start + limit) if more else None}
+
+    def _list_executions(self, query: Dict[str, str]) -> Dict[str, Any]:
+        """Mais novas primeiro; o cursor é o id da última execução entregue"""
+        ids = self._ids_by_workflow.get(query["workflowId"], []) if "workflowId" in query else self._ids
+        limit = min(int(query.get("limit", 100)), MAX_PAGE_SIZE)
+        include_data = query.get("includeData") == "true"
+        end = bisect.bisect_left(ids, int(query["cursor"])) if query.get("cursor") else len(ids)
+
+        data = []
+        position = end
+        while position > 0 and len(data) < limit:
+            position -= 1
+            execution = self._execution(ids[position], include_data)
+            if "status" in query and execution["status"] != query["status"]:
+                continue
+            data.append(execution)
+        more = position > 0
+        return {"data": data, "nextCursor": data[-1]["id"] if data and more else None}
+
+    def _webhook(self, method: str, path: str, body: Any) -> Tuple[int, Dict[str, Any]]:
+        for workflow in self.workflows.values():
+            for node in workflow["nodes"]:
+                parameters = node.get("parameters", {})
+                if (node.get("type") == "n8n-nodes-base.webhook" and parameters.get("path") == path
+                        and parameters.get("httpMethod", "GET") == method):
+                    if not workflow["active"]:
+                        break
+                    self.webhook_calls.append({"path": path, "method": method, "body": body})
+                    self.add_execution(workflow["id"], "success", 0.0, time.time() - EPOCH.timestamp())
+                    return 200, {"message": "Workflow was started"}
+        return 404, {"code": 404, "message": f'The requested webhook "{method} {path}" is not registered.'}
+
+    def handle(self, method: str, raw_path: str, headers, body: Any) -> Tuple[int, Any]:
+        """Despacha uma requisição; devolve (status, corpo JSON ou texto)"""
+        parsed = urlparse(raw_path)
+        path = parsed.path.rstrip("/") or "/"
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        self.requests.append((method, path))
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0))
+
+        if path == "/":
+            return 200, "n8n"
+        if path.startswith("/webhook/") or path.startswith("/webhook-test/"):
+            return self._webhook(method, path.split("/", 2)[2], body)
+        if not path.startswith("/api/v1/"):
+            return 404, {"message": "not found"}
+
+        with self._lock:
+            forced = self._forced_failures.pop(0) if self._forced_failures else None
+            injected = self.error_rate and self._rng.random() < self.error_rate
+        if forced or injected:
+            return forced or 500, {"message": "Erro injetado"}
+        if self.api_key and headers.get("X-N8N-API-KEY") != self.api_key:
+            return 401, {"message": "unauthorized"}
+
+        parts = path.split("/")[3:]  # após /api/v1
+        if parts == ["workflows"]:
+            if method == "POST":
+                if not isinstance(body, dict) or "nodes" not in body or "connections" not in body:
+                    return 400, {"message": "request/body must have required property 'nodes'"}
+                # Como no n8n, `active` é só leitura: todo workflow importado nasce inativo
+                return 200, self.add_workflow({k: v for k, v in body.items() if k != "active"}, active=False)
+            return 200, self._list_workflows(query)
+        if len(parts) == 2 and parts[0] == "workflows":
+            workflow = self.workflows.get(parts[1])
+            return (200, workflow) if workflow else (404, {"message": "Not Found"})
+        if parts == ["executions"]:
+            return 200, self._list_executions(query)
+        if len(parts) == 2 and parts[0] == "executions" and parts[1].isdigit():
+            if int(parts[1]) not in self._executions:
+                return 404, {"message": "Not Found"}
+            return 200, self._execution(int(parts[1]), query.get("includeData") == "true")
+        return 404, {"message": "Not Found"}
+
+    # Servidor
+
+    def start(self) -> bool:
+        """Sobe o servidor em segundo plano; False se a porta estiver ocupada"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como o n8n
+            disable_nagle_algorithm = True  # Sem os 40ms de ACK atrasado entre cabeçalho e corpo
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = raw.decode("utf-8", "replace")
+
+                status, payload = stub.handle(method, self.path, self.headers, body)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode("utf-8"), "text/html; charset=utf-8"
+                else:
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Erro ao iniciar o n8n de teste em {self.host}:{self.port}: {e}")
+            return False
+
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Para o servidor"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def main():
+    """Sobe o n8n de teste em primeiro plano (para benchmarks manuais)"""
+    parser = argparse.ArgumentParser(description="n8n de teste com histórico sintético")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument("--workflows", type=int, default=200)
+    parser.add_argument("--executions", type=int, default=500, help="Execuções por workflow")
+    parser.add_argument("--latency", type=float, default=0.05, help="Atraso fixo por requisição (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Atraso aleatório extra máximo (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 500 na API")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = N8nStubServer(args.host, args.port, args.latency, args.jitter, args.error_rate, seed=args.seed)
+    stub.generate_history(args.workflows, args.executions)
+    if not stub.start():
+        sys.exit(1)
+    print(f"🔄 n8n de teste em {stub.api_url} ({args.workflows} workflows x {args.executions} execuções)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# tests/stubs/ollama_stub.py
+"""
+Servidor Ollama de Mentira para Testes de Performance
+Implementa /api/generate (com e sem streaming), /api/embeddings, /api/embed e /api/tags
+com tempo até o primeiro token, tokens/s, arrays de contexto e falhas programáveis
+"""
+
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+VOCABULARY_SIZE = 32000
+FAILURE_MODES = ("error", "hang", "disconnect", "malformed")
+
+def tokenize(text: str) -> List[str]:
+    """Tokens aproximados: cada palavra com o espaço que a segue"""
+    return re.findall(r"\S+\s*", text) or ([text] if text else [])
+
+def token_id(token: str) -> int:
+    """Id estável de um token (o mesmo texto dá sempre o mesmo id)"""
+    return zlib.crc32(token.strip().encode("utf-8")) % VOCABULARY_SIZE
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+class OllamaStubServer:
+    """Ollama compatível o bastante para o chat, os resumos, os embeddings e o status
+
+    Os tempos são nominais: a resposta espera `ttft` até o primeiro token e
+    1/`tokens_per_sec` entre os seguintes, e as durações devolvidas
+    (total_duration, eval_duration...) são exatamente as configuradas, sem
+    depender do hardware. A primeira requisição de cada modelo paga
+    `load_time` (modelo frio) antes do `ttft`; com `parallel`, as gerações além desse número
+    esperam na fila, como com OLLAMA_NUM_PARALLEL.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ttft: float = 0.05,
+                 tokens_per_sec: float = 200.0, load_time: float = 0.0,
+                 models: Optional[List[str]] = None, reply: Union[str, Callable[[str], str], None] = None,
+                 embedding_dim: int = 768, parallel: Optional[int] = None,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.load_time = load_time
+        self.models = list(models or ["llama3", "phi-3:mini", "mistral", "nomic-embed-text"])
+        self.reply = reply
+        self.embedding_dim = embedding_dim
+        self.error_rate = error_rate
+        self.seed = seed
+
+        self.requests: List[Dict[str, Any]] = []
+        self._loaded = set()
+        self._failures: List[Dict[str, Any]] = []
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """URL base (sem /api)"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def generate_url(self) -> str:
+        return f"{self.url}/api/generate"
+
+    @property
+    def embeddings_url(self) -> str:
+        return f"{self.url}/api/embeddings"
+
+    def fail_next(self, count: int = 1, mode: str = "error", status: int = 500,
+                  after_tokens: int = 1, hang: float = 30.0):
+        """Programa falhas para as próximas `count` gerações/embeddings
+
+        error: responde `status` com {"error": ...}; hang: espera `hang`
+        segundos antes de responder; disconnect: fecha a conexão depois de
+        `after_tokens` tokens de um streaming (ou sem resposta, sem streaming);
+        malformed: devolve um corpo que não é JSON.
+        """
+        if mode not in FAILURE_MODES:
+            raise ValueError(f"Modo de falha desconhecido: {mode}")
+        with self._lock:
+            self._failures.extend([{"mode": mode, "status": status, "after_tokens": after_tokens,
+                                    "hang": hang}] * count)
+
+    def _next_failure(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._failures:
+                return self._failures.pop(0)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return {"mode": "error", "status": 500, "after_tokens": 1, "hang": 0.0}
+        return None
+
+    def _reply_for(self, prompt: str) -> str:
+        if callable(self.reply):
+            return self.reply(prompt)
+        if self.reply is not None:
+            return self.reply
+        words = prompt.split()[:8]
+        return f"Resposta de teste para: {' '.join(words)}. " + "Este texto simula a geração do modelo. " * 4
+
+    def embedding(self, text: str) -> List[float]:
+        """Vetor determinístico (o mesmo texto dá sempre o mesmo vetor)"""
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")) + self.seed)
+        return rng.standard_normal(self.embedding_dim).astype(np.float32).tolist()
+
+    def _load(self, model: str) -> float:
+        """Tempo de carga do modelo: só na primeira requisição"""
+        with self._lock:
+            if model in self._loaded:
+                return 0.0
+            self._loaded.add(model)
+        return self.load_time
+
+    # Rotas
+
+    def _generate(self, handler, body: Dict[str, Any]):
+        model = body.get("model", "")
+        if model not in self.models:
+            return handler.send_json(404, {"error": f'model "{model}" not found, try pulling it first'})
+
+        failure = self._next_failure()
+        stream = body.get("stream", True)  # Como no Ollama, o padrão é streaming
+        if failure and failure["mode"] == "error":
+            return handler.send_json(failure["status"], {"error": "falha injetada"})
+        if failure and failure["mode"] == "hang":
+            time.sleep(failure["hang"])
+        if failure and failure["mode"] == "malformed":
+            return handler.send_raw(200, b'{"model": "' + model.encode() + b'", "respo', "application/json")
+        if failure and failure["mode"] == "disconnect" and not stream:
+            handler.close_connection = True
+            return None
+
+        prompt = body.get("prompt", "")
+        prompt_tokens = tokenize(prompt)
+        tokens = tokenize(self._reply_for(prompt))
+        limit = (body.get("options") or {}).get("num_predict")
+        done_reason = "stop"
+        if limit is not None and 0 <= limit < len(tokens):
+            tokens, done_reason = tokens[:limit], "length"
+
+        if self._slots:
+            self._slots.acquire()
+        try:
+            load = self._load(model)
+            interval = 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+            prompt_eval = self.ttft
+            eval_time = interval * len(tokens)
+            context = list(body.get("context") or []) + [token_id(t) for t in prompt_tokens + tokens]
+            final = {
+                "model": model, "created_at": _now(), "response": "", "done": True,
+                "done_reason": done_reason, "context": context,
+                "total_duration": int((load + prompt_eval + eval_time) * 1e9),
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": len(prompt_tokens),
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(eval_time * 1e9)
+            }
+
+            time.sleep(load + self.ttft)  # Modelo frio: a carga vem antes do primeiro token
+            if not stream:
+                time.sleep(eval_time)
+                return handler.send_json(200, dict(final, response="".join(tokens)))
+
+            handler.start_stream()
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(interval)
+                if failure and failure["mode"] == "disconnect" and index >= failure["after_tokens"]:
+                    handler.close_connection = True
+                    return None
+                handler.send_chunk({"model": model, "created_at": _now(), "response": token, "done": False})
+            handler.send_chunk(final)
+            handler.end_stream()
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def handle(self, handler, method: str, path: str, body: Any):
+        """Despacha uma requisição para a rota"""
+        self.requests.append({"method": method, "path": path, "body": body})
+        if path == "/":
+            return handler.send_raw(200, b"Ollama is running", "text/plain; charset=utf-8")
+        if path == "/api/version":
+            return handler.send_json(200, {"version": "0.0.0-stub"})
+        if path == "/api/tags":
+            return handler.send_json(200, {"models": [
+                {"name": name, "model": name, "modified_at": _now(), "size": 0,
+                 "digest": f"{zlib.crc32(name.encode()):08x}",
+                 "details": {"format": "gguf", "family": name.split(":")[0]}}
+                for name in self.models
+            ]})
+        if method != "POST" or not isinstance(body, dict):
+            return handler.send_json(404 if method != "POST" else 400, {"error": "requisição inválida"})
+
+        if path == "/api/generate":
+            return self._generate(handler, body)
+        if path in ("/api/embeddings", "/api/embed"):
+            if body.get("model") not in self.models:
+                return handler.send_json(404, {"error": f'model "{body.get("model")}" not found'})
+            failure = self._next_failure()
+            if failure and failure["mode"] == "error":
+                return handler.send_json(failure["status"], {"error": "falha injetada"})
+            if failure and failure["mode"] == "hang":
+                time.sleep(failure["hang"])
+            if path == "/api/embeddings":
+                return handler.send_json(200, {"embedding": self.embedding(body.get("prompt", ""))})
+            inputs = body.get("input", "")
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            return handler.send_json(200, {"model": body["model"],
+                                           "embeddings": [self.embedding(text) for text in inputs]})
+        return handler.send_json(404, {"error": "not found"})
+
+    # Servidor
+
+    def start(self) -> bool:
+        """Sobe o servidor em segundo plano; False se a porta estiver ocupada"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Cada token sai na hora, sem ACK atrasado
+
+            def send_raw(self, status: int, data: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_json(self, status: int, payload: Dict[str, Any]):
+                self.send_raw(status, json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8")
+
+            def start_stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def send_chunk(self, payload: Dict[str, Any]):
+                data = json.dumps(payload).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def end_stream(self):
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    return self.send_json(400, {"error": "invalid JSON"})
+                try:
+                    stub.handle(self, method, self.path.split("?")[0].rstrip("/") or "/", body)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # O cliente desistiu (timeout)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Erro ao iniciar o Ollama de teste em {self.host}:{self.port}: {e}")
+            return False
+
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Para o servidor"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def main():
+    """Sobe o Ollama de teste em primeiro plano (para benchmarks manuais)"""
+    parser = argparse.ArgumentParser(description="Ollama de teste com latência programável")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Tempo até o primeiro token (s)")
+    parser.add_argument("--tps", type=float, default=30.0, help="Tokens gerados por segundo")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Carga do modelo na 1ª requisição (s)")
+    parser.add_argument("--parallel", type=int, help="Gerações simultâneas (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = OllamaStubServer(args.host, args.port, args.ttft, args.tps, args.load_time,
+                            parallel=args.parallel, error_rate=args.error_rate, seed=args.seed)
+    if not stub.start():
+        sys.exit(1)
+    print(f"🤖 Ollama de teste em {stub.url} (TTFT {args.ttft}s, {args.tps} tokens/s)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
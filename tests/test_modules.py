@@ -5,18 +5,64 @@ Testes para os módulos do Cérebro Digital da Queen
 
 import unittest
 import os
+import json
 import sys
 import tempfile
+import shutil
+import time
 import sqlite3
+from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock
 
+import numpy as np
+import requests
+
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modules.auto_optimizer import PerformanceMonitor, AutoOptimizer
+from modules.auto_optimizer import PerformanceMonitor, AutoOptimizer, WorkflowOptimizer
+from modules.metric_sketch import QuantileSketch
+from modules.metric_rollup import expire, apply_rollups
 from modules.workflow_generator import AdvancedWorkflowGenerator, WorkflowTemplate
 from modules.media_processor import ImageProcessor, AudioProcessor, MediaOrchestrator
+from modules.memory_consolidator import MemoryConsolidator, MinHashLSH
+from modules.conversation_summarizer import ConversationSummarizer
+from modules.retrieval_planner import RetrievalPlanner, RetrievalCandidate
+from modules.doc_index import DocumentIndex
+from modules.db_migrations import migrate_database, get_schema_version, MIGRATIONS
+from modules.ollama_metrics import OllamaTimingRecorder
+from modules.runtime_switches import RuntimeSwitches, ResponseCache
+from modules.resource_sampler import ResourceSampler
+from modules.profiler import ProfilingController, request_profiling
+from modules.slo import SLO, SLOEvaluator
+from modules.capacity_report import CapacityPlanner, erlang_c, mgc_wait
+from modules.dashboard import DashboardFeed, DashboardRenderer
+from modules.analytics_export import AnalyticsExporter, load_table
+from modules.n8n_ingest import ExecutionIngestor
+from modules.openmetrics import (Histogram, MetricFamily, MetricsExporter, render,
+                                 collect_monitor, collect_agents)
+from modules.tracing import Tracer, set_tracer, get_tracer
 from agents.agent_manager import AgentManager, DevelopmentAgent, MarketingAgent
+from tests.stubs.n8n_stub import N8nStubServer
+from tests.stubs.ollama_stub import OllamaStubServer
+from modules.embeddings import OllamaEmbedder
+
+_original_tracer = get_tracer()
+_trace_db = None
+
+def setUpModule():
+    """Direciona os spans dos testes para um banco temporário"""
+    global _trace_db
+    _trace_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+    _trace_db.close()
+    set_tracer(Tracer(_trace_db.name))
+
+def tearDownModule():
+    """Restaura o tracer global"""
+    get_tracer().enabled = False
+    get_tracer().flush()
+    set_tracer(_original_tracer)
+    os.unlink(_trace_db.name)
 
 class TestPerformanceMonitor(unittest.TestCase):
     """Testes para o PerformanceMonitor"""
@@ -29,11 +75,13 @@ class TestPerformanceMonitor(unittest.TestCase):
     
     def tearDown(self):
         """Limpeza após os testes"""
+        self.monitor.close()
         os.unlink(self.temp_db.name)
     
     def test_record_metric(self):
         """Testa gravação de métricas"""
         self.monitor.record_metric("test_metric", 5.0, "test context")
+        self.monitor.flush()
         
         # Verifica se foi gravado no banco
         conn = sqlite3.connect(self.temp_db.name)
@@ -62,6 +110,1402 @@ class TestPerformanceMonitor(unittest.TestCase):
         bottleneck_types = [b['type'] for b in bottlenecks]
         self.assertIn('high_latency', bottleneck_types)
         self.assertIn('high_error_rate', bottleneck_types)
+    
+    def test_ring_buffer_keeps_latest(self):
+        """Testa que o buffer circular mantém os registros mais recentes"""
+        for i in range(150):
+            self.monitor.record_metric("ring_time", float(i))
+        
+        buffer = self.monitor.metrics["ring_time"]
+        self.assertEqual(len(buffer), 100)
+        self.assertEqual(buffer.values(3), [147.0, 148.0, 149.0])
+        
+        # Todos os registros chegam ao banco, não só os do buffer
+        self.monitor.flush()
+        conn = sqlite3.connect(self.temp_db.name)
+        count = conn.execute(
+            "SELECT COUNT(*) FROM performance_metrics WHERE metric_name = 'ring_time'"
+        ).fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 150)
+    
+    def test_bottleneck_uses_tail_latency(self):
+        """Testa que travamentos raros aparecem no p95 mesmo com média baixa"""
+        # Poucas amostras: ainda sem linha de base, vale o limite fixo no p95
+        for i in range(20):
+            self.monitor.record_metric("stall_response_time", 20.0 if i % 10 == 9 else 0.5)
+        
+        bottlenecks = self.monitor.identify_bottlenecks()
+        stall = [b for b in bottlenecks if b['metric'] == "stall_response_time"]
+        
+        self.assertEqual(len(stall), 1)
+        self.assertLess(stall[0]['average_value'], 5.0)
+        self.assertAlmostEqual(stall[0]['value'], 20.0, delta=0.4)
+        
+        percentiles = self.monitor.get_percentiles("stall_response_time")
+        self.assertAlmostEqual(percentiles['p50'], 0.5, delta=0.01)
+        self.assertEqual(percentiles['count'], 20)
+    
+    def test_adaptive_baselines(self):
+        """Testa que cada métrica é julgada pela própria linha de base"""
+        for i in range(60):
+            self.monitor.record_metric("image_generation_time", 20.0 + (i % 3))
+            self.monitor.record_metric("db_write_time", 0.01)
+        
+        # Geração de imagem lenta, mas normal: sem alarme apesar de > 5s
+        self.assertEqual(self.monitor.identify_bottlenecks(), [])
+        
+        # Regressão de uma operação rápida: detectada apesar de < 5s
+        for _ in range(5):
+            self.monitor.record_metric("db_write_time", 0.2)
+        bottlenecks = self.monitor.identify_bottlenecks()
+        
+        self.assertEqual([b['metric'] for b in bottlenecks], ["db_write_time"])
+        self.assertAlmostEqual(bottlenecks[0]['baseline'], 0.01, delta=0.001)
+        self.assertGreater(bottlenecks[0]['z_score'], 3.0)
+
+    def test_first_error_after_clean_history_is_not_severe(self):
+        """Testa o piso binomial do desvio em taxas com linha de base zero"""
+        for _ in range(60):
+            self.monitor.record_metric("api_error_rate", 0.0)
+        self.monitor.record_metric("api_error_rate", 1.0)
+        
+        self.assertEqual(self.monitor.identify_bottlenecks(), [])
+        
+        # Erros repetidos continuam sendo detectados
+        for _ in range(2):
+            self.monitor.record_metric("api_error_rate", 1.0)
+        bottlenecks = self.monitor.identify_bottlenecks()
+        
+        self.assertEqual([b['type'] for b in bottlenecks], ['high_error_rate'])
+        self.assertLess(bottlenecks[0]['z_score'], 10.0)
+
+    def test_trend_uses_rollups(self):
+        """Testa tendência servida pelos rollups na resolução adequada"""
+        for value in (1.0, 2.0, 3.0):
+            self.monitor.record_metric("rollup_time", value)
+        
+        hourly = self.monitor.get_metric_trend("rollup_time", hours=24)
+        self.assertEqual(hourly[0]['resolution'], "1h")
+        self.assertEqual(sum(p['count'] for p in hourly), 3)
+        self.assertEqual(self.monitor.get_metric_trend("rollup_time", hours=1)[0]['resolution'], "1m")
+        self.assertEqual(len(self.monitor.get_metric_trend("rollup_time", resolution="raw")), 3)
+        
+        # Linhas brutas expiram, os rollups diários permanecem
+        conn = sqlite3.connect(self.temp_db.name)
+        removed = expire(conn.cursor(), now=time.time() + 10 * 86400)
+        conn.commit()
+        conn.close()
+        self.assertEqual(removed["raw"], 3)
+        daily = self.monitor.get_metric_trend("rollup_time", resolution="1d")
+        self.assertEqual(daily[0]['value'], 2.0)
+
+    def test_ollama_timings(self):
+        """Testa métricas derivadas dos tempos do Ollama"""
+        recorder = OllamaTimingRecorder(self.monitor)
+        metrics = recorder.record({
+            "response": "ok",
+            "total_duration": 3_000_000_000,
+            "load_duration": 1_000_000_000,
+            "prompt_eval_count": 100,
+            "prompt_eval_duration": 500_000_000,
+            "eval_count": 60,
+            "eval_duration": 1_500_000_000
+        }, client_latency=3.5, model="llama3", task="chat")
+        
+        self.assertAlmostEqual(metrics["ollama_load_time"], 1.0)
+        self.assertAlmostEqual(metrics["ollama_prompt_tokens_per_sec"], 200.0)
+        self.assertAlmostEqual(metrics["ollama_eval_tokens_per_sec"], 40.0)
+        self.assertAlmostEqual(metrics["ollama_queue_time"], 0.5)
+        self.assertEqual(recorder.summary()["llama3/chat"]["samples"], 1)
+    
+    def test_ollama_phase_timings_are_not_bottlenecks(self):
+        """Testa que a carga a frio do modelo não vira gargalo de latência"""
+        recorder = OllamaTimingRecorder(self.monitor)
+        for _ in range(12):
+            recorder.record({"total_duration": 9_000_000_000, "load_duration": 8_000_000_000},
+                            client_latency=9.0, model="llama3", task="chat")
+        
+        self.assertEqual(self.monitor.get_percentiles("ollama_load_time")["count"], 12)
+        self.assertEqual(self.monitor.identify_bottlenecks(), [])
+
+class TestAutoOptimizer(unittest.TestCase):
+    """Testes para o AutoOptimizer em malha fechada"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.monitor = PerformanceMonitor(self.temp_db.name)
+        self.switches = RuntimeSwitches()
+        self.optimizer = AutoOptimizer(self.monitor, switches=self.switches,
+                                       evaluation_window=60, persistence=2)
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 8.0)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        self.monitor.close()
+        os.unlink(self.temp_db.name)
+    
+    def _history(self):
+        conn = sqlite3.connect(self.temp_db.name)
+        row = conn.execute("""
+            SELECT action, before_value, after_value, success, rolled_back
+            FROM optimization_history ORDER BY id DESC
+        """).fetchone()
+        conn.close()
+        return row
+    
+    def test_keeps_optimization_that_helps(self):
+        """Testa que a chave fica ligada quando a métrica melhora"""
+        now = time.time()
+        self.optimizer.run_cycle(now)
+        self.assertFalse(self.switches.is_enabled("cache_responses"))  # Ainda não persistiu
+        
+        self.optimizer.run_cycle(now)
+        self.assertTrue(self.switches.is_enabled("cache_responses"))
+        self.assertEqual(self.optimizer.active_trial["action"], "cache_responses")
+        
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 1.0)
+        self.optimizer.run_cycle(now + 61)
+        
+        self.assertIsNone(self.optimizer.active_trial)
+        self.assertTrue(self.switches.is_enabled("cache_responses"))
+        action, before, after, success, rolled_back = self._history()
+        self.assertEqual(action, "cache_responses")
+        self.assertAlmostEqual(before, 8.0, delta=0.2)
+        self.assertAlmostEqual(after, 1.0, delta=0.05)
+        self.assertEqual((success, rolled_back), (1, 0))
+        self.assertIn("**cache_responses** em response_time: 1/1 mantidas",
+                      self.optimizer.generate_optimization_report())
+    
+    def test_rolls_back_optimization_that_does_not_help(self):
+        """Testa que a chave é desfeita quando a métrica não melhora"""
+        now = time.time()
+        self.optimizer.run_cycle(now)
+        self.optimizer.run_cycle(now)
+        
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 8.0)
+        self.optimizer.run_cycle(now + 61)
+        
+        self.assertFalse(self.switches.is_enabled("cache_responses"))
+        self.assertEqual(self._history()[3:], (0, 1))
+    
+    def test_only_actions_that_affect_the_metric_are_tried(self):
+        """Testa que ações sem efeito sobre a métrica não ocupam a tentativa"""
+        now = time.time()
+        self.optimizer.run_cycle(now)
+        self.optimizer.run_cycle(now)
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 8.0)
+        self.optimizer.run_cycle(now + 61)
+        self.assertFalse(self.switches.is_enabled("cache_responses"))
+        
+        # cache_responses falhou; parallel_processing só atua na mídia
+        self.optimizer.run_cycle(now + 400)
+        self.optimizer.run_cycle(now + 400)
+        
+        self.assertIsNone(self.optimizer.active_trial)
+        self.assertFalse(self.switches.is_enabled("parallel_processing"))
+    
+    def test_requires_significant_improvement(self):
+        """Testa que uma queda do p95 sem mudança significativa da distribuição é desfeita"""
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 1.0)
+        now = time.time()
+        self.optimizer.run_cycle(now)
+        self.optimizer.run_cycle(now)
+        self.assertEqual(self.optimizer.active_trial["action"], "cache_responses")
+        
+        # p95 cai de 8s para 7s (> 10%), mas as amostras não ficam menores no geral
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 7.0)
+        self.optimizer.run_cycle(now + 61)
+        
+        self.assertFalse(self.switches.is_enabled("cache_responses"))
+        conn = sqlite3.connect(self.temp_db.name)
+        p_value, before_samples, after_samples = conn.execute(
+            "SELECT p_value, before_samples, after_samples FROM optimization_history"
+        ).fetchone()
+        conn.close()
+        self.assertGreater(p_value, 0.05)
+        self.assertEqual((before_samples, after_samples), (20, 10))
+    
+    def test_event_driven_loop(self):
+        """Testa que o loop reage às métricas em segundos e para prontamente"""
+        optimizer = AutoOptimizer(self.monitor, switches=self.switches, debounce=0.05, persistence=2)
+        optimizer.start_monitoring()
+        try:
+            for _ in range(2):  # Cada lote de métricas novas dispara uma avaliação
+                self.monitor.record_metric("response_time", 8.0)
+                deadline = time.time() + 2
+                while self.monitor.ingest_event.is_set() and time.time() < deadline:
+                    time.sleep(0.01)
+                time.sleep(0.1)
+            self.assertTrue(self.switches.is_enabled("cache_responses"))
+        finally:
+            start = time.time()
+            optimizer.stop_monitoring()
+        
+        self.assertLess(time.time() - start, 1.0)
+        self.assertFalse(optimizer.running)
+    
+    def test_slo_burn_rate_prioritises_optimization(self):
+        """Testa o consumo do orçamento em múltiplas janelas e a prioridade no otimizador"""
+        for _ in range(10):
+            self.monitor.record_metric("response_time", 1.0)
+        evaluator = SLOEvaluator(self.monitor, [
+            SLO("chat_p95", "response_time", objective=0.95, threshold=4.0),
+            SLO("chat_errors", "ollama_error_rate", objective=0.99, kind="error_rate")
+        ])
+        
+        chat, errors = evaluator.evaluate()
+        self.assertAlmostEqual(chat["compliance"], 0.5)  # 10 de 20 amostras acima de 4s
+        self.assertAlmostEqual(chat["burn_rates"]["1h"], 10.0)
+        self.assertEqual([a["alert"] for a in chat["alerts"]], ["lento"])  # 10x: acima de 6x, abaixo de 14.4x
+        self.assertIsNone(errors["compliance"])
+        
+        # Alerta de SLO dispensa a persistência
+        optimizer = AutoOptimizer(self.monitor, switches=self.switches, persistence=5,
+                                  slo_evaluator=evaluator)
+        optimizer.run_cycle()
+        self.assertEqual(optimizer.active_trial["metric"], "response_time")
+    
+    def test_memory_pressure_clears_caches(self):
+        """Testa que a pressão de memória aciona as ações registradas, com cooldown"""
+        cleared = []
+        self.optimizer.register_memory_action("clear_cache", lambda: cleared.append(True))
+        sampler = ResourceSampler(self.monitor, self.optimizer, memory_budget=1)
+        
+        metrics = sampler.check()
+        self.assertGreater(metrics["process_rss_bytes"], 0)
+        self.assertIn("gc_gen0_objects", metrics)
+        self.assertEqual(len(self.monitor.metrics["memory_usage"]), 1)
+        
+        sampler.check()  # Dentro do cooldown: não repete
+        self.assertEqual(cleared, [True])
+        self.assertEqual(self._history()[0], "clear_cache,optimize_memory,garbage_collection")
+    
+    def test_sqlite_counters_come_from_python_sqlite(self):
+        """Testa que os contadores do SQLite vêm da biblioteca do módulo sqlite3"""
+        import _sqlite3
+        from modules import resource_sampler
+        
+        if resource_sampler._sqlite_lib is None:
+            self.skipTest("SQLite do Python sem símbolos acessíveis")
+        self.assertEqual(os.path.dirname(resource_sampler._sqlite_lib._name),
+                         os.path.dirname(_sqlite3.__file__))
+        
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (x)")
+        self.assertGreater(resource_sampler.sqlite_memory_used(), 0)
+        conn.close()
+
+class TestResponseCache(unittest.TestCase):
+    """Testes para o ResponseCache"""
+    
+    def test_key_depends_on_session_and_context(self):
+        """Testa que a mesma pergunta em outro contexto não reaproveita a resposta"""
+        cache = ResponseCache()
+        first = ResponseCache.make_key("llama3", "chat", "Resumo: workflows\nPergunta atual: e o segundo?", "s1")
+        cache.put(first, {"response": "O segundo nó"})
+        
+        self.assertEqual(cache.get(first), {"response": "O segundo nó"})
+        self.assertIsNone(cache.get(ResponseCache.make_key(
+            "llama3", "chat", "Resumo: workflows\nPergunta atual: e o segundo?", "s2")))
+        self.assertIsNone(cache.get(ResponseCache.make_key(
+            "llama3", "chat", "Resumo: receitas\nPergunta atual: e o segundo?", "s1")))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+    
+    def test_lru_and_ttl(self):
+        """Testa descarte do menos usado e expiração"""
+        cache = ResponseCache(max_entries=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+        with patch('modules.runtime_switches.time.time', return_value=time.time() + 61):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 1)
+
+class TestProfilingController(unittest.TestCase):
+    """Testes para o profiling sob demanda"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'perf.db')
+        self.profiler = ProfilingController(os.path.join(self.temp_dir, 'profiles'), self.db_path)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_profiles_next_calls_and_links_history(self):
+        """Testa que só as N chamadas armadas são perfiladas e registradas"""
+        self.assertTrue(self.profiler.arm(2, reason="teste"))
+        self.assertFalse(self.profiler.arm(1))  # Já armado
+        
+        for _ in range(3):
+            with self.profiler.profile("process_prompt"):
+                sorted(str(i) for i in range(20000))
+        
+        self.assertFalse(self.profiler.armed)
+        sessions = self.profiler.recent_sessions()
+        self.assertEqual(len(sessions), 1)
+        files = sorted(os.listdir(sessions[0]['artifact']))
+        self.assertEqual(files, ["01_process_prompt.prof", "01_process_prompt.txt",
+                                 "02_process_prompt.prof", "02_process_prompt.txt"])
+        with open(os.path.join(sessions[0]['artifact'], files[1]), encoding='utf-8') as f:
+            report = f.read()
+        self.assertIn("cumulative", report)
+        self.assertIn("Alocações", report)
+    
+    def test_arm_file_from_cli(self):
+        """Testa o pedido gravado por outro processo, no modo de amostragem"""
+        request_profiling(self.profiler.output_dir, calls=1, mode="sampling")
+        
+        with self.profiler.profile("process_prompt") as session:
+            self.assertEqual(session["mode"], "sampling")
+            time.sleep(0.05)
+        
+        artifact = self.profiler.recent_sessions()[0]['artifact']
+        with open(os.path.join(artifact, "01_process_prompt.stacks"), encoding='utf-8') as f:
+            self.assertIn("test_arm_file_from_cli", f.read())
+
+class TestQuantileSketch(unittest.TestCase):
+    """Testes para o QuantileSketch"""
+    
+    def test_quantiles_within_relative_error(self):
+        """Testa precisão e mesclagem do sketch"""
+        import numpy as np
+        values = np.random.RandomState(0).lognormal(0, 1, 5000)
+        
+        first, second = QuantileSketch(), QuantileSketch()
+        first.update(values[:2500])
+        second.update(values[2500:])
+        first.merge(second)
+        
+        self.assertEqual(first.count, 5000)
+        for q in (0.5, 0.9, 0.99):
+            expected = np.quantile(values, q, method="lower")
+            self.assertLess(abs(first.quantile(q) - expected) / expected, 0.02)
+        
+        # Contagem acima de um limite, usada pelos SLOs
+        self.assertAlmostEqual(first.count_above(2.0) / 5000, (values > 2.0).mean(), delta=0.01)
+        self.assertEqual(first.count_above(first.max), 0)
+
+class TestOpenMetrics(unittest.TestCase):
+    """Testes para a exposição de métricas"""
+    
+    def test_render_formats(self):
+        """Testa contadores, histogramas e as duas variantes do formato"""
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+        
+        tasks = MetricFamily("queen_tasks", "counter", "Tarefas")
+        tasks.add(3, {"agent": 'dev "1"'})
+        latency = MetricFamily("queen_latency_seconds", "histogram", "Latência", "seconds")
+        latency.add_histogram(histogram, {"metric": "response_time"})
+        
+        text = render([tasks, latency])
+        self.assertIn('queen_tasks_total{agent="dev \\"1\\""} 3.0', text)
+        self.assertIn('queen_latency_seconds_bucket{metric="response_time",le="1.0"} 3.0', text)
+        self.assertIn('queen_latency_seconds_bucket{metric="response_time",le="+Inf"} 4.0', text)
+        self.assertIn('queen_latency_seconds_sum{metric="response_time"} 4.05', text)
+        self.assertIn("# UNIT queen_latency_seconds seconds", text)
+        self.assertTrue(text.endswith("# EOF\n"))
+        
+        # Formato Prometheus clássico: TYPE com _total e sem EOF
+        text = render([tasks, latency], openmetrics=False)
+        self.assertIn("# TYPE queen_tasks_total counter", text)
+        self.assertNotIn("# EOF", text)
+    
+    def test_scrape_endpoint(self):
+        """Testa o scrape HTTP sem consultas ao banco"""
+        import requests
+        temp_dir = tempfile.mkdtemp()
+        monitor = PerformanceMonitor(os.path.join(temp_dir, "performance.db"))
+        manager = AgentManager(os.path.join(temp_dir, "agents.db"))
+        exporter = MetricsExporter(port=0)
+        exporter.register(lambda: collect_monitor(monitor))
+        exporter.register(lambda: collect_agents(manager))
+        
+        try:
+            monitor.record_metric("response_time", 0.3)
+            manager.execute_task({"type": "code_generation", "data": {"requirements": "api"}})
+            self.assertTrue(exporter.start())
+            
+            response = requests.get(f"http://127.0.0.1:{exporter.port}/metrics",
+                                    headers={"Accept": "application/openmetrics-text"}, timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("application/openmetrics-text", response.headers["Content-Type"])
+            self.assertIn('queen_latency_seconds_count{metric="response_time"} 1.0', response.text)
+            self.assertIn('queen_agent_tasks_total{agent="dev_agent",result="success"} 1.0', response.text)
+            self.assertIn('queen_queue_depth{queue="agent_tasks"} 0.0', response.text)
+            
+            # As famílias de vários coletores com o mesmo nome saem uma única vez
+            self.assertEqual(response.text.count("# TYPE queen_queue_depth gauge"), 1)
+        finally:
+            exporter.stop()
+            monitor.close()
+            shutil.rmtree(temp_dir)
+
+class TestDashboard(unittest.TestCase):
+    """Testes para o painel de performance"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.monitor = PerformanceMonitor(self.temp_db.name)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        self.monitor.close()
+        os.unlink(self.temp_db.name)
+    
+    def test_incremental_updates(self):
+        """Testa que novas leituras trazem só o balde corrente e não duplicam pontos"""
+        # Todas as amostras precisam cair no mesmo balde de um minuto
+        if time.time() % 60 > 58:
+            time.sleep(60 - time.time() % 60)
+        
+        for value in (0.5, 1.0, 4.0):
+            self.monitor.record_metric("response_time", value)
+        self.monitor.record_metric("response_cache_hit", 1.0)
+        self.monitor.record_metric("response_cache_hit", 0.0)
+        self.monitor.flush()
+        
+        feed = DashboardFeed(self.temp_db.name)
+        renderer = DashboardRenderer(width=4, height=3)
+        
+        updates = feed.poll()
+        self.assertEqual(updates["response_time:count"][-1][1], 3.0)
+        self.assertEqual(updates["response_cache_hit:mean"][-1][1], 0.5)
+        self.assertTrue(renderer.update(updates))
+        
+        # Mais uma amostra no mesmo balde: o ponto é atualizado, não acrescentado
+        self.monitor.record_metric("response_time", 2.0)
+        self.monitor.flush()
+        updates = feed.poll()
+        self.assertEqual(len(updates["response_time:count"]), 1)
+        self.assertEqual(updates["response_time:count"][0][1], 4.0)
+        renderer.update(updates)
+        self.assertEqual(renderer.point_count("response_time:count"), 1)
+        
+        data, width, height = renderer.render()
+        self.assertEqual(len(data), width * height * 4)
+
+class TestCapacityPlanner(unittest.TestCase):
+    """Testes para o relatório de capacidade"""
+    
+    def test_queue_formulas(self):
+        """Testa Erlang C e a espera M/G/c contra os casos fechados"""
+        self.assertAlmostEqual(erlang_c(1, 0.5), 0.5)  # M/M/1: P(espera) = ρ
+        self.assertAlmostEqual(erlang_c(2, 1.0), 1 / 3)
+        
+        # M/M/1 (cv² = 1): Wq = ρ·S / (1 - ρ); M/D/1 (cv² = 0) espera a metade
+        self.assertAlmostEqual(mgc_wait(0.1, 4.0, 1.0, 1)["wait"], 0.4 * 4 / 0.6)
+        self.assertAlmostEqual(mgc_wait(0.1, 4.0, 0.0, 1)["wait"], 0.4 * 4 / 0.6 / 2)
+        self.assertEqual(mgc_wait(0.3, 4.0, 1.0, 1)["wait"], float("inf"))
+    
+    def test_report_from_databases(self):
+        """Testa o relatório lido dos bancos de métricas, conversas e agentes"""
+        temp_dir = tempfile.mkdtemp()
+        databases = {name: os.path.join(temp_dir, f"{name}.db") for name in ("memory", "performance", "agents")}
+        for name, path in databases.items():
+            migrate_database(path, name)
+        
+        conn = sqlite3.connect(databases["performance"])
+        for hour in range(3):
+            for i in range(20 * (hour + 1)):  # 20, 40 e 60 requisições por hora
+                conn.execute("""
+                    INSERT INTO performance_metrics (timestamp, metric_name, metric_value, context)
+                    VALUES (?, 'ollama_total_time', ?, 'model=llama3 task=chat')
+                """, (f"2026-10-19 0{hour}:{i % 60:02d}:00", 30.0 + i % 2 * 20))
+        conn.commit()
+        conn.close()
+        
+        try:
+            planner = CapacityPlanner(databases, now=datetime(2026, 10, 19, 12), max_wait=5.0).load()
+            rates = planner.arrival_rates().set_index("recurso")
+            self.assertEqual(rates.loc["ollama", "total"], 120)
+            self.assertEqual(rates.loc["ollama", "máx/h"], 60)
+            
+            service = planner.service_times().iloc[0]
+            self.assertEqual(service["tarefa"], "llama3/chat")
+            self.assertAlmostEqual(service["média"], 40.0)
+            
+            # Pico de ~58 req/h com 40s cada: 64% de utilização; 2x satura um servidor
+            report = planner.to_markdown()
+            self.assertIn("ollama: a partir de 1x", report)
+            self.assertIn("| ollama | 2x | 1 | 1.29 | 1 | ∞ | ∞ |", report)
+            self.assertIn("<h2>Fila projetada", planner.to_html())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_ollama_history_beyond_raw_retention(self):
+        """Testa chegadas e serviço do Ollama lidos do rollup horário além da retenção bruta"""
+        temp_dir = tempfile.mkdtemp()
+        databases = {name: os.path.join(temp_dir, f"{name}.db") for name in ("memory", "performance", "agents")}
+        for name, path in databases.items():
+            migrate_database(path, name)
+        
+        now = datetime(2026, 10, 19, 12)
+        epoch_now = (now - datetime(1970, 1, 1)).total_seconds()
+        conn = sqlite3.connect(databases["performance"])
+        # Dez dias de rollup (10 req/h a 20s); as linhas brutas antigas já expiraram
+        apply_rollups(conn.cursor(), [
+            (epoch_now - day * 86400 - 3600 + i, "ollama_total_time", 20.0)
+            for day in range(10) for i in range(10)
+        ])
+        conn.execute("""
+            INSERT INTO performance_metrics (timestamp, metric_name, metric_value, context)
+            VALUES ('2026-10-19 10:00:00', 'ollama_total_time', 20.0, 'model=llama3 task=chat')
+        """)
+        conn.commit()
+        conn.close()
+        
+        try:
+            planner = CapacityPlanner(databases, now=now).load()
+            rates = planner.arrival_rates().set_index("recurso")
+            self.assertEqual(rates.loc["ollama", "total"], 100)
+            
+            service = planner.service_times().set_index("tarefa")
+            self.assertEqual(service.loc["(todas)", "amostras"], 100)
+            self.assertAlmostEqual(service.loc["(todas)", "média"], 20.0)
+            self.assertEqual(service.loc["llama3/chat", "amostras"], 1)
+            self.assertAlmostEqual(planner.utilisation().iloc[0]["serviço médio (s)"], 20.0)
+            self.assertIn("cobrem só os últimos 2 dias", planner.to_markdown())
+        finally:
+            shutil.rmtree(temp_dir)
+
+class TestAnalyticsExport(unittest.TestCase):
+    """Testes para a exportação colunar incremental"""
+    
+    def test_incremental_export(self):
+        """Testa que a segunda exportação só grava as linhas novas e os rollups"""
+        temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(temp_dir, "performance.db")
+        output_dir = os.path.join(temp_dir, "exports")
+        monitor = PerformanceMonitor(db_path)
+        
+        if time.time() % 60 > 58:
+            time.sleep(60 - time.time() % 60)  # Mantém as amostras no mesmo balde de 1 minuto
+        
+        try:
+            for i in range(5):
+                monitor.record_metric("response_time", 0.5 + i)
+            monitor.flush()
+            
+            exporter = AnalyticsExporter(output_dir, {"performance": db_path},
+                                         chunk_size=2, export_format="npz")
+            first = exporter.export_database("performance")
+            self.assertEqual(first["performance_metrics"], 5)
+            self.assertEqual(first["metric_rollup_1m"], 1)
+            
+            monitor.record_metric("response_time", 9.0)
+            monitor.flush()
+            second = exporter.export_database("performance")
+            self.assertEqual(second["performance_metrics"], 1)
+            
+            # 5 linhas em blocos de 2 (3 partes) + 1 parte com a linha nova
+            state = exporter.load_manifest("performance")["tables"]["performance_metrics"]
+            self.assertEqual(state["parts"], 4)
+            
+            metrics = load_table(output_dir, "performance", "performance_metrics")
+            self.assertEqual(list(metrics["metric_value"]), [0.5, 1.5, 2.5, 3.5, 4.5, 9.0])
+            
+            # O balde regravado aparece uma vez, com a contagem atualizada
+            rollups = load_table(output_dir, "performance", "metric_rollup_1m")
+            self.assertEqual(len(rollups), 1)
+            self.assertEqual(rollups.iloc[0]["count"], 6)
+            self.assertEqual(QuantileSketch.from_bytes(rollups.iloc[0]["sketch"]).count, 6)
+        finally:
+            monitor.close()
+            shutil.rmtree(temp_dir)
+
+class TestExecutionIngestor(unittest.TestCase):
+    """Testes para a ingestão de execuções do n8n"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.ingestor = ExecutionIngestor("http://n8n/api/v1", os.path.join(self.temp_dir, "performance.db"),
+                                          page_size=2)
+        self.executions = {"wf1": [], "wf2": []}
+        self.requests = []
+        self.workflow = {"name": "Leads", "nodes": [], "connections": {}}
+        self.failing_cursors = set()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def _execution(self, workflow_id, execution_id, finished=True, status="success", run_data=None):
+        self.executions[workflow_id].insert(0, {
+            "data": {"resultData": {"runData": run_data or {}}},
+            "id": str(execution_id), "workflowId": workflow_id, "finished": finished,
+            "status": status if finished else "running", "mode": "trigger",
+            "startedAt": "2026-10-19T10:00:00.000Z",
+            "stoppedAt": "2026-10-19T10:00:04.000Z" if finished else None
+        })
+    
+    def _fake_get(self, url, params=None, timeout=None):
+        """API do n8n em memória: mais novas primeiro, cursor = posição"""
+        response = Mock(status_code=200)
+        if "/workflows/" in url:
+            response.json.return_value = self.workflow
+            return response
+        
+        self.requests.append((url.rsplit("/", 1)[-1], dict(params)))
+        if params.get("cursor") in self.failing_cursors:
+            self.failing_cursors.discard(params["cursor"])
+            raise requests.ConnectionError("n8n caiu")
+        items = ([{"id": w} for w in self.executions] if url.endswith("/workflows")
+                 else self.executions[params["workflowId"]])
+        start = int(params.get("cursor", 0))
+        end = start + params["limit"]
+        response.json.return_value = {"data": items[start:end],
+                                      "nextCursor": str(end) if end < len(items) else None}
+        return response
+    
+    def test_incremental_paged_ingestion(self):
+        """Testa a paginação por cursor e que a segunda ingestão só busca as novas"""
+        for execution_id in (1, 2, 3, 4, 5):
+            self._execution("wf1", execution_id, status="error" if execution_id == 2 else "success")
+        self._execution("wf1", 6, finished=False)
+        self._execution("wf2", 10)
+        
+        with patch("requests.Session.get", side_effect=self._fake_get):
+            self.assertEqual(self.ingestor.ingest_all(), {"wf1": 6, "wf2": 1})
+            self.assertEqual(self.ingestor.get_watermark("wf1"), 5)  # a 6 ainda está rodando
+            
+            self.executions["wf1"][0].update(finished=True, status="success",
+                                             stoppedAt="2026-10-19T10:00:02.000Z")
+            self._execution("wf1", 7)
+            self.requests.clear()
+            self.assertEqual(self.ingestor.ingest_workflow("wf1"), 2)
+        
+        # Sondagem + páginas até alcançar a marca (5), sem ler as 2 restantes
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.requests[0][1]["limit"], 1)
+        self.assertEqual(self.ingestor.get_watermark("wf1"), 7)
+        
+        rows = self.ingestor.executions("wf1")
+        self.assertEqual([row["execution_id"] for row in rows], [7, 6, 5, 4, 3, 2, 1])
+        self.assertEqual(rows[1]["duration"], 2.0)
+        
+        metrics = WorkflowOptimizer(ingestor=self.ingestor)._calculate_workflow_metrics(rows)
+        self.assertEqual(metrics["total_executions"], 7)
+        self.assertAlmostEqual(metrics["error_rate"], 1 / 7)
+    
+    def test_failed_page_resumes_from_cursor(self):
+        """Testa que as páginas gravadas antes de uma falha não são baixadas de novo"""
+        for execution_id in (1, 2, 3, 4, 5):
+            self._execution("wf1", execution_id)
+        self.failing_cursors.add("4")
+        
+        with patch("requests.Session.get", side_effect=self._fake_get):
+            with self.assertRaises(requests.ConnectionError):
+                self.ingestor.ingest_workflow("wf1")
+            
+            # Páginas [5, 4] e [3, 2] gravadas; a marca não passa da execução 1, ainda não lida
+            self.assertEqual([row["execution_id"] for row in self.ingestor.executions("wf1")], [5, 4, 3, 2])
+            self.assertEqual(self.ingestor.get_state("wf1"), (0, "4", 5))
+            
+            self.requests.clear()
+            self.assertEqual(self.ingestor.ingest_workflow("wf1"), 1)
+        
+        # Só a página que faltava e a sondagem da nova passada
+        self.assertEqual([params.get("cursor") for _, params in self.requests], ["4", None])
+        self.assertEqual(self.requests[1][1]["limit"], 1)
+        self.assertEqual(self.ingestor.get_state("wf1"), (5, None, None))
+        self.assertEqual(len(self.ingestor.executions("wf1")), 5)
+    
+    def test_node_profile_and_critical_path(self):
+        """Testa o tempo por nó, o caminho crítico e as sugestões apontando o nó"""
+        def link(node):
+            return [[{"node": node, "type": "main", "index": 0}]]
+        
+        # Gatilho -> API -> Código e Gatilho -> Ajuste -> Código; Código volta para a API (laço)
+        self.workflow = {"name": "Leads", "nodes": [
+            {"name": "Gatilho", "type": "n8n-nodes-base.scheduleTrigger"},
+            {"name": "API", "type": "n8n-nodes-base.httpRequest"},
+            {"name": "Ajuste", "type": "n8n-nodes-base.set"},
+            {"name": "Código", "type": "n8n-nodes-base.code"}
+        ], "connections": {"Gatilho": {"main": [[{"node": "API", "type": "main", "index": 0},
+                                                 {"node": "Ajuste", "type": "main", "index": 0}]]},
+                           "API": {"main": link("Código")}, "Ajuste": {"main": link("Código")},
+                           "Código": {"main": link("API")}}}
+        
+        for execution_id in range(1, 11):
+            failed = execution_id <= 2
+            self._execution("wf1", execution_id, status="error" if failed else "success", run_data={
+                "Gatilho": [{"startTime": 0, "executionTime": 5}],
+                # Duas voltas do laço: 2s + 1s por execução
+                "API": [{"startTime": 5, "executionTime": 2000},
+                        {"startTime": 3000, "executionTime": 1000 + 100 * execution_id}],
+                "Ajuste": [{"startTime": 5, "executionTime": 20}],
+                "Código": [{"startTime": 2100, "executionTime": 300,
+                            "error": {"message": "falhou"} if failed else None}]
+            })
+        self._execution("wf1", 11, finished=False)
+        
+        with patch("requests.Session.get", side_effect=self._fake_get):
+            optimizer = WorkflowOptimizer(ingestor=self.ingestor)
+            metrics = optimizer.analyze_workflow_performance("wf1")
+        
+        # A execução ainda rodando não entra nas taxas
+        self.assertEqual(metrics["total_executions"], 11)
+        self.assertEqual(metrics["finished_executions"], 10)
+        self.assertAlmostEqual(metrics["error_rate"], 0.2)
+        
+        nodes = {node["node"]: node for node in metrics["nodes"]}
+        self.assertAlmostEqual(nodes["API"]["mean"], 3.55)
+        self.assertAlmostEqual(nodes["Código"]["error_rate"], 0.2)
+        self.assertEqual(metrics["critical_path"], ["Gatilho", "API", "Código"])
+        self.assertEqual(metrics["bottlenecks"][0]["node"], "API")
+        
+        suggestions = optimizer.suggest_optimizations(metrics)
+        self.assertTrue(suggestions[0].startswith("O nó 'API' responde por 92% do caminho crítico"))
+        self.assertIn("O nó 'Código' falha em 20% das execuções", suggestions[1])
+
+class TestN8nStub(unittest.TestCase):
+    """Testes da ingestão e da importação contra o n8n de teste (HTTP de verdade)"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stub = N8nStubServer(seed=7)
+        self.workflow_ids = self.stub.generate_history(workflows=3, executions=120, error_rate=0.1, running=1)
+        self.assertTrue(self.stub.start())
+        self.ingestor = ExecutionIngestor(self.stub.api_url, os.path.join(self.temp_dir, "performance.db"),
+                                          page_size=50, max_workers=3)
+    
+    def tearDown(self):
+        self.stub.stop()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_ingestion_and_webhook(self):
+        """Testa a ingestão paginada, os erros injetados e a execução disparada por webhook"""
+        self.assertEqual(self.ingestor.ingest_all(), {"1": 120, "2": 120, "3": 120})
+        
+        metrics = WorkflowOptimizer(ingestor=self.ingestor).analyze_workflow_performance("1")
+        self.assertEqual(metrics["finished_executions"], 119)
+        self.assertGreater(metrics["error_rate"], 0)
+        self.assertEqual(metrics["critical_path"][0], "Gatilho")
+        
+        response = requests.post(f"{self.stub.url}/webhook/sintetico-1", json={"email": "a@b.c"}, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(requests.get(self.stub.url, timeout=5).status_code, 200)
+        
+        # Um worker: a falha injetada cai na primeira requisição, a do workflow 1
+        self.ingestor.max_workers = 1
+        self.stub.fail_next(1)
+        self.assertEqual(self.ingestor.ingest_all(self.workflow_ids), {"1": -1, "2": 1, "3": 1})
+        
+        # A execução em andamento é relida junto com a nova, disparada pelo webhook
+        self.assertEqual(self.ingestor.ingest_all(["1"]), {"1": 2})
+    
+    def test_import_workflow(self):
+        """Testa a importação de um workflow gerado pela API"""
+        workflow = AdvancedWorkflowGenerator().templates["email_marketing"].to_n8n_json()
+        response = requests.post(f"{self.stub.api_url}/workflows", json=workflow, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        
+        created = requests.get(f"{self.stub.api_url}/workflows/{response.json()['id']}", timeout=5).json()
+        self.assertEqual(created["name"], workflow["name"])
+        self.assertFalse(created["active"])
+        self.assertEqual(requests.post(f"{self.stub.api_url}/workflows", json={}, timeout=5).status_code, 400)
+
+class TestOllamaStub(unittest.TestCase):
+    """Testes das métricas do Ollama contra o Ollama de teste (HTTP de verdade)"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stub = OllamaStubServer(ttft=0.1, tokens_per_sec=100, load_time=0.2,
+                                     reply="um dois três quatro cinco seis")
+        self.assertTrue(self.stub.start())
+    
+    def tearDown(self):
+        self.stub.stop()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_timings_context_and_embeddings(self):
+        """Testa os tempos nominais, a carga do modelo frio e o contexto devolvido"""
+        monitor = PerformanceMonitor(os.path.join(self.temp_dir, "performance.db"))
+        recorder = OllamaTimingRecorder(monitor)
+        try:
+            for expected_load in (0.2, 0.0):  # só a primeira requisição carrega o modelo
+                start = time.time()
+                data = requests.post(self.stub.generate_url, json={
+                    "model": "llama3", "prompt": "olá mundo", "stream": False
+                }, timeout=5).json()
+                metrics = recorder.record(data, time.time() - start, "llama3")
+                self.assertAlmostEqual(metrics["ollama_load_time"], expected_load)
+                self.assertAlmostEqual(metrics["ollama_eval_tokens_per_sec"], 100.0)
+                self.assertAlmostEqual(metrics["ollama_prompt_eval_time"], 0.1)
+                # A carga do modelo frio soma ao TTFT, não é absorvida por ele
+                self.assertGreaterEqual(metrics["ollama_client_time"], expected_load + 0.1 + 0.06)
+            
+            self.assertEqual(data["response"], "um dois três quatro cinco seis")
+            follow_up = requests.post(self.stub.generate_url, json={
+                "model": "llama3", "prompt": "e agora", "context": data["context"], "stream": False
+            }, timeout=5).json()
+            self.assertEqual(follow_up["context"][:len(data["context"])], data["context"])
+            self.assertEqual(len(follow_up["context"]), len(data["context"]) + 2 + 6)
+        finally:
+            monitor.close()
+        
+        vectors = OllamaEmbedder(url=self.stub.embeddings_url).embed(["a", "b", "a"])
+        self.assertEqual(vectors.shape, (3, 768))
+        self.assertTrue(np.allclose(vectors[0], vectors[2]))
+    
+    def test_streaming_and_failures(self):
+        """Testa o streaming (TTFT, limite de tokens) e as falhas programadas"""
+        start = time.time()
+        with requests.post(self.stub.generate_url, json={
+            "model": "llama3", "prompt": "oi", "options": {"num_predict": 3}
+        }, stream=True, timeout=5) as response:
+            first_token, chunks = None, []
+            for line in response.iter_lines():
+                first_token = first_token or time.time() - start
+                chunks.append(json.loads(line))
+        
+        self.assertGreaterEqual(first_token, 0.2)  # modelo frio: a carga atrasa o primeiro token
+        self.assertEqual("".join(chunk["response"] for chunk in chunks), "um dois três ")
+        self.assertEqual(chunks[-1]["done_reason"], "length")
+        self.assertEqual(chunks[-1]["eval_count"], 3)
+        
+        self.stub.fail_next(1, "error", status=503)
+        self.assertEqual(requests.post(self.stub.generate_url, json={
+            "model": "llama3", "prompt": "oi", "stream": False}, timeout=5).status_code, 503)
+        
+        self.stub.fail_next(1, "disconnect", after_tokens=2)
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            with requests.post(self.stub.generate_url, json={"model": "llama3", "prompt": "oi"},
+                               stream=True, timeout=5) as response:
+                list(response.iter_lines())
+        
+        self.assertEqual(requests.post(self.stub.generate_url, json={"model": "gpt", "prompt": "oi"},
+                                       timeout=5).status_code, 404)
+
+class TestMemoryConsolidator(unittest.TestCase):
+    """Testes para o MemoryConsolidator"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("""
+            CREATE TABLE memory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt TEXT,
+                response TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                session_id TEXT,
+                context TEXT,
+                confidence REAL DEFAULT 0.8
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO memory (prompt, response, confidence) VALUES (?, ?, ?)",
+            [
+                ("Como instalar o Ollama no Windows?", "Resposta 1", 0.8),
+                ("como instalar o ollama no windows", "Resposta 2", 0.9),
+                ("Como instalar o Ollama no Windows??", "Resposta 3", 0.8),
+                ("Crie uma campanha de marketing para Instagram", "Resposta 4", 0.8)
+            ]
+        )
+        conn.commit()
+        conn.close()
+        
+        self.consolidator = MemoryConsolidator(self.temp_db.name)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        os.unlink(self.temp_db.name)
+    
+    def test_minhash_similarity(self):
+        """Testa estimativa de similaridade das assinaturas"""
+        lsh = MinHashLSH()
+        sig_a = lsh.signature("Como instalar o Ollama no Windows?")
+        sig_b = lsh.signature("como instalar o ollama no windows")
+        sig_c = lsh.signature("Crie uma campanha de marketing")
+        
+        self.assertEqual(lsh.estimate_similarity(sig_a, sig_b), 1.0)
+        self.assertLess(lsh.estimate_similarity(sig_a, sig_c), 0.5)
+    
+    def test_consolidate(self):
+        """Testa fusão de memórias quase duplicadas"""
+        stats = self.consolidator.consolidate()
+        
+        self.assertEqual(stats["groups"], 1)
+        self.assertEqual(stats["merged"], 2)
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        rows = conn.execute(
+            "SELECT response, hit_count, confidence FROM memory ORDER BY id"
+        ).fetchall()
+        conn.close()
+        
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][0], "Resposta 2")  # Maior confiança vira canônica
+        self.assertEqual(rows[0][1], 3)
+        self.assertGreater(rows[0][2], 0.9)
+
+    def test_consolidate_signs_only_new_rows(self):
+        """Testa que passadas seguintes assinam só as memórias novas"""
+        self.consolidator.consolidate()
+
+        with patch.object(self.consolidator.lsh, "signature", wraps=self.consolidator.lsh.signature) as signature:
+            stats = self.consolidator.consolidate()
+            self.assertEqual(stats["scanned"], 0)
+            self.assertEqual(signature.call_count, 0)
+
+            conn = sqlite3.connect(self.temp_db.name)
+            conn.execute(
+                "INSERT INTO memory (prompt, response, confidence) VALUES (?, ?, ?)",
+                ("COMO INSTALAR O OLLAMA NO WINDOWS", "Resposta 5", 0.7)
+            )
+            conn.commit()
+            conn.close()
+
+            stats = self.consolidator.consolidate()
+            self.assertEqual(signature.call_count, 1)
+
+        self.assertEqual(stats["scanned"], 1)
+        self.assertEqual(stats["merged"], 1)
+
+        conn = sqlite3.connect(self.temp_db.name)
+        rows = conn.execute("SELECT response, hit_count FROM memory ORDER BY id").fetchall()
+        signed = conn.execute("SELECT COUNT(*) FROM memory_minhash").fetchone()[0]
+        conn.close()
+
+        self.assertEqual(rows[0], ("Resposta 2", 4))
+        self.assertEqual(signed, 2)
+
+    def test_exact_duplicates_compare_linearly(self):
+        """Testa que n duplicatas exatas geram O(n) comparações, não todos os pares"""
+        rows = [(i, "Como instalar o Ollama no Windows?") for i in range(2000)]
+        lsh = self.consolidator.lsh
+
+        with patch.object(lsh, "estimate_similarity", wraps=lsh.estimate_similarity) as estimate:
+            groups = self.consolidator.find_duplicate_groups(rows)
+
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]), 2000)
+        self.assertLess(estimate.call_count, 2000)
+
+class TestConversationSummarizer(unittest.TestCase):
+    """Testes para o ConversationSummarizer"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("""
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                user_input TEXT,
+                ai_response TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                response_time REAL,
+                satisfaction_score INTEGER
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO conversations (session_id, user_input, ai_response) VALUES (?, ?, ?)",
+            [("s1", "Meu nome é Ana", "Olá, Ana!"), ("s1", "Gosto de n8n", "Ótimo!")]
+        )
+        conn.commit()
+        conn.close()
+        
+        self.summarizer = ConversationSummarizer(self.temp_db.name)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        os.unlink(self.temp_db.name)
+    
+    @patch('requests.post')
+    def test_update_summary(self, mock_post):
+        """Testa atualização incremental do resumo"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"response": "Ana gosta de n8n."}
+        mock_post.return_value = mock_response
+        
+        summary = self.summarizer.update_summary("s1")
+        
+        self.assertEqual(summary, "Ana gosta de n8n.")
+        self.assertEqual(self.summarizer.get_summary("s1"), "Ana gosta de n8n.")
+        self.assertEqual(mock_post.call_args[1]["json"]["model"], "phi-3:mini")
+        
+        # Sem turnos novos, não chama o modelo novamente
+        self.summarizer.update_summary("s1")
+        self.assertEqual(mock_post.call_count, 1)
+    
+    @patch('requests.post')
+    def test_context_includes_turns_newer_than_summary(self, mock_post):
+        """Testa os turnos ainda não resumidos junto ao resumo"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"response": "Ana gosta de n8n."}
+        mock_post.return_value = mock_response
+        
+        self.assertEqual(self.summarizer.get_context("s1"),
+                         (None, [("Meu nome é Ana", "Olá, Ana!"), ("Gosto de n8n", "Ótimo!")]))
+        
+        self.summarizer.update_summary("s1")
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute(
+            "INSERT INTO conversations (session_id, user_input, ai_response) VALUES (?, ?, ?)",
+            ("s1", "E o segundo?", "O segundo nó é o HTTP Request")
+        )
+        conn.commit()
+        conn.close()
+        
+        summary, turns = self.summarizer.get_context("s1")
+        
+        self.assertEqual(summary, "Ana gosta de n8n.")
+        self.assertEqual(turns, [("E o segundo?", "O segundo nó é o HTTP Request")])
+
+class TestRetrievalPlanner(unittest.TestCase):
+    """Testes para o RetrievalPlanner"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("""
+            CREATE TABLE memory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt TEXT,
+                response TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                session_id TEXT,
+                context TEXT,
+                confidence REAL DEFAULT 0.8
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                user_input TEXT,
+                ai_response TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                response_time REAL,
+                satisfaction_score INTEGER
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO memory (prompt, response) VALUES (?, ?)",
+            [
+                ("Como configurar o webhook do n8n?", "Use o nó Webhook"),
+                ("Receita de bolo de cenoura", "Misture cenoura e farinha")
+            ]
+        )
+        conn.execute(
+            "INSERT INTO conversations (session_id, user_input, ai_response) VALUES (?, ?, ?)",
+            ("s1", "Estou montando um workflow", "Posso ajudar")
+        )
+        conn.commit()
+        conn.close()
+        
+        self.planner = RetrievalPlanner(self.temp_db.name)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        os.unlink(self.temp_db.name)
+    
+    def test_retrieve_merges_sources(self):
+        """Testa combinação das fontes em um único ranking"""
+        result = self.planner.retrieve("webhook do n8n", session_id="s1", k=3)
+        
+        sources = {c["source"] for c in result["results"]}
+        keys = [c["key"] for c in result["results"]]
+        
+        self.assertIn("session", sources)
+        self.assertEqual(keys.count("memory:1"), 1)  # Sem duplicatas entre fontes
+        self.assertNotIn("memory:2", keys[:2])
+        for source in ["session", "lexical", "semantic", "merge", "total"]:
+            self.assertIn(source, result["timings"])
+    
+    def test_recent_session_does_not_crowd_out_other_sources(self):
+        """Testa as vagas reservadas para documentação e memória com sessão cheia"""
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.executemany(
+            "INSERT INTO conversations (session_id, user_input, ai_response) VALUES (?, ?, ?)",
+            [("s1", f"Pergunta {i}", f"Resposta {i}") for i in range(6)]
+        )
+        conn.commit()
+        conn.close()
+        
+        doc_index = Mock()
+        doc_index.search.return_value = [
+            {"id": 7, "path": "docs/n8n.md", "heading": "Webhooks", "content": "Configure o nó", "score": 0.4}
+        ]
+        planner = RetrievalPlanner(self.temp_db.name, doc_index=doc_index)
+        
+        result = planner.retrieve("webhook do n8n", session_id="s1", k=5)
+        keys = [c["key"] for c in result["results"]]
+        
+        self.assertEqual(len(keys), 5)
+        self.assertIn("doc:7", keys)
+        self.assertIn("memory:1", keys)
+        scores = [c["score"] for c in result["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_weak_lexical_match_does_not_take_reserved_slot(self):
+        """Testa que um casamento de uma palavra comum não vira relevância 1.0 nem ocupa a vaga"""
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.executemany(
+            "INSERT INTO memory (prompt, response) VALUES (?, ?)",
+            [(f"Como configurar o serviço {i}", f"Resposta {i}") for i in range(8)]
+        )
+        conn.commit()
+        conn.close()
+        planner = RetrievalPlanner(self.temp_db.name)
+
+        lexical = planner._lexical_lookup("configurar a impressora")
+        self.assertGreater(len(lexical), 0)
+        self.assertLess(max(c.relevance for c in lexical), planner.min_reserved_relevance["lexical"])
+
+        session = [
+            RetrievalCandidate("session", f"conversation:{i}", "p", "r", 0.5, 1.0, score=0.8)
+            for i in range(3)
+        ]
+        for candidate in lexical:
+            candidate.score = planner.score(candidate)
+        chosen = planner._select_top(session + lexical, k=3)
+        self.assertEqual({c.source for c in chosen}, {"session"})
+
+    def test_index_memory(self):
+        """Testa indexação semântica de novas memórias"""
+        conn = sqlite3.connect(self.temp_db.name)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO memory (prompt, response) VALUES (?, ?)",
+            ("Gerar imagem futurista", "Imagem gerada")
+        )
+        memory_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        self.planner.index_memory(memory_id, "Gerar imagem futurista")
+        results = self.planner._semantic_lookup("imagem futurista")
+        
+        self.assertEqual(results[0].key, f"memory:{memory_id}")
+    
+    def test_deleted_memories_leave_vector_matrix(self):
+        """Testa a remoção de vetores de memórias apagadas"""
+        self.planner._semantic_lookup("webhook n8n")
+        self.assertEqual(sorted(self.planner._vector_ids.tolist()), [1, 2])
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("DELETE FROM memory WHERE id = 1")
+        conn.commit()
+        conn.close()
+        
+        results = self.planner._semantic_lookup("webhook n8n")
+        
+        self.assertNotIn("memory:1", [c.key for c in results])
+        self.assertNotIn(1, self.planner._vector_ids.tolist())
+        self.assertEqual(self.planner._last_memory_id, 2)
+
+class TestDocumentIndex(unittest.TestCase):
+    """Testes para o DocumentIndex"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'docs.db')
+        
+        with open(os.path.join(self.temp_dir, 'ollama.md'), 'w', encoding='utf-8') as f:
+            f.write("# Ollama\n\n## Instalação\n\nBaixe o instalador em ollama.com e rode ollama pull llama3.\n")
+        with open(os.path.join(self.temp_dir, 'n8n.md'), 'w', encoding='utf-8') as f:
+            f.write("# n8n\n\n```bash\n# comentário\ndocker run n8nio/n8n\n```\n\nAcesse a porta 5678.\n")
+        
+        self.index = DocumentIndex(self.db_path, self.temp_dir)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        import shutil
+        shutil.rmtree(self.temp_dir)
+    
+    def test_incremental_indexing(self):
+        """Testa reindexação apenas de arquivos alterados"""
+        stats = self.index.index_directory()
+        self.assertEqual(stats["indexed"], 2)
+        
+        stats = self.index.index_directory()
+        self.assertEqual(stats["indexed"], 0)
+        self.assertEqual(stats["skipped"], 2)
+        
+        path = os.path.join(self.temp_dir, 'n8n.md')
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("\nUse o webhook para integrar.\n")
+        os.utime(path, (0, 1))
+        
+        stats = self.index.index_directory()
+        self.assertEqual(stats["indexed"], 1)
+    
+    def test_search(self):
+        """Testa busca na documentação"""
+        self.index.index_directory()
+        results = self.index.search("como instalar o ollama")
+        
+        self.assertGreater(len(results), 0)
+        self.assertTrue(results[0]["path"].endswith("ollama.md"))
+        self.assertEqual(results[0]["heading"], "Instalação")
+
+    def test_unrelated_prompt_gets_no_doc_candidate(self):
+        """Testa que o score absoluto descarta trechos sem relação com a consulta"""
+        # Com poucos trechos o idf do BM25 zera; alguns documentos a mais dão base ao score
+        pages = {
+            "memoria.md": "# Memória\n\nA memória guarda prompts e respostas no SQLite com índice FTS.\n",
+            "deploy.md": "# Deploy\n\nPublique a aplicação com Docker Compose e configure as variáveis de ambiente.\n",
+            "voz.md": "# Voz\n\nA interação por voz usa reconhecimento de fala e síntese de áudio.\n",
+            "imagens.md": "# Imagens\n\nA geração de imagens envia o prompt ao modelo multimodal.\n",
+        }
+        for name, content in pages.items():
+            with open(os.path.join(self.temp_dir, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        self.index.index_directory()
+        planner = RetrievalPlanner(self.db_path, doc_index=self.index)
+
+        self.assertEqual(planner._docs_lookup("qual a receita de bolo que você gosta para o jantar"), [])
+        self.assertGreater(len(planner._docs_lookup("onde baixo o instalador do ollama")), 0)
+
+        result = planner.retrieve("qual a receita de bolo que você gosta para o jantar")
+        self.assertNotIn("docs", {c["source"] for c in result["results"]})
+
+    def test_chunk_ignores_code_comments(self):
+        """Testa que comentários em blocos de código não viram títulos"""
+        chunks = self.index.chunk_markdown("# Título\n\n```bash\n# comentário\nls\n```\n")
+        
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0][0], "Título")
+
+class TestDbMigrations(unittest.TestCase):
+    """Testes para as migrações de esquema"""
+    
+    def setUp(self):
+        """Cria um banco no formato antigo do setup.py"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("""
+            CREATE TABLE memory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt TEXT,
+                response TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("INSERT INTO memory (prompt, response) VALUES ('olá', 'oi')")
+        conn.commit()
+        conn.close()
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        os.unlink(self.temp_db.name)
+    
+    def test_migrate_legacy_database(self):
+        """Testa a migração de um banco antigo preservando os dados"""
+        applied = migrate_database(self.temp_db.name, "memory")
+        
+        self.assertEqual([m["version"] for m in applied], [m.version for m in MIGRATIONS["memory"]])
+        self.assertEqual(get_schema_version(self.temp_db.name), MIGRATIONS["memory"][-1].version)
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(memory)")
+        columns = [row[1] for row in cursor.fetchall()]
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT prompt, hit_count FROM memory")
+        row = cursor.fetchone()
+        conn.close()
+        
+        self.assertIn("session_id", columns)
+        self.assertIn("hit_count", columns)
+        self.assertIn("idx_conversations_session_ts", indexes)
+        self.assertEqual(row, ("olá", 1))
+        
+        # Reexecutar não aplica nada novo
+        self.assertEqual(migrate_database(self.temp_db.name, "memory", force=True), [])
+
+class TestTracing(unittest.TestCase):
+    """Testes para o tracing por spans"""
+    
+    def setUp(self):
+        """Configuração inicial dos testes"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.tracer = Tracer(self.temp_db.name)
+    
+    def tearDown(self):
+        """Limpeza após os testes"""
+        self.tracer.enabled = False
+        self.tracer.flush()
+        os.unlink(self.temp_db.name)
+    
+    def test_nested_spans_and_waterfall(self):
+        """Testa hierarquia pai/filho, erros e a cascata"""
+        with self.tracer.span("request", session_id="s1") as root:
+            with self.tracer.span("retrieval"):
+                pass
+            with self.assertRaises(ValueError):
+                with self.tracer.span("ollama"):
+                    raise ValueError("timeout")
+        
+        spans = self.tracer.get_trace(self.tracer.last_trace_id)
+        by_name = {s["name"]: s for s in spans}
+        
+        self.assertEqual([s["name"] for s in spans], ["request", "retrieval", "ollama"])
+        self.assertIsNone(by_name["request"]["parent_id"])
+        self.assertEqual(by_name["retrieval"]["parent_id"], root.span_id)
+        self.assertEqual(by_name["ollama"]["status"], "error")
+        self.assertEqual(by_name["request"]["attributes"], {"session_id": "s1"})
+        
+        waterfall = self.tracer.format_waterfall(root.trace_id)
+        self.assertIn("  retrieval", waterfall)
+        self.assertIn("✗", waterfall)
+    
+    def test_failed_flush_requeues_and_old_spans_expire(self):
+        """Testa a devolução do lote em falha e a retenção dos spans"""
+        tracer = Tracer(self.temp_db.name, flush_interval=60)
+        with tracer.span("request"):
+            pass
+        
+        with patch('modules.tracing.sqlite3.connect', side_effect=sqlite3.OperationalError("locked")):
+            self.assertEqual(tracer.flush(), 0)
+        self.assertEqual(tracer.pending_count, 1)
+        self.assertEqual(tracer.flush(), 1)
+        
+        conn = sqlite3.connect(self.temp_db.name)
+        removed = tracer.expire(conn.cursor(), now=time.time() + 8 * 86400)
+        conn.commit()
+        remaining = conn.execute("SELECT COUNT(*) FROM trace_spans").fetchone()[0]
+        conn.close()
+        
+        self.assertEqual(removed, 1)
+        self.assertEqual(remaining, 0)
 
 class TestWorkflowGenerator(unittest.TestCase):
     """Testes para o AdvancedWorkflowGenerator"""